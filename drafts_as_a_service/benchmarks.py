@@ -0,0 +1,198 @@
+# coding=utf-8
+"""
+Rough timings of the draft engine, which can be run with
+
+    python -m drafts_as_a_service.benchmarks
+"""
+from __future__ import unicode_literals, print_function
+import time
+import timeit
+
+from sqlalchemy.orm import sessionmaker
+
+from drafts_as_a_service import sa, simulation, serialization
+
+
+def best_of(func, repeat=5, number=1):
+    """
+    The fastest of several runs of func, in seconds per call
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def compare_dealing(packs=24, cards_per_pack=15, drafts=100):
+    """
+    Time dealing drafts' worth of packs with the set pool's copy and
+    shuffle, against the booster engine one draft at a time and all at once
+    """
+    cube = ['Card {}'.format(idx) for idx in xrange(packs * cards_per_pack)]
+    set_pool = sa.Pool(type='set', contents=cube)
+    booster_pool = sa.Pool(type='boosters', contents={
+        'cards': {'common': cube},
+        'slots': [{'count': cards_per_pack, 'rarities': {'common': 1}}],
+    })
+    # build the card dictionaries and booster engine outside the timings
+    set_pool.card_names
+    booster_pool.booster_engine
+
+    def shuffled():
+        for _ in xrange(drafts):
+            set_pool.deal_packs(packs, cards_per_pack)
+
+    def boosters():
+        for seed in xrange(drafts):
+            booster_pool.deal_packs(packs, seed=seed)
+
+    def booster_batch():
+        booster_pool.deal_packs(packs * drafts)
+
+    return {
+        'shuffle': best_of(shuffled),
+        'boosters': best_of(boosters),
+        'boosters, one batch': best_of(booster_batch),
+    }
+
+
+def compare_simulation(drafts=10, players=8, seed=0):
+    """
+    Picks per second running whole drafts with each kind of storage, in
+    memory and committing every pick to an in-memory SQLite database
+    """
+    return {
+        '{}, {}'.format(storage, backend): simulation.simulate(
+            drafts=drafts, players=players, storage=storage, backend=backend,
+            seed=seed)['picks_per_second']
+        for storage in sorted(simulation.STORAGE)
+        for backend in ('memory', 'sqlite')
+    }
+
+
+def compare_bulk_creation(pods=50, players=8):
+    """
+    Seconds to create and deal pods of drafts in an in-memory SQLite
+    database, a session and commit per pod against Draft.create_many
+    """
+    cards = ['Card {}'.format(idx) for idx in
+             xrange(players * 3 * sa.Pool.default_cards_per_pack)]
+
+    def setup():
+        engine = sa.create_engine('sqlite://')
+        sa.Base.metadata.create_all(engine)
+        make_session = sessionmaker(bind=engine, autoflush=False)
+        session = make_session()
+        pool = sa.Pool(type='set', contents=cards)
+        # the players already exist, since that's the same either way
+        pod_players = [[sa.Player(handle='pod{}player{}'.format(pod, seat))
+                        for seat in xrange(players)] for pod in xrange(pods)]
+        session.add(pool)
+        session.add_all(player for pod in pod_players for player in pod)
+        session.commit()
+        return make_session, pool.id, [[player.id for player in pod]
+                                       for pod in pod_players]
+
+    def one_at_a_time():
+        make_session, pool_id, pod_ids = setup()
+        started = time.time()
+        for ids in pod_ids:
+            session = make_session()
+            pod = session.query(sa.Player).filter(sa.Player.id.in_(ids)).all()
+            draft = sa.Draft(players=pod, pool=session.query(sa.Pool).get(
+                pool_id))
+            draft.randomize_seating()
+            draft.distribute()
+            session.add(draft)
+            session.commit()
+            session.close()
+        return time.time() - started
+
+    def in_bulk():
+        make_session, pool_id, pod_ids = setup()
+        started = time.time()
+        session = make_session()
+        pods = session.query(sa.Player).filter(sa.Player.id.in_(
+            [player_id for ids in pod_ids for player_id in ids])).all()
+        by_id = {player.id: player for player in pods}
+        sa.Draft.create_many(session, session.query(sa.Pool).get(pool_id),
+                             [[by_id[player_id] for player_id in ids]
+                              for ids in pod_ids])
+        session.commit()
+        session.close()
+        return time.time() - started
+
+    return {
+        'one session per pod': min(one_at_a_time() for _ in xrange(3)),
+        'create_many': min(in_bulk() for _ in xrange(3)),
+    }
+
+
+def draft_columns(players=8, picks=7, seed=0):
+    """
+    The values of a draft's heavy columns partway through its first round,
+    after every player has made the given number of picks
+    """
+    cards = ['Card {}'.format(idx) for idx in
+             xrange(players * 3 * sa.Pool.default_cards_per_pack)]
+    pool = sa.Pool(type='set', contents=cards)
+    draft = sa.Draft(players=[sa.Player(handle='player{}'.format(seat))
+                              for seat in xrange(players)],
+                     pool=pool, seed=seed)
+    draft.start()
+    for _ in xrange(picks):
+        for name in draft.whose_turn():
+            draft.pick(name, draft.pack_for(name)[0])
+    return {
+        'contents': pool.contents,
+        'dealt_packs': [list(cards) for cards in draft.dealt_packs],
+        'player_queues': draft.player_queues.as_json(),
+        'player_picks': dict(draft.player_picks),
+    }
+
+
+def compare_serialization(number=100):
+    """
+    {codec: (seconds to encode, seconds to decode, bytes)} for a draft's
+    heavy columns with every codec that's installed
+    """
+    columns = draft_columns().values()
+    results = {}
+    for name in serialization.available_codecs():
+        codec = serialization.get_codec(name)
+        encoded = [codec.dumps(value) for value in columns]
+        size = sum(len(value.encode('utf-8') if not codec.binary else value)
+                   for value in encoded)
+        results[name] = (
+            best_of(lambda: [codec.dumps(value) for value in columns],
+                    number=number),
+            best_of(lambda: [codec.loads(value) for value in encoded],
+                    number=number),
+            size)
+    return results
+
+
+def _report(title, timings, unit='s'):
+    print(title)
+    for name, value in sorted(timings.items(), key=lambda kv: kv[1]):
+        print('    {:<30} {:>12.6f}{}'.format(name, value, unit))
+
+
+def _report_serialization(title, results):
+    print(title)
+    print('    {:<12} {:>12} {:>12} {:>10}'.format('codec', 'encode', 'decode',
+                                                  'bytes'))
+    for name, (encode, decode, size) in sorted(results.items(),
+                                               key=lambda kv: kv[1]):
+        print('    {:<12} {:>11.6f}s {:>11.6f}s {:>10}'.format(
+            name, encode, decode, size))
+
+
+def main():
+    _report('dealing 100 drafts of 24 packs', compare_dealing())
+    _report('simulating 4 drafts of 8 players', compare_simulation(drafts=4),
+            unit=' picks/s')
+    _report('creating 50 pods of 8 players', compare_bulk_creation())
+    _report_serialization('serializing a draft partway through its first '
+                          'round', compare_serialization())
+
+
+if __name__ == '__main__':
+    main()
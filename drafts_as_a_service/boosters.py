@@ -0,0 +1,99 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def card_names(contents):
+    """
+    Every card in a booster pool's contents, grouped by rarity
+    """
+    cards = contents['cards']
+    return [name for rarity in sorted(cards) for name in cards[rarity]]
+
+
+def make_rng(seed=None):
+    """
+    A seeded numpy RandomState. Drafts deal their packs again from their
+    seed every time they're loaded, so this has to give the same numbers
+    for the same seed forever; numpy keeps RandomState's stream stable
+    across versions, which it doesn't promise for Generator's.
+    """
+    return numpy.random.RandomState(seed)
+
+
+class BoosterEngine(object):
+    """
+    Deals booster packs from a pool whose contents look like:
+
+        {
+            "cards": {"common": [...], "uncommon": [...], "rare": [...],
+                      "mythic": [...]},
+            "slots": [
+                {"count": 10, "rarities": {"common": 1}},
+                {"count": 3, "rarities": {"uncommon": 1}},
+                {"count": 1, "rarities": {"rare": 7, "mythic": 1}}
+            ]
+        }
+
+    Each slot's rarity is picked by weight. A slot with a single rarity never
+    repeats a card within a pack; a weighted slot with a count above one
+    can. Whole batches of packs are sampled at once, as arrays of card ids.
+    """
+    def __init__(self, contents, card_id):
+        if numpy is None:
+            raise ValueError('booster pools require numpy')
+
+        self.by_rarity = {
+            rarity: numpy.array([card_id(name) for name in names],
+                                dtype=numpy.uint16)
+            for rarity, names in contents['cards'].iteritems()
+        }
+        self.slots = []
+        for slot in contents['slots']:
+            rarities = sorted(slot['rarities'])
+            missing = set(rarities) - set(self.by_rarity)
+            if missing:
+                raise ValueError('no cards of rarity {}'.format(
+                    ', '.join(sorted(missing))))
+
+            weights = numpy.array([slot['rarities'][r] for r in rarities],
+                                  dtype=float)
+            if len(rarities) == 1 and (slot['count'] >
+                                       len(self.by_rarity[rarities[0]])):
+                raise ValueError('require {} {} cards, have {}'.format(
+                    slot['count'], rarities[0],
+                    len(self.by_rarity[rarities[0]])))
+            self.slots.append((slot['count'], rarities,
+                               weights / weights.sum()))
+
+        self.cards_per_pack = sum(count for count, _, _ in self.slots)
+
+    def sample(self, packs, rng):
+        """
+        A (packs x cards_per_pack) array of card ids
+        """
+        return numpy.hstack([
+            self._sample_slot(packs, count, rarities, weights, rng)
+            for count, rarities, weights in self.slots
+        ])
+
+    def _sample_slot(self, packs, count, rarities, weights, rng):
+        if len(rarities) == 1:
+            # a random sort key per card, the lowest count keys in each
+            # row are that pack's cards
+            cards = self.by_rarity[rarities[0]]
+            keys = rng.random_sample((packs, len(cards)))
+            picked = keys.argpartition(count - 1, axis=1)[:, :count]
+            return cards[picked]
+
+        chosen = rng.choice(len(rarities), size=(packs, count), p=weights)
+        slot = numpy.empty((packs, count), dtype=numpy.uint16)
+        for idx, rarity in enumerate(rarities):
+            mask = chosen == idx
+            cards = self.by_rarity[rarity]
+            slot[mask] = cards[rng.randint(0, len(cards), mask.sum())]
+        return slot
@@ -0,0 +1,116 @@
+# coding=utf-8
+from __future__ import unicode_literals
+from collections import deque
+
+
+class DraftCore(object):
+    """
+    The rules of a Draft with none of the ORM, for running lots of drafts
+    quickly, e.g. in other processes: players are seat numbers, cards are
+    card ids, and packs are lists.
+
+    Packs are dealt, opened, picked from and passed exactly the way
+    Draft does it, including a pack leaving play once it's picked clean.
+    """
+    __slots__ = ('num_players', 'packs', 'taken', 'opened', 'unopened',
+                 'picks')
+
+    def __init__(self, num_players, packs=()):
+        self.num_players = num_players
+        self.packs = [list(cards) for cards in packs]
+        # how many cards have been picked from each pack
+        self.taken = [0] * len(self.packs)
+        self.opened = [deque() for _ in xrange(num_players)]
+        self.unopened = [deque() for _ in xrange(num_players)]
+        # each seat's picks, as (pack, position in pack, card)
+        self.picks = [[] for _ in xrange(num_players)]
+
+    @classmethod
+    def from_draft(cls, draft):
+        """
+        A core in the state a draft is in, with seats in its player_order
+        """
+        core = cls(draft.num_players)
+        for pack in xrange(len(draft.dealt_packs)):
+            view = draft._pack(pack)
+            core.packs.append(list(view.cards()))
+            core.taken.append(view.picked)
+        for seat, name in enumerate(draft.player_order):
+            core.opened[seat].extend(draft.player_queues[name]['opened'])
+            core.unopened[seat].extend(draft.player_queues[name]['unopened'])
+            core.picks[seat].extend(tuple(pick)
+                                    for pick in draft.player_picks[name])
+        return core
+
+    def distribute(self):
+        """
+        Queue up the dealt packs, each seat getting every num_players'th
+        """
+        for pack in xrange(len(self.packs)):
+            self.unopened[pack % self.num_players].append(pack)
+
+    def open_pack(self, seat):
+        self.opened[seat].append(self.unopened[seat].popleft())
+
+    def pack_for(self, seat):
+        """
+        The cards in the pack in front of a seat, or None
+        """
+        if self.opened[seat]:
+            return self.packs[self.opened[seat][0]]
+
+    def make_pick(self, seat, card):
+        """
+        Take a card, returning whether there's anything left to pass
+        """
+        pack = self.opened[seat][0]
+        cards = self.packs[pack]
+        try:
+            cards.remove(card)
+        except ValueError:
+            raise ValueError('{} is not in the pack'.format(card))
+        self.picks[seat].append((pack, self.taken[pack], card))
+        self.taken[pack] += 1
+        if not cards:
+            self.opened[seat].popleft()
+        return bool(cards)
+
+    def pass_pack(self, seat, step):
+        self.opened[self.neighbor(seat, step)].append(
+            self.opened[seat].popleft())
+
+    def make_pick_and_pass(self, seat, card, step):
+        if self.make_pick(seat, card):
+            self.pass_pack(seat, step)
+
+    def neighbor(self, seat, step):
+        return (seat + step) % self.num_players
+
+    def run(self, pickers, rng):
+        """
+        Deal, then play out the whole draft, with seat n picking with
+        pickers[n](seat, cards, rng); packs go left, right, then left
+        """
+        self.distribute()
+        rounds = len(self.packs) // self.num_players
+        for round in xrange(rounds):
+            step = -1 if round % 2 else 1
+            for seat in xrange(self.num_players):
+                self.open_pack(seat)
+            while True:
+                made = False
+                for seat in xrange(self.num_players):
+                    cards = self.pack_for(seat)
+                    if cards:
+                        self.make_pick_and_pass(
+                            seat, pickers[seat](seat, cards, rng), step)
+                        made = True
+                if not made:
+                    break
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
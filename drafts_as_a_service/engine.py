@@ -0,0 +1,396 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import os
+import json
+import uuid
+from collections import OrderedDict
+from threading import RLock, Event
+
+from sqlalchemy.orm import undefer_group
+from sideboard.lib import log, DaemonTask
+
+from drafts_as_a_service import sa, config
+
+
+# the Draft methods that change a draft, and so get logged and written back
+WRITES = ('start', 'distribute', 'open_pack', 'make_pick', 'pick',
+          'pass_left', 'pass_right', 'make_pick_and_pass_left',
+          'make_pick_and_pass_right')
+# the ones that don't
+READS = ('queues_for', 'picks_for', 'pack_for', 'seat', 'phase', 'pending_for',
+         'whose_turn', 'queue_entries', 'opened_for', 'pick_entries',
+         'picks_since', 'summary')
+
+
+class HotDraft(object):
+    """
+    A draft held in memory by the engine, along with the session it was
+    loaded in; only the thread holding its lock may touch either. Its slot
+    is reserved before it's loaded, and whoever takes the lock first loads
+    it, so that a slow load only holds up this draft
+    """
+    def __init__(self, draft_id, previous=None):
+        self.draft_id = draft_id
+        self.lock = RLock()
+        # set once it's been written back and dropped
+        self.closed = Event()
+        # an older copy of this draft that's still being written back, and
+        # that we mustn't load ahead of
+        self.previous = previous
+        self.manager = self.draft = None
+        self.sequence = self.written = self.unflushed = 0
+        self.evicted = False
+
+    def load(self):
+        if self.draft is not None:
+            return
+        if self.previous is not None:
+            self.previous.closed.wait()
+            self.previous = None
+        manager = sa.Session()
+        # committing would otherwise expire the draft, and the next pick
+        # would have to load and deserialize it all over again
+        manager.session.expire_on_commit = False
+        draft = manager.session.query(sa.Draft).options(
+            undefer_group('state')).get(self.draft_id)
+        if draft is None:
+            manager.session.close()
+            raise sa.DraftError('no draft {}'.format(self.draft_id))
+        draft.load()
+        # hand the connection back; the draft won't need it again until
+        # it's written back, which may well be from another thread
+        manager.session.commit()
+        self.manager, self.draft = manager, draft
+        self.sequence = self.draft.log_sequence
+        # the last sequence number that has been written back
+        self.written = self.sequence
+
+    def flush(self):
+        if self.unflushed:
+            self.draft.log_sequence = self.sequence
+            self.manager.session.commit()
+            self.written = self.sequence
+            self.unflushed = 0
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.drop()
+
+    def drop(self):
+        self.evicted = True
+        if self.manager is not None:
+            self.manager.session.close()
+        self.closed.set()
+
+
+class PickLog(object):
+    """
+    An append-only file of every change the engine makes, written before
+    the change is applied. Each entry has a per-draft sequence number, and
+    a draft's log_sequence says which of them it has been written back
+    with, so recovery only replays the ones it hasn't; the ones it has are
+    dropped from the log whenever the engine writes drafts back.
+    """
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self.lock = RLock()
+        self.file = None
+
+    def open(self):
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'ab')
+
+    def append(self, draft_id, sequence, action, args):
+        entry = json.dumps({'draft': draft_id.hex, 'sequence': sequence,
+                            'action': action, 'args': args})
+        with self.lock:
+            self.open()
+            self.file.write(entry.encode('utf-8') + b'\n')
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+
+    def entries(self):
+        """
+        Every entry in the log, grouped by draft, in the order they were made
+        """
+        grouped = OrderedDict()
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        # we crashed partway through writing this one, so
+                        # it was never applied either
+                        continue
+                    grouped.setdefault(entry['draft'], []).append(entry)
+        return grouped
+
+    def truncate(self, keep=()):
+        """
+        Start the log over, with just the entries in keep
+        """
+        with self.lock:
+            self.close()
+            with open(self.path, 'wb') as f:
+                for entry in keep:
+                    f.write(json.dumps(entry).encode('utf-8') + b'\n')
+            self.open()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class DraftEngine(object):
+    """
+    Keeps hot drafts in memory, so that a pick doesn't have to load and
+    deserialize its draft, and writes them back in the background.
+
+    Every operation on a draft takes that draft's lock, so each draft has
+    a single writer, while different drafts proceed in parallel. A draft
+    is written back every flush_every changes and on every flush_interval,
+    and every change is in the pick log before it's applied. The least
+    recently used drafts are written back and dropped once there are more
+    than max_drafts.
+
+    The engine has to be the only thing writing to the drafts it holds;
+    anyone else's changes fail its version check and get the draft evicted.
+    on_change, if given, is called with each draft id and the changes every
+    action made to it, as returned by Draft.take_changes.
+    """
+    def __init__(self, pick_log=None, flush_interval=None, flush_every=None,
+                 max_drafts=None, fsync=None, on_change=None):
+        settings = config['engine']
+        self.pick_log = PickLog(
+            pick_log or settings['pick_log'],
+            settings['fsync'] if fsync is None else fsync)
+        self.flush_interval = flush_interval or settings['flush_interval']
+        self.flush_every = flush_every or settings['flush_every']
+        self.max_drafts = max_drafts or settings['max_drafts']
+        self.on_change = on_change
+        self.drafts = OrderedDict()
+        # draft id -> the HotDraft that's being written back after being
+        # pushed out, which a fresh copy has to wait for before loading
+        self.closing = {}
+        # draft id hex -> the sequence number it was last written back with,
+        # since the pick log was last compacted
+        self.written = {}
+        self.lock = RLock()
+        self.task = None
+
+    def start(self):
+        """
+        Recover anything the pick log has that never got written back,
+        then start writing back in the background
+        """
+        self.recover()
+        self.pick_log.open()
+        self.task = DaemonTask(self.flush, interval=self.flush_interval)
+        self.task.start()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.stop()
+            self.task = None
+        # anything that couldn't be written back stays in the log for
+        # recover to have another go at
+        if self.evict_all():
+            self.pick_log.truncate()
+        self.pick_log.close()
+
+    def perform(self, draft_id, action, *args):
+        """
+        Call one of the draft's methods, e.g. 'make_pick', returning what it
+        returns
+        """
+        if action not in WRITES + READS:
+            raise sa.DraftError('{!r} is not a draft action'.format(action))
+        if not isinstance(draft_id, uuid.UUID):
+            draft_id = uuid.UUID(draft_id)
+
+        while True:
+            hot = self._checkout(draft_id)
+            with hot.lock:
+                if hot.evicted:
+                    continue
+                try:
+                    hot.load()
+                except Exception:
+                    self._discard(draft_id, hot)
+                    raise
+                if action in READS:
+                    return getattr(hot.draft, action)(*args)
+
+                # logged before it's applied, so a crash in between is
+                # replayed; a change that raises is logged too, but raises
+                # again when it's replayed, and recovery skips over it
+                self.pick_log.append(draft_id, hot.sequence + 1, action, args)
+                hot.sequence += 1
+                hot.unflushed += 1
+                result = getattr(hot.draft, action)(*args)
+                changes = hot.draft.take_changes()
+                if self.on_change is not None:
+                    self.on_change(draft_id, changes)
+                if hot.unflushed >= self.flush_every:
+                    self._flush(draft_id, hot)
+                return result
+
+    def holds(self, draft_id):
+        """
+        Whether we're holding a draft, whose copy in the database may be
+        behind ours
+        """
+        if not isinstance(draft_id, uuid.UUID):
+            draft_id = uuid.UUID(draft_id)
+        with self.lock:
+            hot = self.drafts.get(draft_id)
+            return hot is not None and not hot.evicted
+
+    def flush(self):
+        """
+        Write back every draft with changes that haven't been
+        """
+        with self.lock:
+            hot_drafts = self.drafts.items()
+        for draft_id, hot in hot_drafts:
+            with hot.lock:
+                if not hot.evicted:
+                    self._flush(draft_id, hot, compact=False)
+        self._compact()
+
+    def evict_all(self):
+        """
+        Write back and drop every draft, returning whether they all made it
+        """
+        with self.lock:
+            hot_drafts = self.drafts.items()
+            self.drafts.clear()
+            self.closing.update(hot_drafts)
+        written = True
+        for draft_id, hot in hot_drafts:
+            written &= self._evict(draft_id, hot)
+        return written
+
+    def recover(self):
+        """
+        Reapply the changes in the pick log that drafts weren't written back
+        with, then start a fresh log with only the ones we couldn't
+        """
+        unrecovered = []
+        for draft_id, entries in self.pick_log.entries().iteritems():
+            def replay(draft, entries=entries):
+                replayed = 0
+                for entry in entries:
+                    if entry['sequence'] > draft.log_sequence:
+                        try:
+                            getattr(draft, entry['action'])(*entry['args'])
+                        except Exception:
+                            # it raised when it was performed, too
+                            log.warning('skipping failed change {} to draft '
+                                        '{}'.format(entry['sequence'],
+                                                    draft_id))
+                        draft.log_sequence = entry['sequence']
+                        replayed += 1
+                return replayed
+
+            try:
+                replayed = sa.Draft.update(uuid.UUID(draft_id), replay)
+            except Exception:
+                log.error('unable to recover draft {}'.format(draft_id),
+                          exc_info=True)
+                unrecovered.extend(entries)
+            else:
+                if replayed:
+                    log.info('recovered {} changes to draft {}'.format(
+                        replayed, draft_id))
+        self.pick_log.truncate(keep=unrecovered)
+
+    def _checkout(self, draft_id):
+        """
+        Reserve a draft's slot, then write back whatever that pushed out;
+        the draft itself is loaded under its own lock, so neither the load
+        nor the write back holds up any other draft
+        """
+        with self.lock:
+            hot = self.drafts.pop(draft_id, None)
+            if hot is None or hot.evicted:
+                hot = HotDraft(draft_id, self.closing.get(draft_id))
+            self.drafts[draft_id] = hot
+            pushed_out = []
+            while len(self.drafts) > self.max_drafts:
+                pushed_out.append(self.drafts.popitem(last=False))
+            self.closing.update(pushed_out)
+        for evicted_id, evicted in pushed_out:
+            self._evict(evicted_id, evicted)
+        return hot
+
+    def _discard(self, draft_id, hot):
+        """
+        Drop a draft that couldn't be loaded; called holding its lock
+        """
+        hot.drop()
+        with self.lock:
+            if self.drafts.get(draft_id) is hot:
+                del self.drafts[draft_id]
+
+    def _flush(self, draft_id, hot, compact=True):
+        try:
+            hot.flush()
+        except Exception:
+            # the next checkout loads it fresh; we don't take the engine's
+            # lock here since we're holding the draft's
+            log.error('unable to write back draft {}, dropping it'.format(
+                draft_id), exc_info=True)
+            hot.manager.session.rollback()
+            hot.drop()
+        else:
+            self._written(draft_id, hot)
+            if compact:
+                self._compact()
+
+    def _written(self, draft_id, hot):
+        with self.pick_log.lock:
+            self.written[draft_id.hex] = hot.written
+
+    def _compact(self):
+        """
+        Drop the pick log entries that have been written back
+        """
+        with self.pick_log.lock:
+            if self.written:
+                self.pick_log.truncate(keep=[
+                    entry for entries in self.pick_log.entries().itervalues()
+                    for entry in entries
+                    if entry['sequence'] > self.written.get(entry['draft'], 0)
+                ])
+                self.written = {}
+
+    def _evict(self, draft_id, hot):
+        """
+        Write back and drop a draft that's already been taken out of
+        self.drafts; never called holding the engine's lock
+        """
+        try:
+            with hot.lock:
+                if hot.evicted:
+                    return True
+                try:
+                    hot.close()
+                except Exception:
+                    log.error('unable to write back draft {}'.format(
+                        draft_id), exc_info=True)
+                    return False
+                self._written(draft_id, hot)
+                return True
+        finally:
+            with self.lock:
+                if self.closing.get(draft_id) is hot:
+                    del self.closing[draft_id]
@@ -0,0 +1,144 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import uuid
+from collections import OrderedDict, deque
+from threading import RLock
+
+from sideboard.lib import notify, DaemonTask
+
+from drafts_as_a_service import config
+
+
+# what subscribers to draft changes subscribe to, which is notified when
+# any draft changes; each draft's changes are also published on a channel
+# of their own, see channel(), for anything that can subscribe to one
+CHANNEL = 'drafts_as_a_service.draft_changes'
+
+
+def channel(draft_id):
+    """
+    The channel that just one draft's changes are published on
+    """
+    return '{}.{}'.format(CHANNEL, _as_uuid(draft_id).hex)
+
+
+class ChangeFeed(object):
+    """
+    The recent changes to drafts, numbered per draft, so clients can be sent
+    just what's changed since the last change they saw.
+
+    Subscribers are notified at most once per coalesce_interval, however
+    many changes there were in between, or after every change if it's 0,
+    on CHANNEL and the channels of the drafts that changed. Subscribers to
+    CHANNEL are called again whichever draft changed; unsent only trims
+    what they're sent to what they haven't been sent yet, it doesn't spare
+    them the call.
+    The last `history` changes of the last `max_drafts` drafts to change
+    are kept; a client that's further behind than that is told to reset
+    and load the draft again.
+    """
+    def __init__(self, coalesce_interval=None, history=None, max_drafts=None):
+        settings = config['feed']
+        self.coalesce_interval = (settings['coalesce_interval']
+                                  if coalesce_interval is None
+                                  else coalesce_interval)
+        self.history = history or settings['history']
+        self.max_drafts = max_drafts or settings['max_drafts']
+        # draft id -> deque of changes, least recently changed first
+        self.changes = OrderedDict()
+        self.numbers = {}
+        # draft id -> {client: the last change number they were sent}
+        self.sent = {}
+        self.unpublished = set()
+        self.lock = RLock()
+        self.task = None
+
+    def start(self):
+        if self.coalesce_interval:
+            self.task = DaemonTask(self.publish,
+                                   interval=self.coalesce_interval)
+            self.task.start()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.stop()
+            self.task = None
+        self.publish()
+
+    def record(self, draft_id, changes):
+        """
+        Number and keep a draft's changes, as returned by take_changes
+        """
+        if not changes:
+            return
+        draft_id = _as_uuid(draft_id)
+        with self.lock:
+            recent = self.changes.pop(draft_id, None)
+            if recent is None:
+                recent = deque(maxlen=self.history)
+            self.changes[draft_id] = recent
+            while len(self.changes) > self.max_drafts:
+                dropped, _ = self.changes.popitem(last=False)
+                del self.numbers[dropped]
+                self.sent.pop(dropped, None)
+
+            number = self.numbers.get(draft_id, 0)
+            for change in changes:
+                number += 1
+                recent.append(dict(change, number=number))
+            self.numbers[draft_id] = number
+            self.unpublished.add(draft_id)
+        if not self.coalesce_interval:
+            self.publish()
+
+    def since(self, draft_id, number=0, player=None):
+        """
+        A draft's changes after the given change number, with the cards
+        other players picked left out; if we don't have all of them, the
+        only change is a reset
+        """
+        draft_id = _as_uuid(draft_id)
+        with self.lock:
+            recent = list(self.changes.get(draft_id, ()))
+            latest = self.numbers.get(draft_id, 0)
+        if number > latest or (recent and recent[0]['number'] > number + 1):
+            return [{'type': 'reset', 'number': latest}]
+
+        changes = []
+        for change in recent:
+            if change['number'] > number:
+                if change['type'] == 'picked' and change['player'] != player:
+                    change = {key: value for key, value in change.iteritems()
+                              if key != 'card'}
+                changes.append(change)
+        return changes
+
+    def unsent(self, draft_id, client, number=0, player=None):
+        """
+        since, but leaving out what we've already sent this client, so a
+        subscription that's called with the same number every time it's
+        notified only gets what's new
+        """
+        draft_id = _as_uuid(draft_id)
+        with self.lock:
+            number = max(number, self.sent.get(draft_id, {}).get(client, 0))
+        changes = self.since(draft_id, number, player)
+        if changes:
+            with self.lock:
+                if draft_id in self.changes:
+                    self.sent.setdefault(draft_id, {})[client] = (
+                        changes[-1]['number'])
+        return changes
+
+    def publish(self):
+        """
+        Notify the subscribers to every draft that's changed since we last did
+        """
+        with self.lock:
+            unpublished, self.unpublished = self.unpublished, set()
+        if unpublished:
+            notify([CHANNEL] + [channel(draft_id) for draft_id in unpublished])
+
+
+def _as_uuid(draft_id):
+    return draft_id if isinstance(draft_id, uuid.UUID) else uuid.UUID(draft_id)
@@ -0,0 +1,114 @@
+# coding=utf-8
+from __future__ import unicode_literals
+from Queue import Queue
+from threading import Thread
+
+from sideboard.lib import log, DaemonTask
+
+from drafts_as_a_service import config
+
+
+# tells a worker to exit once it has finished everything queued before it
+_STOP = object()
+
+
+class IngestionPipeline(object):
+    """
+    Polls for mentions on a DaemonTask and processes them on a pool of
+    worker threads, so a slow message doesn't hold up polling or every
+    other message.
+
+    Messages are recorded when they're queued and marked processed when
+    they're done, and start() queues any that were recorded but never
+    processed, so stopping or crashing doesn't drop them.
+
+    Each worker has its own bounded queue, and messages are routed to a
+    worker by the bot's routing_key, so messages with the same key are
+    processed in the order they arrived. When a worker's queue is full the
+    poll loop blocks until it drains.
+    """
+    def __init__(self, bot, workers=None, queue_size=None, poll_interval=None):
+        settings = config['ingestion']
+        self.bot = bot
+        self.queues = [
+            Queue(maxsize=queue_size or settings['queue_size'])
+            for _ in xrange(workers or settings['workers'])
+        ]
+        self.poll_interval = poll_interval or settings['poll_interval']
+        self.task = None
+        self.threads = []
+
+    def start(self, poll=True):
+        """
+        Start the workers, and unless told otherwise the poller
+        """
+        self.threads = [
+            Thread(target=self._work, args=(queue,),
+                   name='ingestion-worker-{}'.format(idx))
+            for idx, queue in enumerate(self.queues)
+        ]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+        # whatever was queued when we last stopped or crashed
+        for message in self.bot.poller.unprocessed():
+            self.submit(message)
+
+        if poll:
+            self.task = DaemonTask(self.poll, interval=self.poll_interval)
+            self.task.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop polling, then let the workers finish what's already queued
+        """
+        if self.task is not None:
+            self.task.stop()
+            self.task = None
+
+        for queue in self.queues:
+            queue.put(_STOP)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def poll(self):
+        """
+        Queue up any new mentions, returning how many there were
+        """
+        poller = self.bot.poller
+        messages = poller.collect()
+        # recorded now so they're never collected again, but they're only
+        # marked processed once a worker has finished with them
+        poller.record(messages)
+        for message in messages:
+            self.submit(message)
+        return len(messages)
+
+    def submit(self, message):
+        """
+        Queue a message for its worker, blocking while that queue is full
+        """
+        key = self.bot.routing_key(message)
+        self.queues[hash(key) % len(self.queues)].put(message)
+
+    def join(self):
+        """
+        Wait until everything that's been queued has been processed
+        """
+        for queue in self.queues:
+            queue.join()
+
+    def _work(self, queue):
+        while True:
+            message = queue.get()
+            try:
+                if message is _STOP:
+                    return
+                self.bot.poller.process(message)
+            except Exception:
+                log.error('unable to process message {}'.format(
+                    message['id']), exc_info=True)
+            finally:
+                queue.task_done()
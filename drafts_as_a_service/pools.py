@@ -0,0 +1,82 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import json
+import os
+import uuid
+from collections import namedtuple
+from threading import RLock
+
+from sqlalchemy.exc import IntegrityError
+from sideboard.lib import log
+
+from drafts_as_a_service import sa
+
+
+PoolFile = namedtuple('PoolFile', ['mtime', 'contents', 'content_hash'])
+
+
+class PoolRegistry(object):
+    """
+    Loads each pool file once, and hands out a shared Pool for its contents
+    rather than a new copy for every draft
+    """
+    def __init__(self):
+        self._files = {}
+        # content hash -> Pool id
+        self._pool_ids = {}
+        self._lock = RLock()
+
+    def load(self, path, type='set'):
+        """
+        The contents of a pool file, which are re-read if it has changed
+        """
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            loaded = self._files.get((path, type))
+            if loaded is None or loaded.mtime != mtime:
+                with open(path) as pool_file:
+                    contents = json.load(pool_file)
+                loaded = PoolFile(mtime, contents,
+                                  sa.Pool.hash_contents(type, contents))
+                self._files[(path, type)] = loaded
+            return loaded
+
+    def get(self, session, path, type='set'):
+        """
+        The Pool for a pool file, creating it if no pool has its contents
+        """
+        loaded = self.load(path, type)
+        pool = self._find(session, loaded.content_hash)
+        if pool is None:
+            try:
+                with sa.savepoint(session):
+                    session.connection().execute(
+                        sa.Pool.__table__.insert(), id=uuid.uuid4(),
+                        type=type, contents=loaded.contents,
+                        content_hash=loaded.content_hash)
+            except IntegrityError:
+                log.debug('lost a race creating the pool for {}'.format(path))
+            # whoever created it, it's there now
+            pool = self._find(session, loaded.content_hash)
+
+        with self._lock:
+            self._pool_ids[loaded.content_hash] = pool.id
+        return pool
+
+    def _find(self, session, content_hash):
+        pool = None
+        pool_id = self._pool_ids.get(content_hash)
+        if pool_id is not None:
+            pool = session.query(sa.Pool).get(pool_id)
+        if pool is None:
+            pool = session.query(sa.Pool).filter_by(
+                content_hash=content_hash).first()
+        return pool
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self._pool_ids.clear()
+
+
+registry = PoolRegistry()
@@ -1,19 +1,39 @@
 # coding=utf-8
 from __future__ import unicode_literals
+import json
+import time
 import uuid
 import random
+import sqlite3
+from hashlib import sha1
 
-from copy import copy, deepcopy
-from collections import deque
+from array import array
+from copy import deepcopy
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from itertools import izip
+from threading import RLock
 
 import sqlalchemy
-from sqlalchemy.orm import relationship, backref
-from sqlalchemy.schema import Column, Table, ForeignKey
-from sqlalchemy.types import Integer, String
+from sqlalchemy import event, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm import (relationship, backref, object_session, deferred,
+                            undefer_group)
+from sqlalchemy.orm.collections import attribute_mapped_collection
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.schema import (Column, Table, ForeignKey, Index,
+                               UniqueConstraint, CreateColumn)
+from sqlalchemy.types import (BigInteger, Boolean, Integer, String,
+                              TypeDecorator, UserDefinedType)
 from sqlalchemy.ext.mutable import Mutable
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 
-from drafts_as_a_service import config
-from sideboard.lib.sa import declarative_base, SessionManager, UUID, JSON
+from drafts_as_a_service import config, boosters
+from drafts_as_a_service.serialization import JSON, DraftState
+from sideboard.lib import log
+from sideboard.lib.sa import declarative_base, SessionManager, UUID
 
 
 class DraftError(Exception):
@@ -76,6 +96,207 @@ class MutableList(Mutable, list):
         self.changed()
 
 
+class MutableQueues(Mutable, dict):
+    """
+    Each player's opened and unopened pack queues, which are deques in
+    memory so that taking the next pack doesn't shift the whole queue
+    """
+    @classmethod
+    def coerce(cls, key, value):
+        "Convert plain dictionaries to MutableQueues."
+
+        if not isinstance(value, MutableQueues):
+            if isinstance(value, dict):
+                return MutableQueues(value)
+
+            # this call will raise ValueError
+            return Mutable.coerce(key, value)
+        else:
+            return value
+
+    def __init__(self, queues=()):
+        dict.__init__(self)
+        for name, player_queues in dict(queues).iteritems():
+            dict.__setitem__(self, name, self._as_deques(player_queues))
+
+    def __setitem__(self, key, value):
+        "Detect dictionary set events and emit change events."
+
+        dict.__setitem__(self, key, self._as_deques(value))
+        self.changed()
+
+    def __delitem__(self, key):
+        "Detect dictionary del events and emit change events."
+
+        dict.__delitem__(self, key)
+        self.changed()
+
+    @staticmethod
+    def _as_deques(player_queues):
+        return {queue: deque(packs)
+                for queue, packs in player_queues.iteritems()}
+
+    def as_json(self):
+        """
+        The queues as plain lists, the way they're stored
+        """
+        return {
+            name: {queue: list(packs)
+                   for queue, packs in player_queues.iteritems()}
+            for name, player_queues in self.iteritems()
+        }
+
+
+class QueuesJSON(TypeDecorator):
+    """
+    Stores MutableQueues the same way as a dictionary of lists
+    """
+    impl = DraftState
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, MutableQueues):
+            value = value.as_json()
+        return value
+
+
+class CardArray(TypeDecorator):
+    """
+    A pack of card ids, which is an array in memory and a list of integers
+    in the database
+    """
+    impl = DraftState
+
+    def process_bind_param(self, value, dialect):
+        if value is not None:
+            value = list(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            value = card_array(value)
+        return value
+
+
+class CardArrays(TypeDecorator):
+    """
+    A list of packs of card ids, stored the same way as CardArray
+    """
+    impl = DraftState
+
+    def process_bind_param(self, value, dialect):
+        if value is not None:
+            value = [list(cards) for cards in value]
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            value = [card_array(cards) for cards in value]
+        return value
+
+
+def card_array(cards=()):
+    """
+    The compact representation of a pack, as card ids
+    """
+    return array(b'H', cards)
+
+
+def new_seed():
+    """
+    A fresh draft seed, which fits in a signed BIGINT
+    """
+    return random.SystemRandom().getrandbits(63)
+
+
+# the layout of a draft's state columns: 1 kept every pack's cards in the
+# queues, and each pick's drafted and passed cards, by name; 2 keeps the
+# dealt packs, queues of pack indexes and [pack, position, card id] picks;
+# 3 also keeps how many packs have been opened in each round
+STATE_FORMAT = 3
+
+
+def _sqlite_has_json():
+    try:
+        sqlite3.connect(':memory:').execute("SELECT json('[]')")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+SQLITE_HAS_JSON = _sqlite_has_json()
+
+
+class PostgresJSON(UserDefinedType):
+    def get_col_spec(self):
+        return 'JSON'
+
+
+def json_path(session, column, key):
+    """
+    An expression for column[key], as JSON text, on backends that can pull
+    it out of a JSON column themselves, or None if ours can't; binary
+    columns never can
+    """
+    if column.type.codec.binary:
+        return None
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite' and SQLITE_HAS_JSON and '"' not in key:
+        return func.json_extract(column, '$."{}"'.format(key))
+    elif dialect == 'postgresql':
+        return func.json_extract_path_text(
+            sqlalchemy.cast(column, PostgresJSON()), key)
+
+
+@contextmanager
+def savepoint(session):
+    """
+    A SAVEPOINT in the session's transaction, around statements that may
+    fail without the rest of the transaction having to. SQLite only backs
+    out the statement that failed anyway, and pysqlite can't release a
+    SAVEPOINT made before the transaction has written anything, so there
+    we don't make one.
+    """
+    if session.get_bind().dialect.name == 'sqlite':
+        yield
+    else:
+        with session.begin_nested():
+            yield
+
+
+class PackView(object):
+    """
+    What's left of a dealt pack, along with a card -> position index so
+    that picking from it doesn't have to scan or shift the pack
+    """
+    __slots__ = ('dealt', 'taken', 'remaining', '_positions')
+
+    def __init__(self, dealt):
+        self.dealt = dealt
+        self.taken = bytearray(len(dealt))
+        self.remaining = len(dealt)
+        # the positions of each card, last first, so that duplicates
+        # get taken in the order they were dealt
+        self._positions = {}
+        for idx in xrange(len(dealt) - 1, -1, -1):
+            self._positions.setdefault(dealt[idx], []).append(idx)
+
+    @property
+    def picked(self):
+        return len(self.dealt) - self.remaining
+
+    def take(self, card):
+        positions = self._positions.get(card)
+        if not positions:
+            raise ValueError('{} is not in the pack'.format(card))
+        self.taken[positions.pop()] = 1
+        self.remaining -= 1
+        return card
+
+    def cards(self):
+        return card_array(card for card, taken in izip(self.dealt, self.taken)
+                          if not taken)
+
+
 @declarative_base
 class Base(object):
     id = Column(UUID(), primary_key=True, default=uuid.uuid4)
@@ -96,6 +317,16 @@ class Player(Base):
     handle = Column(String(), nullable=False, unique=True)
     drafts = relationship('Draft', secondary='player_to_draft',
                           backref='players')
+
+    def pending_drafts(self, session):
+        """
+        {draft id: how many packs are waiting on us} for every draft we
+        have a pick to make in
+        """
+        return dict(session.query(
+            PendingPick.draft_id, PendingPick.packs).filter(
+                PendingPick.player == self.handle, PendingPick.packs > 0))
+
     @staticmethod
     def get_or_create(session, handle):
         """
@@ -110,11 +341,107 @@ class Player(Base):
             return instance
 
     @staticmethod
-    def bulk_get_or_create(session, handles):
+    def bulk_get_or_create(session, handles, attempts=3):
+        """
+        Get or create the Players for all of the provided handles, with one
+        query for the ones that already exist and one multi-row INSERT for
+        the rest.
+
+        Missing players are created in a savepoint of the session's
+        transaction, so if someone else creates one of them first we only
+        lose that INSERT, and we look them all up again instead.
+        """
+        handles = list(OrderedDict.fromkeys(handles))
+        found = Player._bulk_get(session, handles)
+        missing = [handle for handle in handles if handle not in found]
+
+        while missing:
+            if not attempts:
+                raise DraftError('unable to create players {}'.format(
+                    ', '.join(missing)))
+            attempts -= 1
+
+            try:
+                with savepoint(session):
+                    session.connection().execute(Player.__table__.insert(), [
+                        {'id': uuid.uuid4(), 'handle': handle}
+                        for handle in missing
+                    ])
+            except IntegrityError:
+                log.debug('lost a race creating players {}'.format(missing))
+            found.update(Player._bulk_get(session, missing))
+            missing = [handle for handle in missing if handle not in found]
+
+        for player in found.itervalues():
+            player_ids.add(player.handle, player.id)
+        return [found[handle] for handle in handles]
+
+    @staticmethod
+    def _bulk_get(session, handles):
         """
-        Call get_or_create for each one of the provided handles.
+        The players that exist for the provided handles, by handle; handles
+        whose ids we know are looked up by primary key instead
         """
-        return [Player.get_or_create(session, handle) for handle in handles]
+        if not handles:
+            return {}
+
+        known = {}
+        for handle in handles:
+            player_id = player_ids.get(handle)
+            if player_id is not None:
+                known[handle] = player_id
+
+        unknown = [handle for handle in handles if handle not in known]
+        criteria = []
+        if known:
+            criteria.append(Player.id.in_(known.values()))
+        if unknown:
+            criteria.append(Player.handle.in_(unknown))
+
+        players = {player.handle: player
+                   for player in session.query(Player).filter(or_(*criteria))}
+        for handle in known:
+            if handle not in players:
+                player_ids.discard(handle)
+        return players
+
+
+class HandleCache(object):
+    """
+    A thread-safe, least recently used mapping of player handles to ids
+    """
+    def __init__(self, size):
+        self.size = size
+        self._ids = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, handle):
+        with self._lock:
+            player_id = self._ids.pop(handle, None)
+            if player_id is not None:
+                self._ids[handle] = player_id
+            return player_id
+
+    def add(self, handle, player_id):
+        if not self.size:
+            return
+
+        with self._lock:
+            self._ids.pop(handle, None)
+            self._ids[handle] = player_id
+            while len(self._ids) > self.size:
+                self._ids.popitem(last=False)
+
+    def discard(self, handle):
+        with self._lock:
+            self._ids.pop(handle, None)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+player_ids = HandleCache(config['player_cache_size'])
 
 
 class Pool(Base):
@@ -126,18 +453,110 @@ class Pool(Base):
     type = Column(String(), nullable=False)
     # the contents of this pool, the structure of this will
     # depend on the type of pool it it is
-    contents = Column(JSON(), nullable=False)
+    # deferred, since it can be an entire cube; anything that deals or
+    # names cards loads it
+    contents = deferred(Column(JSON(), nullable=False), group='contents')
+    # identifies pools with the same type and contents, so they can be
+    # shared between drafts; there's only ever one pool for each
+    content_hash = Column(String(), nullable=True, unique=True)
     default_cards_per_pack = 15
+    # the most distinct cards that fit in a card_array
+    max_cards = 2 ** 16
+
+    @staticmethod
+    def hash_contents(type, contents):
+        """
+        A digest of a pool's type and contents, for content_hash
+        """
+        canonical = json.dumps([type, contents], sort_keys=True,
+                               separators=(',', ':'))
+        return sha1(canonical.encode('utf-8')).hexdigest()
+
+    @property
+    def card_names(self):
+        """
+        Every distinct card in the pool; a card's id is its index in here
+        """
+        if getattr(self, '_card_names', None) is None:
+            if self.type == 'set':
+                names = self.contents
+            elif self.type == 'boosters':
+                names = boosters.card_names(self.contents)
+            else:
+                raise NotImplementedError
+
+            self._card_names = []
+            self._card_ids = {}
+            for name in names:
+                if name not in self._card_ids:
+                    self._card_ids[name] = len(self._card_names)
+                    self._card_names.append(name)
+
+            if len(self._card_names) > self.max_cards:
+                raise DraftError('pools are limited to {} cards, have {}'.format(
+                    self.max_cards, len(self._card_names)
+                ))
+        return self._card_names
+
+    def card_id(self, name):
+        """
+        The id of a card in this pool, given its name
+        """
+        self.card_names
+        try:
+            return self._card_ids[name]
+        except KeyError:
+            raise DraftError('{!r} is not in this pool'.format(name))
+
+    def card_ids(self, names):
+        """
+        The ids of a list of cards, given their names; unlike card_id, this
+        says which of them are missing, rather than just the first
+        """
+        self.card_names
+        missing = set(name for name in names if name not in self._card_ids)
+        if missing:
+            raise DraftError('not in this pool: {}'.format(
+                ', '.join(sorted(missing))))
+        return [self._card_ids[name] for name in names]
 
-    def deal_packs(self, packs, cards_per_pack=None, randomize=True):
+    def names(self, card_ids):
         """
-        a naive booster-draft implementation
+        Resolve card ids back into card names
         """
+        card_names = self.card_names
+        return [card_names[card] for card in card_ids]
+
+    def _forget_views(self):
+        self._card_names = self._card_ids = None
+        self._booster_engine = None
+
+    @property
+    def booster_engine(self):
+        if getattr(self, '_booster_engine', None) is None:
+            try:
+                self._booster_engine = boosters.BoosterEngine(self.contents,
+                                                              self.card_id)
+            except ValueError as e:
+                raise DraftError(unicode(e))
+        return self._booster_engine
+
+    def deal_packs(self, packs, cards_per_pack=None, randomize=True,
+                   seed=None):
+        """
+        a naive booster-draft implementation, packs are dealt as card_arrays
+
+        the same seed always deals the same packs; booster pools get their
+        pack size from their slots, and sample from a numpy generator
+        """
+        if self.type == 'boosters':
+            return self._deal_boosters(packs, cards_per_pack, seed)
+
         if cards_per_pack is None:
             cards_per_pack = self.default_cards_per_pack
 
         if self.type == 'set':
-            cards = copy(self.contents)
+            cards = card_array(self.card_id(name) for name in self.contents)
         else:
             raise NotImplementedError
 
@@ -147,13 +566,26 @@ class Pool(Base):
             ))
 
         if randomize:
-            random.shuffle(cards)
+            random.Random(seed).shuffle(cards)
 
         return deque([
             cards[x:x + cards_per_pack]
             for x in xrange(0, packs * cards_per_pack, cards_per_pack)
         ])
 
+    def _deal_boosters(self, packs, cards_per_pack, seed):
+        engine = self.booster_engine
+        if cards_per_pack not in (None, engine.cards_per_pack):
+            raise DraftError('booster packs have {} cards, not {}'.format(
+                engine.cards_per_pack, cards_per_pack))
+
+        dealt = deque()
+        for pack in engine.sample(packs, boosters.make_rng(seed)):
+            cards = card_array()
+            cards.fromstring(pack.tobytes())
+            dealt.append(cards)
+        return dealt
+
 
 class Draft(Base):
     """
@@ -162,51 +594,443 @@ class Draft(Base):
     """
     pool_id = Column(UUID(), ForeignKey('pool.id'), nullable=False)
     pool = relationship("Pool", backref='drafts')
-    player_picks = Column(MutableDict.as_mutable(JSON), default={},
-                          server_default='{}', nullable=False)
+    # everything random about a draft comes from this, so the packs as they
+    # were dealt are regenerated from it rather than stored; drafts from
+    # before there were seeds have 0, and keep their packs in dealt_packs
+    seed = Column(BigInteger(), nullable=False, default=new_seed,
+                  server_default='0')
+    packs_dealt = Column(Boolean(), nullable=False, default=False,
+                         server_default='0')
+    # packs dealt before drafts had seeds; queues and picks refer to packs
+    # by their index in dealt_packs
+    #
+    # the packs, picks and queues are deferred as the 'state' group, so
+    # listing drafts doesn't load them; touching any of them loads them all
+    stored_packs = deferred(Column('dealt_packs', CardArrays(), default=[],
+                                   server_default='[]', nullable=False),
+                            group='state')
+    # each player's picks, as [pack, position in pack, card]
+    player_picks = deferred(Column(MutableDict.as_mutable(DraftState),
+                                   default={}, server_default='{}',
+                                   nullable=False),
+                            group='state')
     player_order = Column(MutableList.as_mutable(JSON), default=[], server_default='[]',
                           nullable=False)
-    player_queues = Column(MutableDict.as_mutable(JSON), default={},
-                           server_default='{}', nullable=False)
+    player_queues = deferred(Column(MutableQueues.as_mutable(QueuesJSON),
+                                    default={}, server_default='{}',
+                                    nullable=False),
+                             group='state')
     # performance enhancement for not having to query the foreign keys
     num_players = Column(Integer(), nullable=False)
+    # where the draft is at, kept up to date by every open, pick and pass:
+    # the latest round anyone has opened a pack for (-1 before anyone has),
+    # the latest round everyone has, how many packs have been opened in
+    # each round, how many cards are left in opened packs, and how many
+    # packs each player has waiting on them
+    current_round = Column(Integer(), nullable=False, default=-1,
+                           server_default='-1')
+    opened_round = Column(Integer(), nullable=False, default=-1,
+                          server_default='-1')
+    packs_opened = Column(MutableList.as_mutable(JSON), default=[],
+                          server_default='[]', nullable=False)
+    cards_in_play = Column(Integer(), nullable=False, default=0,
+                           server_default='0')
+    pending_picks = Column(MutableDict.as_mutable(DraftState), default={},
+                           server_default='{}', nullable=False)
+    # "json" drafts keep their state in the columns above, "normalized"
+    # drafts keep it in the draft_pack and draft_pick tables
+    storage = Column(String(), nullable=False, default='json',
+                     server_default='json')
+    # bumped by every UPDATE, which only applies if it still matches
+    version = Column(Integer(), nullable=False, server_default='1')
+    # which STATE_FORMAT the state columns were written in; rows from
+    # before there was one are the baseline format, 1
+    state_format = Column(Integer(), nullable=False, default=STATE_FORMAT,
+                          server_default='1')
+    # the last entry in the engine's pick log this draft was written with
+    log_sequence = Column(Integer(), nullable=False, default=0,
+                          server_default='0')
+    packs = relationship('DraftPack', backref='draft',
+                         order_by='DraftPack.position',
+                         cascade='all, delete-orphan')
+    picks = relationship('DraftPick', backref='draft',
+                         order_by='DraftPick.number',
+                         cascade='all, delete-orphan')
+    pending = relationship('PendingPick', backref='draft',
+                           collection_class=attribute_mapped_collection(
+                               'player'),
+                           cascade='all, delete-orphan')
+
+    rounds = 3
+
+    __mapper_args__ = {
+        'polymorphic_on': storage,
+        'polymorphic_identity': 'json',
+        'version_id_col': version,
+    }
 
     def __init__(self, *args, **kwargs):
         Base.__init__(self, *args, **kwargs)
+        if self.seed is None:
+            self.seed = new_seed()
         self.seat_players(randomize=False)
 
-    def distribute(self):
+    @staticmethod
+    def update(draft_id, change, attempts=None, lock=None):
+        """
+        Load a draft in a new session, call change(draft) and commit,
+        returning what change returned.
+
+        If another writer updated the draft after we loaded it, the commit
+        fails on the version check (or on draft_event's unique constraint,
+        for event-sourced drafts), and we reload it and call change again.
+        With lock, the draft is selected FOR UPDATE, on backends that
+        support it, so writers queue up instead of retrying.
+        """
+        if attempts is None:
+            attempts = config['draft_update_attempts']
+        if lock is None:
+            lock = config['lock_drafts']
+
+        for attempt in xrange(1, attempts + 1):
+            try:
+                with Session() as session:
+                    query = session.query(Draft).options(
+                        undefer_group('state'))
+                    if lock:
+                        query = query.with_lockmode('update')
+                    draft = query.get(draft_id)
+                    if draft is None:
+                        raise DraftError('no draft {}'.format(draft_id))
+                    draft.upgrade()
+                    result = change(draft)
+                return result
+            except (StaleDataError, IntegrityError):
+                if attempt == attempts:
+                    raise
+                log.debug('draft {} changed underneath us, retrying'.format(
+                    draft_id))
+
+    @staticmethod
+    def create_many(session, pool, pods, start=False, randomize=True,
+                    seed=None):
+        """
+        Create and deal a draft for each pod, a list of Players or handles,
+        all from the same pool, returning the drafts and {step: seconds}.
+
+        Booster pools deal every pod's packs in one vectorized sample, which
+        each draft then stores, since its seed didn't deal them; a set only
+        has one draft's worth of cards, so each pod shuffles its own from
+        its seed. Every row gets its id up front, so that flushing INSERTs
+        each table's rows with a single executemany; committing is up to
+        the caller, so it all happens in their one transaction.
+        """
+        timings = OrderedDict()
+        started = time.time()
+        handles = [player for pod in pods for player in pod
+                   if isinstance(player, basestring)]
+        players = {}
+        if handles:
+            players = {player.handle: player for player
+                       in Player.bulk_get_or_create(session, handles)}
+        pods = [[players.get(player, player) for player in pod]
+                for pod in pods]
+        timings['players'] = time.time() - started
+
+        started = time.time()
+        dealt = [None] * len(pods)
+        if pool.type == 'boosters':
+            rng = random.Random(seed)
+            batch = pool.deal_packs(sum(Draft.rounds * len(pod)
+                                        for pod in pods),
+                                    seed=rng.getrandbits(32))
+            dealt = [[batch.popleft() for _ in xrange(Draft.rounds * len(pod))]
+                     for pod in pods]
+        else:
+            # shuffling reads the pool's cards, so do that once up front
+            pool.card_names
+        timings['deal'] = time.time() - started
+
+        started = time.time()
+        drafts = []
+        for pod, packs in izip(pods, dealt):
+            draft = Draft(id=uuid.uuid4(), players=pod, pool=pool)
+            if randomize:
+                draft.randomize_seating()
+            draft.distribute(packs)
+            if start:
+                draft._open_round()
+            for row in draft.pending.itervalues():
+                row.id = uuid.uuid4()
+            drafts.append(draft)
+        timings['seat'] = time.time() - started
+
+        started = time.time()
+        session.add_all(drafts)
+        session.flush()
+        timings['insert'] = time.time() - started
+        return drafts, timings
+
+    @staticmethod
+    def summaries(session, draft_ids=None, limit=None, offset=0):
+        """
+        The summary of every draft, or of the ones with the given ids, in
+        two queries and without loading any of their state; limit and
+        offset page through them in id order
+        """
+        query = session.query(Draft).order_by(Draft.id)
+        if draft_ids is not None:
+            query = query.filter(Draft.id.in_(list(draft_ids)))
+        page = query.offset(offset).limit(limit)
+        drafts = page.all()
+
+        waiting = {}
+        if drafts:
+            # joined to the same page, rather than an IN list of its ids
+            ids = page.with_entities(Draft.id).subquery()
+            pending = session.query(PendingPick).join(
+                ids, PendingPick.draft_id == ids.c.id).filter(
+                    PendingPick.packs > 0)
+            for row in pending:
+                waiting.setdefault(row.draft_id, {})[row.player] = row.packs
+        return [draft.summary(waiting.get(draft.id, {})) for draft in drafts]
+
+    def summary(self, waiting=None):
+        """
+        The draft's metadata, and who it's waiting on, as a dictionary;
+        unless we're told who that is, we work it out from the draft
+        """
+        return {
+            'id': self.id,
+            'storage': self.storage,
+            'players': list(self.player_order),
+            'packs_dealt': self.packs_dealt,
+            'version': self.version,
+            'waiting': self._waiting() if waiting is None else waiting,
+        }
+
+    @staticmethod
+    def read(session, draft_id, method, *args):
+        """
+        Call one of a draft's read-only methods, e.g. 'phase', on a draft
+        loaded in session, rather than through update
+        """
+        draft = session.query(Draft).options(
+            undefer_group('state')).get(draft_id)
+        if draft is None:
+            raise DraftError('no draft {}'.format(draft_id))
+        draft.upgrade()
+        return getattr(draft, method)(*args)
+
+    @staticmethod
+    def queue_of(session, draft_id, player):
+        """
+        A player's queues as {'opened': [pack, ...], 'unopened': [...]},
+        where packs are indexes into the draft's dealt packs
+        """
+        return Draft._player_slice(session, draft_id, 'player_queues',
+                                   player, 'queue_entries')
+
+    @staticmethod
+    def picks_of(session, draft_id, player):
+        """
+        A player's picks as [pack, position in pack, card id], in order
+        """
+        return Draft._player_slice(session, draft_id, 'player_picks',
+                                   player, 'pick_entries')
+
+    @staticmethod
+    def picks_of_since(session, draft_id, player, since=0):
+        """
+        picks_since for a draft we haven't loaded, loading only the
+        player's picks and the pool's cards
+        """
+        pool = session.query(Pool).join(Draft.pool).filter(
+            Draft.id == draft_id).first()
+        if pool is None:
+            raise DraftError('no draft {}'.format(draft_id))
+        return Draft._named_picks(
+            pool, Draft.picks_of(session, draft_id, player), since)
+
+    def picks_since(self, player, since=0):
         """
-        Hand out all the packs
+        A player's picks after their first `since`, as dictionaries of the
+        pick's number, counting from 0, the pack and the card drafted
         """
-        packs = self.pool.deal_packs(3 * self.num_players)
+        return Draft._named_picks(self.pool, self.pick_entries(player), since)
+
+    @staticmethod
+    def _named_picks(pool, entries, since):
+        if since < 0:
+            raise DraftError('since has to be at least 0, not {}'.format(
+                since))
+        new = entries[since:]
+        names = pool.names([card for _, _, card in new])
+        return [{'number': since + idx, 'pack': pack, 'drafted': name}
+                for idx, ((pack, _, _), name) in enumerate(izip(new, names))]
+
+    @staticmethod
+    def _player_slice(session, draft_id, column, player, method):
+        """
+        One player's part of a state column, pulled out by the database
+        where it can be, and otherwise by calling the draft's method
+        """
+        name = player if isinstance(player, basestring) else player.handle
+        path = json_path(session, Draft.__table__.c[column], name)
+        if path is not None:
+            row = session.query(Draft.storage, Draft.state_format,
+                                path).filter(Draft.id == draft_id).first()
+            if row is None:
+                raise DraftError('no draft {}'.format(draft_id))
+            storage, state_format, value = row
+            # other storage doesn't keep its state in the draft's columns,
+            # and older formats have to be converted first
+            if storage == 'json' and state_format == STATE_FORMAT:
+                if value is None:
+                    raise DraftError('{} is not in draft {}'.format(
+                        name, draft_id))
+                return json.loads(value)
+
+        draft = session.query(Draft).options(
+            undefer_group('state')).get(draft_id)
+        if draft is None:
+            raise DraftError('no draft {}'.format(draft_id))
+        if name not in draft.player_order:
+            raise DraftError('{} is not in draft {}'.format(name, draft_id))
+        draft.upgrade()
+        return getattr(draft, method)(name)
+
+    def queue_entries(self, player):
+        """
+        A player's queues the way queue_of returns them
+        """
+        self._sync()
+        return {queue: list(packs) for queue, packs
+                in self.player_queues[self._get_name(player)].iteritems()}
+
+    def opened_for(self, player):
+        """
+        The cards left in each pack a player has opened, the one in front
+        of them first, along with the pack numbers in their queues the way
+        queue_entries has them
+        """
+        return {'opened': self.queues_for(player)['opened'],
+                'packs': self.queue_entries(player)}
+
+    def pick_entries(self, player):
+        """
+        A player's picks the way picks_of returns them
+        """
+        self._sync()
+        return [list(pick)
+                for pick in self.player_picks[self._get_name(player)]]
+
+    def load(self):
+        """
+        Load everything the draft's methods need from the database up
+        front, so that using it afterwards doesn't have to
+        """
+        self.upgrade()
+        self.pool.card_names
+        self.dealt_packs
+        self.pending
+
+    def rng(self, stream):
+        """
+        A random.Random for one part of the draft, e.g. 'seating' or 'deal';
+        each stream is derived from the draft's seed independently, so
+        drawing from one never changes what another produces
+        """
+        return random.Random(self.stream_seed(stream))
+
+    def stream_seed(self, stream):
+        digest = sha1('{}:{}'.format(self.seed, stream).encode('utf-8'))
+        return int(digest.hexdigest()[:8], 16)
+
+    def deal(self):
+        """
+        The packs this draft's seed deals, as a deque of card_arrays
+        """
+        return self.pool.deal_packs(self.rounds * self.num_players,
+                                    seed=self.stream_seed('deal'))
+
+    @property
+    def dealt_packs(self):
+        """
+        Every pack as it was dealt, regenerated from the seed
+        """
+        if self.stored_packs:
+            return self.stored_packs
+        if not self.packs_dealt:
+            return []
+        if getattr(self, '_dealt_packs', None) is None:
+            self._dealt_packs = list(self.deal())
+        return self._dealt_packs
+
+    def distribute(self, packs=None):
+        """
+        Hand out all the packs; packs we're given rather than dealt from
+        our seed are stored with the draft, since it can't deal them again
+        """
+        if packs is None:
+            packs = self.deal()
+        else:
+            self.stored_packs = list(packs)
 
         assert packs
-        for idx in xrange(3):
+        self.packs_dealt = True
+        self._queue_packs(packs)
+
+    def start(self):
+        """
+        Hand out all the packs, and have everyone open their first one
+        """
+        self.distribute()
+        self._open_round()
+
+    def _queue_packs(self, packs):
+        self._pack_views = None
+        self._dealt_packs = list(packs)
+        self._reset_phase()
+        pack = 0
+        for idx in xrange(self.rounds):
             for player in self.player_order:
-                self.player_queues[player]['unopened'].\
-                    append(packs.popleft())
+                self.player_queues[player]['unopened'].append(pack)
+                pack += 1
         # http://docs.sqlalchemy.org/en/rel_0_8/orm/extensions/mutable.html
         # the mutable dict approach doesn't work for sub-dictionaries
         self.player_queues.changed()
 
     def open_pack(self, player):
-        queues = self.player_queues[self._get_name(player)]
-        # this isn't a deque because the tests are uglier and
-        # I don't expect the performance to actually suffer
-        queues['opened'].append(queues['unopened'].pop(0))
+        name = self._get_name(player)
+        queues = self.player_queues[name]
+        pack = queues['unopened'].popleft()
+        queues['opened'].append(pack)
         self.player_queues.changed()
+        self._opened(name, pack, self._pack(pack).remaining)
 
     def make_pick(self, player, pick):
-        name = self._get_name(player)
-        current_pack = self.player_queues[name]['opened'][0]
-        selection = current_pack.pop(current_pack.index(pick))
-        self.player_picks[name].append({
-            'drafted': selection,
-            'passed': copy(current_pack)
-        })
-        self.player_queues.changed()
+        """
+        Take a card from the pack in front of a player, returning whether
+        there's anything left in it to pass; a pack that's been emptied is
+        done with, and leaves the player's queue
+        """
+        return self._make_pick(self._get_name(player),
+                               self.pool.card_id(pick))
+
+    def _make_pick(self, name, card):
+        pack = self.player_queues[name]['opened'][0]
+        current_pack = self._pack(pack)
+        position = current_pack.picked
+        selection = current_pack.take(card)
+        self.player_picks[name].append([pack, position, selection])
         self.player_picks.changed()
+        if not current_pack.remaining:
+            self.player_queues[name]['opened'].popleft()
+            self.player_queues.changed()
+        self._picked(name, pack, selection,
+                     finished=not current_pack.remaining)
+        return bool(current_pack.remaining)
 
     def pass_left(self, player):
         return self._pass_pack(player, 1)
@@ -215,22 +1039,312 @@ class Draft(Base):
         return self._pass_pack(player, -1)
 
     def _pass_pack(self, player, step):
+        """
+        Pass the pack in front of a player one seat along step, or the way
+        the pack's round goes if step is None
+        """
         name = self._get_name(player)
-        player_seat = self.player_order.index(name)
-        next_player = self.player_order[(player_seat + step) %
-                                        self.num_players]
-        self.player_queues[next_player]['opened'].append(
-            self.player_queues[name]['opened'].pop(0)
-        )
+        pack = self.player_queues[name]['opened'].popleft()
+        if step is None:
+            step = self._round_step(pack // self.num_players)
+        next_player = self._neighbor(name, step)
+        self.player_queues[next_player]['opened'].append(pack)
         self.player_queues.changed()
+        self._passed(name, next_player, pack)
+
+    def pick(self, player, pick):
+        """
+        Make a pick and pass what's left the way this round goes; once the
+        last card of a round is taken, everyone opens their next pack
+        """
+        if self.make_pick(player, pick):
+            self._pass_pack(player, None)
+        self._sync()
+        if not self.cards_in_play and self.current_round < self.rounds - 1:
+            self._open_round()
+
+    @property
+    def direction(self):
+        """
+        Which way packs go in the round everyone is in, i.e. the latest one
+        every player has opened a pack for, or None before the deal
+        """
+        self._sync()
+        if not self.packs_dealt:
+            return None
+        return 'left' if self.step == 1 else 'right'
+
+    @property
+    def step(self):
+        """
+        The seat step packs in the round everyone is in are passed with
+        """
+        self._sync()
+        # before everyone opens a pack, the first round is the one coming up
+        return self._round_step(max(self.opened_round, 0))
+
+    @staticmethod
+    def _round_step(round_number):
+        return -1 if round_number % 2 else 1
+
+    @property
+    def finished(self):
+        self._sync()
+        return (self.current_round == self.rounds - 1 and
+                not self.cards_in_play)
+
+    def phase(self):
+        """
+        Where the draft is at, as a dictionary
+        """
+        self._sync()
+        return {
+            'round': self.current_round,
+            'direction': self.direction,
+            'cards_in_play': self.cards_in_play,
+            'pending': dict(self.pending_picks),
+            'finished': self.finished,
+        }
+
+    def pending_for(self, player):
+        """
+        How many opened packs are waiting on a player
+        """
+        self._sync()
+        return self.pending_picks.get(self._get_name(player), 0)
+
+    def whose_turn(self):
+        """
+        The players with a pack in front of them, in seat order
+        """
+        self._sync()
+        return [name for name in self.player_order
+                if self.pending_picks.get(name)]
+
+    def _sync(self):
+        """
+        Make sure the phase columns are up to date; for drafts that don't
+        keep them in their row, this works them out after a (re)load, so
+        read them through phase() and friends rather than directly
+        """
+
+    def waiting_on(self):
+        """
+        {player: how many packs are waiting on them} for everyone with a
+        pick to make, from the pending_pick table if we've been saved
+        """
+        session = object_session(self)
+        if session is None or self.id is None:
+            return self._waiting()
+        return dict(session.query(PendingPick.player, PendingPick.packs)
+                    .filter(PendingPick.draft_id == self.id,
+                            PendingPick.packs > 0))
+
+    def _waiting(self):
+        self._sync()
+        return {name: packs for name, packs in self.pending_picks.iteritems()
+                if packs}
+
+    def _open_round(self):
+        for name in self.player_order:
+            self.open_pack(name)
+
+    def _reset_phase(self):
+        self._track(current_round=-1, opened_round=-1, packs_opened=[],
+                    cards_in_play=0)
+        self.pending_picks = {name: 0 for name in self.player_order}
+        self._index_pending(*self.player_order)
+
+    def _opened(self, name, pack, cards):
+        self.pending_picks[name] = self.pending_picks.get(name, 0) + 1
+        round_number = pack // self.num_players
+        packs_opened = list(self.packs_opened)
+        packs_opened.extend([0] * (round_number + 1 - len(packs_opened)))
+        packs_opened[round_number] += 1
+        self._track(cards_in_play=self.cards_in_play + cards,
+                    current_round=max(self.current_round, round_number),
+                    **self._rounds_opened(packs_opened, self.opened_round))
+        self._index_pending(name)
+        self._changed(type='opened', player=name, pack=pack, cards=cards)
+
+    def _picked(self, name, pack, card, finished):
+        if finished:
+            self.pending_picks[name] -= 1
+            self._index_pending(name)
+        self._track(cards_in_play=self.cards_in_play - 1)
+        self._changed(type='picked', player=name, pack=pack, card=card)
+
+    def _passed(self, name, next_player, pack):
+        self.pending_picks[name] -= 1
+        self.pending_picks[next_player] = (
+            self.pending_picks.get(next_player, 0) + 1)
+        self._index_pending(name, next_player)
+        self._changed(type='passed', player=name, to=next_player, pack=pack)
+
+    def _changed(self, **change):
+        if getattr(self, '_changes', None) is None:
+            self._changes = []
+        self._changes.append(change)
+
+    def take_changes(self):
+        """
+        What's been opened, picked and passed since we last took them, as
+        dictionaries, oldest first; picked cards are named
+        """
+        changes, self._changes = getattr(self, '_changes', None) or [], []
+        for change in changes:
+            if 'card' in change:
+                change['card'] = self.pool.names([change['card']])[0]
+        return changes
+
+    def _index_pending(self, *names):
+        """
+        Copy players' pending counts into the pending_pick table
+        """
+        for name in names:
+            packs = self.pending_picks.get(name, 0)
+            row = self.pending.get(name)
+            if row is None:
+                self.pending[name] = PendingPick(player=name, packs=packs)
+            elif row.packs != packs:
+                row.packs = packs
+
+    def _track(self, **values):
+        for key, value in values.iteritems():
+            setattr(self, key, value)
+
+    def _rounds_opened(self, packs_opened, opened_round=-1):
+        """
+        The packs_opened and opened_round to track, given how many packs
+        have been opened in each round and a round everyone has opened; a
+        round everyone has opened is one with a pack opened per player
+        """
+        while (opened_round + 1 < len(packs_opened) and
+               packs_opened[opened_round + 1] == self.num_players):
+            opened_round += 1
+        return {'packs_opened': packs_opened, 'opened_round': opened_round}
+
+    def _count_opened(self, packs):
+        """
+        How many of the given (opened) pack numbers are in each round
+        """
+        packs_opened = []
+        for pack in packs:
+            round_number = pack // self.num_players
+            packs_opened.extend([0] * (round_number + 1 - len(packs_opened)))
+            packs_opened[round_number] += 1
+        return packs_opened
+
+    def _rebuild_phase(self):
+        """
+        Work out where the draft is at from its queues and picks
+        """
+        opened = {name: list(queues['opened'])
+                  for name, queues in self.player_queues.iteritems()}
+        started = [pack for packs in opened.itervalues() for pack in packs]
+        started += [pick[0] for picks in self.player_picks.itervalues()
+                    for pick in picks]
+        self._track(
+            current_round=max([pack // self.num_players
+                               for pack in started] or [-1]),
+            cards_in_play=sum(self._pack(pack).remaining
+                              for packs in opened.itervalues()
+                              for pack in set(packs)),
+            pending_picks=MutableDict((name, len(packs))
+                                      for name, packs in opened.iteritems()),
+            **self._rounds_opened(self._count_opened(set(started))))
+
+    def _neighbor(self, name, step):
+        self._index_seats()
+        return self._left[name] if step == 1 else self._right[name]
+
+    def seat(self, player):
+        """
+        Where a player is sitting, as their index in player_order
+        """
+        self._index_seats()
+        return self._seats[self._get_name(player)]
+
+    def _index_seats(self, force=False):
+        """
+        Build the seat and neighbor lookups from player_order; they're
+        rebuilt whenever the draft is loaded or players are (re)seated
+        """
+        if force or getattr(self, '_seats', None) is None:
+            order = self.player_order
+            self._seats = {name: seat for seat, name in enumerate(order)}
+            self._left = dict(zip(order, order[1:] + order[:1]))
+            self._right = dict(zip(order, order[-1:] + order[:-1]))
 
     def make_pick_and_pass_left(self, player, pick):
-        self.make_pick(player, pick)
-        self.pass_left(player)
+        if self.make_pick(player, pick):
+            self.pass_left(player)
 
     def make_pick_and_pass_right(self, player, pick):
-        self.make_pick(player, pick)
-        self.pass_right(player)
+        if self.make_pick(player, pick):
+            self.pass_right(player)
+
+    def pack_for(self, player):
+        """
+        The cards in the pack in front of a player, or None if they're
+        waiting on one
+        """
+        opened = self.player_queues[self._get_name(player)]['opened']
+        if opened:
+            return self.pool.names(self._pack(opened[0]).cards())
+
+    def queues_for(self, player):
+        """
+        The opened and unopened packs waiting on a player, as lists of cards
+        """
+        queues = self.player_queues[self._get_name(player)]
+        return {
+            queue: [self.pool.names(self._pack(pack).cards())
+                    for pack in packs]
+            for queue, packs in queues.iteritems()
+        }
+
+    def picks_for(self, player):
+        """
+        A player's picks, in order, as dictionaries of the card that was
+        drafted and what was left in the pack that got passed
+        """
+        drafted = self._drafted_by_pack()
+        picks = []
+        for pack, position, card in self.player_picks[self._get_name(player)]:
+            passed = card_array(self.dealt_packs[pack])
+            for idx in xrange(position + 1):
+                passed.remove(drafted[pack][idx])
+            picks.append({'drafted': self.pool.names([card])[0],
+                          'passed': self.pool.names(passed)})
+        return picks
+
+    def _drafted_by_pack(self):
+        """
+        Replay the pick log into {pack: {position: card}}
+        """
+        drafted = {}
+        for picks in self.player_picks.itervalues():
+            for pack, position, card in picks:
+                drafted.setdefault(pack, {})[position] = card
+        return drafted
+
+    def _pack(self, pack):
+        """
+        What's left in a pack; this is a view built from the dealt packs and
+        the pick log, which is cached until the draft is reloaded
+        """
+        if getattr(self, '_pack_views', None) is None:
+            views = [PackView(cards) for cards in self.dealt_packs]
+            for idx, drafted in self._drafted_by_pack().iteritems():
+                for position in sorted(drafted):
+                    views[idx].take(drafted[position])
+            self._pack_views = views
+        return self._pack_views[pack]
+
+    def _forget_views(self):
+        self._pack_views = self._dealt_packs = None
+        self._seats = self._left = self._right = None
 
     def _get_name(self, player):
         """
@@ -242,7 +1356,14 @@ class Draft(Base):
             return player.handle
 
     def randomize_seating(self):
-        random.shuffle(self.player_order)
+        """
+        Seat players in the order the seed gives; players are sorted first,
+        so that order doesn't depend on the order they were added in
+        """
+        order = sorted(self.player_order)
+        self.rng('seating').shuffle(order)
+        self.player_order = order
+        self._index_seats(force=True)
 
     def seat_players(self, randomize=True):
         self.num_players = len(self.players)
@@ -255,6 +1376,8 @@ class Draft(Base):
         }
 
         self.player_order = [p.handle for p in self.players]
+        self._index_seats(force=True)
+        self._reset_phase()
 
         if randomize:
             self.randomize_seating()
@@ -263,20 +1386,779 @@ class Draft(Base):
         self.player_picks.changed()
         return self.player_order
 
+    def normalize(self):
+        """
+        Copy the state of a JSON-backed draft into the draft_pack and
+        draft_pick tables and switch it over to normalized storage.
+
+        The instance keeps its class until it's expunged, so re-fetch it
+        from a new session to get a NormalizedDraft back.
+        """
+        if self.storage != 'json':
+            raise DraftError('draft {} is already {}'.format(self.id,
+                                                              self.storage))
+        self.upgrade()
+        rows = {}
+        position = 0
+        for name in self.player_order:
+            for opened in (False, True):
+                queue = self.player_queues[name]['opened' if opened
+                                                 else 'unopened']
+                for pack in queue:
+                    rows[pack] = DraftPack(
+                        draft=self, number=pack, holder=name, opened=opened,
+                        position=position,
+                        dealt=self.dealt_packs[pack],
+                        cards=list(self._pack(pack).cards()))
+                    position += 1
+
+        # packs that have been picked clean aren't in anyone's queue
+        for name, picks in self.player_picks.iteritems():
+            for pack, pick_position, card in picks:
+                if pack not in rows:
+                    rows[pack] = DraftPack(
+                        draft=self, number=pack, holder=name, opened=True,
+                        position=position, dealt=self.dealt_packs[pack],
+                        cards=[])
+                    position += 1
+
+        for name, picks in self.player_picks.iteritems():
+            for number, (pack, pick_position, card) in enumerate(picks):
+                DraftPick(draft=self, player=name, number=number, card=card,
+                          pack=rows[pack], pack_pick=pick_position + 1)
+
+        self.player_queues = {}
+        self.player_picks = {}
+        self.storage = 'normalized'
+
+    @staticmethod
+    def upgrade_all(session, batch_size=100):
+        """
+        Convert every draft still in an older STATE_FORMAT, a batch at a
+        time, returning how many there were; committing is up to the caller
+        """
+        upgraded = 0
+        while True:
+            drafts = session.query(Draft).options(
+                undefer_group('state')).filter(
+                Draft.state_format < STATE_FORMAT).limit(batch_size).all()
+            if not drafts:
+                return upgraded
+            for draft in drafts:
+                draft.upgrade()
+            session.flush()
+            upgraded += len(drafts)
+
+    def upgrade(self):
+        """
+        Convert state written in an older STATE_FORMAT to the current one;
+        a draft that's already current is left alone
+        """
+        if self.state_format < STATE_FORMAT:
+            if self._legacy_state():
+                self._upgrade_legacy()
+            elif self.storage == 'json':
+                # format 2 didn't count the packs opened in each round
+                self._rebuild_phase()
+            self.state_format = STATE_FORMAT
+
+    def _legacy_state(self):
+        """
+        Whether our state is in the baseline format, where picks are
+        dictionaries and queues hold packs of cards
+        """
+        return (any(isinstance(pick, dict)
+                    for picks in self.player_picks.itervalues()
+                    for pick in picks) or
+                any(not isinstance(pack, (int, long))
+                    for queues in self.player_queues.itervalues()
+                    for packs in queues.itervalues() for pack in packs))
+
+    def _upgrade_legacy(self):
+        """
+        Rebuild the dealt packs, and the queues and picks that refer to
+        them, from baseline state.
+
+        What a pick drafted and passed is what its pack held before it,
+        which is what the pack's previous pick passed, so following those
+        gives each pack's picks in order. Everyone was dealt a pack a round
+        and opened them in order, so who opened a pack, and how many they'd
+        opened before it, gives the index distribute() would have given it.
+        """
+        card_ids = self.pool.card_ids
+        # each pack's first holder, what it was dealt and its picks, and
+        # the packs that are still being picked from, by what's left
+        packs, left = [], {}
+
+        def add(holder, cards, order):
+            packs.append({'holder': holder, 'dealt': cards, 'picks': [],
+                          'order': order})
+            return packs[-1]
+
+        picks = []
+        for name, player_picks in self.player_picks.iteritems():
+            for number, pick in enumerate(player_picks):
+                cards = card_ids([pick['drafted']] + list(pick['passed']))
+                picks.append((name, number, cards[0], cards[1:]))
+        # a pack gets smaller with every pick, so its first pick is first
+        picks.sort(key=lambda pick: -len(pick[3]))
+        for name, number, drafted, passed in picks:
+            before = tuple(sorted(passed + [drafted]))
+            if left.get(before):
+                pack = left[before].pop()
+            else:
+                pack = add(name, [drafted] + passed, (0, number))
+            pack['picks'].append((name, number, drafted))
+            if passed:
+                left.setdefault(tuple(sorted(passed)), []).append(pack)
+
+        queues = {name: {'opened': [], 'unopened': []}
+                  for name in self.player_queues}
+        for queue in ('opened', 'unopened'):
+            for name, player_queues in self.player_queues.iteritems():
+                for cards in player_queues[queue]:
+                    # packs that were picked clean stayed in the queue
+                    if not cards:
+                        continue
+                    cards = card_ids(cards)
+                    remaining = tuple(sorted(cards))
+                    if queue == 'opened' and left.get(remaining):
+                        pack = left[remaining].pop()
+                    else:
+                        pack = add(name, cards, (1, len(packs)))
+                    queues[name][queue].append(pack)
+
+        held = {}
+        for pack in sorted(packs, key=lambda pack: pack['order']):
+            held.setdefault(pack['holder'], []).append(pack)
+        dealt = [None] * (self.rounds * self.num_players)
+        for name, their_packs in held.iteritems():
+            if len(their_packs) > self.rounds:
+                raise DraftError('{} has more than {} packs in draft {}'
+                                 .format(name, self.rounds, self.id))
+            for idx, pack in enumerate(their_packs):
+                pack['number'] = (idx * self.num_players +
+                                  self.player_order.index(name))
+                dealt[pack['number']] = card_array(pack['dealt'])
+        if packs and None in dealt:
+            raise DraftError('draft {} is missing packs'.format(self.id))
+
+        player_picks = {name: [] for name in self.player_picks}
+        for pack in packs:
+            for position, (name, number, card) in enumerate(pack['picks']):
+                player_picks[name].append(
+                    (number, [pack['number'], position, card]))
+
+        self.stored_packs = dealt if packs else []
+        self.packs_dealt = bool(packs)
+        self.player_picks = {name: [pick for _, pick in sorted(entries)]
+                             for name, entries in player_picks.iteritems()}
+        self.player_queues = {
+            name: {queue: [pack['number'] for pack in queue_packs]
+                   for queue, queue_packs in player_queues.iteritems()}
+            for name, player_queues in queues.iteritems()}
+        self._forget_views()
+        self._rebuild_phase()
+        self._index_pending(*self.player_order)
+
     def __setattr__(self, key, value):
         Base.__setattr__(self, key, value)
         if key == 'players':
             self.seat_players()
 
 
+class NormalizedDraft(Draft):
+    """
+    A Draft whose packs and picks live in their own rows, so a pick is an
+    INSERT into draft_pick plus an UPDATE of one draft_pack, rather than a
+    rewrite of every player's queues and picks.
+    """
+    __tablename__ = None
+    __mapper_args__ = {'polymorphic_identity': 'normalized'}
+
+    def distribute(self, packs=None):
+        """
+        Hand out all the packs, storing them if we're given them, as
+        Draft.distribute does
+        """
+        if packs is None:
+            packs = self.deal()
+        else:
+            self.stored_packs = list(packs)
+            packs = deque(packs)
+
+        assert packs
+        self.packs_dealt = True
+        self._reset_phase()
+        number = 0
+        for idx in xrange(self.rounds):
+            for player in self.player_order:
+                cards = packs.popleft()
+                position = self._next_position()
+                self._queue(player, opened=False).append(DraftPack(
+                    draft=self, number=number, holder=player, opened=False,
+                    position=position, dealt=cards, cards=list(cards)))
+                number += 1
+
+    def open_pack(self, player):
+        self._sync()
+        name = self._get_name(player)
+        pack = self._queue(name, opened=False).popleft()
+        pack.opened = True
+        pack.position = self._next_position()
+        self._queue(name, opened=True).append(pack)
+        self._opened(name, pack.number, len(pack.cards))
+
+    def make_pick(self, player, pick):
+        self._sync()
+        name = self._get_name(player)
+        current_pack = self._queue(name, opened=True)[0]
+        selection = current_pack.cards.pop(current_pack.cards.index(
+            self.pool.card_id(pick)))
+        current_pack.cards.changed()
+        picks = self._picks(name)
+        picks.append(DraftPick(
+            draft=self, player=name, number=len(picks), card=selection,
+            pack=current_pack,
+            pack_pick=len(current_pack.dealt) - len(current_pack.cards)))
+        if not current_pack.cards:
+            self._queue(name, opened=True).popleft()
+        self._picked(name, current_pack.number, selection,
+                     finished=not current_pack.cards)
+        return bool(current_pack.cards)
+
+    def pack_for(self, player):
+        opened = self._queue(self._get_name(player), opened=True)
+        if opened:
+            return self.pool.names(opened[0].cards)
+
+    def _pass_pack(self, player, step):
+        self._sync()
+        name = self._get_name(player)
+        current_pack = self._queue(name, opened=True).popleft()
+        if step is None:
+            step = self._round_step(current_pack.number // self.num_players)
+        current_pack.holder = self._neighbor(name, step)
+        current_pack.position = self._next_position()
+        self._queue(current_pack.holder, opened=True).append(current_pack)
+        self._passed(name, current_pack.holder, current_pack.number)
+
+    def queues_for(self, player):
+        name = self._get_name(player)
+        return {
+            'opened': [self.pool.names(pack.cards)
+                       for pack in self._queue(name, True)],
+            'unopened': [self.pool.names(pack.cards)
+                         for pack in self._queue(name, False)],
+        }
+
+    def picks_for(self, player):
+        return [{'drafted': self.pool.names([pick.card])[0],
+                 'passed': self.pool.names(pick.passed_cards())}
+                for pick in self._picks(self._get_name(player))]
+
+    def normalize(self):
+        raise DraftError('draft {} is already normalized'.format(self.id))
+
+    def load(self):
+        Draft.load(self)
+        self.packs, self.picks
+        self._sync()
+
+    # the phase is kept in memory, and worked out from the draft_pack rows
+    # when the draft's loaded, so a pick still doesn't touch the draft row
+
+    def _track(self, **values):
+        for key, value in values.iteritems():
+            set_committed_value(self, key, value)
+
+    def _reset_phase(self):
+        self._track(current_round=-1, opened_round=-1, packs_opened=[],
+                    cards_in_play=0,
+                    pending_picks=MutableDict((name, 0)
+                                              for name in self.player_order))
+        self._index_pending(*self.player_order)
+        self._phase_synced = True
+
+    def _sync(self):
+        # touching a column reloads it if it's expired, which forgets
+        # whatever we'd worked out
+        self.player_order
+        if getattr(self, '_phase_synced', False):
+            return
+
+        opened = [pack for pack in self.packs if pack.opened]
+        pending = MutableDict((name, 0) for name in self.player_order)
+        for pack in opened:
+            if pack.cards:
+                pending[pack.holder] += 1
+        self._track(
+            current_round=max([pack.number // self.num_players
+                               for pack in opened] or [-1]),
+            cards_in_play=sum(len(pack.cards) for pack in opened),
+            pending_picks=pending,
+            **self._rounds_opened(self._count_opened(
+                pack.number for pack in opened)))
+        self._phase_synced = True
+
+    def _forget_views(self):
+        Draft._forget_views(self)
+        self._phase_synced = False
+        self._held = None
+
+    def _index_packs(self):
+        """
+        Index the packs by who's holding them and the picks by who made
+        them, so that finding either doesn't scan every row; like the
+        phase, this is worked out when the draft's loaded, and kept up to
+        date by every open, pick and pass
+        """
+        self.player_order
+        if getattr(self, '_held', None) is not None:
+            return
+
+        self._held, self._made = {}, {}
+        packs = sorted(self.packs, key=lambda pack: pack.position)
+        self._last_position = packs[-1].position if packs else -1
+        for pack in packs:
+            if pack.cards:
+                self._held.setdefault((pack.holder, pack.opened),
+                                      deque()).append(pack)
+
+        by_pack = {}
+        for pick in sorted(self.picks, key=lambda pick: pick.number):
+            self._made.setdefault(pick.player, []).append(pick)
+            by_pack.setdefault(pick.pack, []).append(pick)
+        # so that each pick's passed_cards doesn't load its pack's picks
+        for pack in packs:
+            set_committed_value(pack, 'picks', sorted(
+                by_pack.get(pack, []), key=lambda pick: pick.pack_pick))
+
+    def _queue(self, name, opened):
+        """
+        The packs a player is holding, in the order they'll get to them
+        """
+        self._index_packs()
+        return self._held.setdefault((name, opened), deque())
+
+    def _picks(self, name):
+        self._index_packs()
+        return self._made.setdefault(name, [])
+
+    def queue_entries(self, player):
+        name = self._get_name(player)
+        return {'opened': [pack.number for pack in self._queue(name, True)],
+                'unopened': [pack.number
+                             for pack in self._queue(name, False)]}
+
+    def pick_entries(self, player):
+        return [[pick.pack.number, pick.pack_pick - 1, pick.card]
+                for pick in self._picks(self._get_name(player))]
+
+    def _next_position(self):
+        self._index_packs()
+        self._last_position += 1
+        return self._last_position
+
+
+class EventSourcedDraft(Draft):
+    """
+    A Draft whose actions are appended to the draft_event table rather than
+    written back into its columns. Its state is rebuilt by replaying those
+    events on top of the latest draft_snapshot, and a snapshot is taken
+    every event_snapshot_interval events.
+
+    player_queues and player_picks only hold that state in memory, and
+    they aren't rewritten once the draft has been inserted. Two writers
+    can't both append the same event, because of draft_event's unique
+    constraint, so a concurrent pick fails on commit instead of
+    clobbering the other one.
+    """
+    __tablename__ = None
+    __mapper_args__ = {'polymorphic_identity': 'events'}
+    snapshot_interval = config['event_snapshot_interval']
+
+    events = relationship('DraftEvent', lazy='dynamic',
+                          order_by='DraftEvent.number', cascade='all')
+    snapshots = relationship('DraftSnapshot', lazy='dynamic',
+                             order_by='DraftSnapshot.number', cascade='all')
+
+    def distribute(self, packs=None):
+        # the event doesn't hold the packs, so ones we're given are stored
+        # with the draft, where replaying it finds them
+        if packs is not None:
+            self.stored_packs = list(packs)
+        self._append('distribute')
+
+    def open_pack(self, player):
+        self._append('open_pack', self._get_name(player))
+
+    def make_pick(self, player, pick):
+        return self._append('make_pick', self._get_name(player),
+                            self.pool.card_id(pick))
+
+    def _pass_pack(self, player, step):
+        self._append('pass', self._get_name(player), step)
+
+    def queues_for(self, player):
+        self._catch_up()
+        return Draft.queues_for(self, player)
+
+    def pack_for(self, player):
+        self._catch_up()
+        return Draft.pack_for(self, player)
+
+    def _sync(self):
+        self._catch_up()
+
+    def _track(self, **values):
+        for key, value in values.iteritems():
+            set_committed_value(self, key, value)
+
+    def _reset_phase(self):
+        self._track(current_round=-1, opened_round=-1, packs_opened=[],
+                    cards_in_play=0,
+                    pending_picks=MutableDict((name, 0)
+                                              for name in self.player_order))
+        self._index_pending(*self.player_order)
+
+    def picks_for(self, player):
+        self._catch_up()
+        return Draft.picks_for(self, player)
+
+    def seat_players(self, randomize=True):
+        if getattr(self, '_applied', None):
+            raise DraftError('draft {} has already started'.format(self.id))
+        order = Draft.seat_players(self, randomize)
+        self._restore(None)
+        return order
+
+    def normalize(self):
+        raise DraftError('draft {} is event-sourced'.format(self.id))
+
+    def load(self):
+        Draft.load(self)
+        self._catch_up()
+
+    def _append(self, action, player=None, value=None):
+        """
+        Apply an action and record it as the draft's next event; an action
+        that fails to apply isn't recorded
+        """
+        self._catch_up()
+        event = DraftEvent(number=self._applied + 1, action=action,
+                           player=player, value=value)
+        result = self._apply(event)
+        self.events.append(event)
+        if event.number % self.snapshot_interval == 0:
+            self.snapshots.append(DraftSnapshot(
+                number=event.number,
+                packs_dealt=self.packs_dealt,
+                player_queues=self.player_queues.as_json(),
+                player_picks=deepcopy(dict(self.player_picks)),
+            ))
+        return result
+
+    def _apply(self, event):
+        """
+        The reducer: advance the draft's state by a single event
+        """
+        if event.action == 'distribute':
+            set_committed_value(self, 'packs_dealt', True)
+            result = self._queue_packs(self.stored_packs or self.deal())
+        elif event.action == 'open_pack':
+            result = Draft.open_pack(self, event.player)
+        elif event.action == 'make_pick':
+            result = Draft._make_pick(self, event.player, event.value)
+        elif event.action == 'pass':
+            result = Draft._pass_pack(self, event.player, event.value)
+        else:
+            raise DraftError('unknown draft event {!r}'.format(event.action))
+        self._applied = event.number
+        return result
+
+    def _catch_up(self):
+        """
+        Rebuild our state from the latest snapshot and the events since,
+        if the draft has been (re)loaded since we last did
+        """
+        # touching a column reloads it if it's expired, which forgets
+        # whatever we'd applied; the state group is loaded too, since
+        # loading it later would overwrite what we restore into it
+        self.player_order, self.stored_packs
+        if getattr(self, '_applied', None) is not None:
+            return
+
+        snapshot = self.snapshots.order_by(None).order_by(
+            DraftSnapshot.number.desc()).first()
+        changes = list(getattr(self, '_changes', None) or [])
+        self._restore(snapshot)
+        for event in self.events.filter(DraftEvent.number > self._applied):
+            self._apply(event)
+        # replaying what already happened doesn't change anything
+        self._changes = changes
+
+    def _restore(self, snapshot):
+        """
+        Reset our state to a snapshot, or to the start of the draft
+        """
+        if snapshot is None:
+            number, packs_dealt = 0, False
+            queues = {name: dict(opened=[], unopened=[])
+                      for name in self.player_order}
+            picks = {name: [] for name in self.player_order}
+        else:
+            number, packs_dealt = snapshot.number, snapshot.packs_dealt
+            queues, picks = snapshot.player_queues, snapshot.player_picks
+
+        # set as if they were loaded, so that nothing we apply to them is
+        # ever flushed back to the draft's row
+        set_committed_value(self, 'packs_dealt', packs_dealt)
+        set_committed_value(self, 'player_queues', MutableQueues(queues))
+        set_committed_value(self, 'player_picks', MutableDict(
+            (name, deepcopy(player_picks))
+            for name, player_picks in picks.iteritems()))
+        self._pack_views = self._dealt_packs = None
+        self._applied = number
+        self._rebuild_phase()
+
+    def _forget_views(self):
+        Draft._forget_views(self)
+        self._applied = None
+
+
+class DraftEvent(Base):
+    """
+    A single action taken in an event-sourced draft, in the order it was
+    taken; these are only ever inserted
+    """
+    __table_args__ = (UniqueConstraint('draft_id', 'number'),)
+
+    draft_id = Column(UUID(), ForeignKey('draft.id'), nullable=False)
+    # the first event in a draft is 1
+    number = Column(Integer(), nullable=False)
+    action = Column(String(), nullable=False)
+    player = Column(String())
+    # the card id picked, or the direction a pack was passed in
+    value = Column(Integer())
+
+
+class DraftSnapshot(Base):
+    """
+    The state of an event-sourced draft after its first `number` events
+    """
+    __table_args__ = (UniqueConstraint('draft_id', 'number'),)
+
+    draft_id = Column(UUID(), ForeignKey('draft.id'), nullable=False)
+    number = Column(Integer(), nullable=False)
+    packs_dealt = Column(Boolean(), nullable=False)
+    player_queues = Column(DraftState(), nullable=False)
+    player_picks = Column(DraftState(), nullable=False)
+
+
+class PendingPick(Base):
+    """
+    How many packs are waiting on a player in a draft, kept up to date by
+    every open, pick and pass, so finding who's holding up which drafts is
+    an indexed query rather than a scan of every draft's queues
+    """
+    __table_args__ = (
+        UniqueConstraint('draft_id', 'player'),
+        Index('ix_pending_pick_player_packs', 'player', 'packs'),
+    )
+
+    draft_id = Column(UUID(), ForeignKey('draft.id'), nullable=False)
+    player = Column(String(), nullable=False)
+    packs = Column(Integer(), nullable=False, default=0)
+    # players' rows change as packs are passed between them, so concurrent
+    # passes in a draft are checked the same way as updates to the draft
+    version = Column(Integer(), nullable=False)
+
+    __mapper_args__ = {'version_id_col': version}
+
+    @staticmethod
+    def waiting(session, min_packs=1):
+        """
+        (draft id, player, packs) for everyone with at least min_packs
+        waiting on them, most first
+        """
+        return session.query(PendingPick.draft_id, PendingPick.player,
+                             PendingPick.packs).filter(
+            PendingPick.packs >= min_packs).order_by(
+            PendingPick.packs.desc()).all()
+
+
+class DraftPack(Base):
+    """
+    A single pack in a normalized draft, and whose queue it's sitting in
+    """
+    draft_id = Column(UUID(), ForeignKey('draft.id'), nullable=False,
+                      index=True)
+    # the order the pack was dealt in
+    number = Column(Integer(), nullable=False)
+    holder = Column(String(), nullable=False)
+    opened = Column(Boolean(), nullable=False, default=False)
+    # where the pack sits in its holder's queue, lowest is first
+    position = Column(Integer(), nullable=False)
+    dealt = Column(CardArray(), nullable=False)
+    cards = Column(MutableList.as_mutable(DraftState), nullable=False)
+    # a pack changes with every pick and pass, so concurrent writes to it
+    # are checked the same way as writes to the draft
+    version = Column(Integer(), nullable=False)
+
+    __mapper_args__ = {'version_id_col': version}
+
+
+class DraftPick(Base):
+    """
+    A single selection made by a player in a normalized draft
+    """
+    __table_args__ = (UniqueConstraint('draft_id', 'player', 'number'),)
+
+    draft_id = Column(UUID(), ForeignKey('draft.id'), nullable=False,
+                      index=True)
+    player = Column(String(), nullable=False)
+    # the order of this pick amongst the player's picks
+    number = Column(Integer(), nullable=False)
+    card = Column(Integer(), nullable=False)
+    pack_id = Column(UUID(), ForeignKey('draft_pack.id'), nullable=False)
+    pack = relationship('DraftPack', backref=backref(
+        'picks', order_by='DraftPick.pack_pick'))
+    # how many cards had been drafted from the pack, including this one
+    pack_pick = Column(Integer(), nullable=False)
+
+    def passed_cards(self):
+        """
+        What was left in the pack after this pick was made
+        """
+        taken = [pick.card for pick in self.pack.picks
+                 if pick.pack_pick <= self.pack_pick]
+        passed = card_array(self.pack.dealt)
+        for card in taken:
+            passed.remove(card)
+        return passed
+
+
+@event.listens_for(Pool, 'load')
+@event.listens_for(Pool, 'refresh')
+@event.listens_for(Draft, 'load', propagate=True)
+@event.listens_for(Draft, 'refresh', propagate=True)
+def _forget_views(instance, *args):
+    """
+    Cached views of a model are only good until its columns are reloaded
+    """
+    instance._forget_views()
+
+
 class Message(Base):
     """
     A twitter message directed to us
     """
 
-    twitter_id = Column(Integer(), nullable=False, unique=True)
+    twitter_id = Column(BigInteger(), nullable=False, unique=True)
     content = Column(JSON(), nullable=False)
+    # messages are recorded as soon as they're collected, so they're never
+    # collected twice, and marked processed once the bot is done with them;
+    # the ones from before this column were all processed
+    processed = Column(Boolean(), nullable=False, default=False,
+                       server_default='1')
+
+
+def migrate(engine):
+    """
+    Bring a database made by an older version up to date: create the
+    tables it doesn't have, and add the columns it doesn't have to the
+    ones it does, with their server defaults filling in the rows already
+    there; returns the added columns as 'table.column'
+    """
+    inspector = sqlalchemy.inspect(engine)
+    existing = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            have = {column['name']
+                    for column in inspector.get_columns(table.name)}
+            new = [column for column in table.columns
+                   if column.name not in have]
+            for column in new:
+                connection.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                    preparer.format_table(table),
+                    CreateColumn(column).compile(dialect=engine.dialect)))
+                # not every backend can add a column with a constraint
+                if column.unique:
+                    connection.execute(
+                        'CREATE UNIQUE INDEX {} ON {} ({})'.format(
+                            preparer.quote('uq_{}_{}'.format(
+                                table.name, column.name), None),
+                            preparer.format_table(table),
+                            preparer.format_column(column)))
+                added.append('{}.{}'.format(table.name, column.name))
+            for index in table.indexes:
+                if any(column in new for column in index.columns):
+                    index.create(connection)
+    Base.metadata.create_all(engine)
+    return added
+
+
+def create_engine(url=None, settings=None):
+    """
+    An engine for url, sqlalchemy.url by default, with the connection pool,
+    and SQLite's pragmas and statement cache, in the [database] settings
+    """
+    url = make_url(url or config['sqlalchemy.url'])
+    settings = settings or config['database']
+    options = {'pool_recycle': settings['pool_recycle']}
+    connect_args = {}
+    sqlite = url.drivername.startswith('sqlite')
+    if sqlite:
+        connect_args.update(timeout=settings['busy_timeout'],
+                            cached_statements=settings['statement_cache_size'])
+        # an in-memory database only exists on its one connection, which
+        # the default pool already takes care of
+        if url.database and url.database != ':memory:':
+            # otherwise every connection is a new file handle, and pragmas
+            # to set, so keep a pool of them for threads to take turns with
+            connect_args['check_same_thread'] = False
+            options['poolclass'] = QueuePool
+    if not sqlite or 'poolclass' in options:
+        options.update(pool_size=settings['pool_size'],
+                       max_overflow=settings['max_overflow'],
+                       pool_timeout=settings['pool_timeout'])
+
+    engine = sqlalchemy.create_engine(url, connect_args=connect_args,
+                                      **options)
+    if sqlite:
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode={}'.format(
+                settings['journal_mode']))
+            cursor.execute('PRAGMA synchronous={}'.format(
+                settings['synchronous']))
+            cursor.close()
+    return engine
+
+
+class LazyEngine(object):
+    """
+    A class attribute that's an engine made by factory the first time it's
+    used, so that importing us doesn't open a database
+    """
+    def __init__(self, factory=create_engine):
+        self.factory = factory
+        self.engine = None
+        self.lock = RLock()
+
+    def __get__(self, instance, owner):
+        if self.engine is None:
+            with self.lock:
+                if self.engine is None:
+                    self.engine = self.factory()
+        return self.engine
 
 
 class Session(SessionManager):
-    engine = sqlalchemy.create_engine(config['sqlalchemy.url'])
+    engine = LazyEngine()
@@ -0,0 +1,195 @@
+# coding=utf-8
+"""
+How JSON columns are encoded. JSON columns use the fastest JSON library
+that's installed, and the draft state columns can be stored in a compact
+binary format instead; both are picked in the [serialization] config.
+
+Switching the draft state to a binary codec changes the type of its
+columns from text to binary. SQLite doesn't mind, and binary codecs read
+the JSON text written before the switch, but on any other database the
+existing columns have to be migrated to a binary type (e.g. bytea on
+PostgreSQL) before the switch, or writes will fail.
+"""
+from __future__ import unicode_literals
+import json
+import zlib
+from collections import namedtuple
+
+from sqlalchemy.types import TypeDecorator, UnicodeText, LargeBinary
+
+from drafts_as_a_service import config
+from sideboard.lib import log
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# dumps takes a value and returns unicode, or bytes for a binary codec,
+# and loads takes what dumps returned
+Codec = namedtuple('Codec', ['name', 'dumps', 'loads', 'binary'])
+
+# the JSON libraries we know how to use, fastest first
+JSON_LIBRARIES = ('ujson', 'simplejson', 'json')
+
+
+def _json_codec(name, module, **options):
+    def dumps(value):
+        text = module.dumps(value, **options)
+        return text.decode('utf-8') if isinstance(text, bytes) else text
+    return Codec(name, dumps, module.loads, False)
+
+
+def _stdlib_json():
+    return _json_codec('json', json, separators=(',', ':'))
+
+
+def _json_library(name):
+    if name == 'auto':
+        name = next(library for library in JSON_LIBRARIES
+                    if library == 'json' or globals()[library] is not None)
+    if name == 'ujson' and ujson is not None:
+        return _json_codec(name, ujson)
+    elif name == 'simplejson' and simplejson is not None:
+        return _json_codec(name, simplejson, separators=(',', ':'))
+    elif name != 'json':
+        # it's the same JSON whichever library writes it, so this is only
+        # ever slower, never wrong
+        log.warning('{} is not installed, using the json module'.format(name))
+    return _stdlib_json()
+
+
+def _from_json_text(data):
+    """
+    Whether a binary column holds JSON text, i.e. it was written before the
+    column was switched to a binary codec; draft state is always an object
+    or an array, which neither binary format starts with these bytes for
+    """
+    return data[:1] in (b'{', b'[')
+
+
+def _msgpack():
+    if msgpack is None:
+        raise ImportError('the msgpack codec needs msgpack installed')
+    # older versions decode strings with encoding, newer ones with raw
+    if getattr(msgpack, 'version', (0,)) >= (0, 5, 2):
+        unpack_options = {'raw': False}
+    else:
+        unpack_options = {'encoding': 'utf-8'}
+
+    def dumps(value):
+        return msgpack.packb(value, use_bin_type=False)
+
+    def loads(data):
+        if _from_json_text(data):
+            return json.loads(data.decode('utf-8'))
+        return msgpack.unpackb(data, **unpack_options)
+
+    return Codec('msgpack', dumps, loads, True)
+
+
+def _zlib(level=6):
+    text = _json_library('auto')
+
+    def dumps(value):
+        return zlib.compress(text.dumps(value).encode('utf-8'), level)
+
+    def loads(data):
+        if _from_json_text(data):
+            return text.loads(data.decode('utf-8'))
+        return text.loads(zlib.decompress(data).decode('utf-8'))
+
+    return Codec('zlib', dumps, loads, True)
+
+
+def get_codec(name):
+    """
+    A Codec by name: 'auto' or the name of a JSON library for JSON text,
+    or 'msgpack' or 'zlib' (compressed JSON) for binary
+    """
+    if name == 'msgpack':
+        return _msgpack()
+    elif name == 'zlib':
+        return _zlib()
+    elif name == 'auto' or name in JSON_LIBRARIES:
+        return _json_library(name)
+    raise ValueError('unknown codec {!r}'.format(name))
+
+
+def available_codecs():
+    """
+    The names of every codec that can be used with what's installed
+    """
+    names = [library for library in JSON_LIBRARIES
+             if library == 'json' or globals()[library] is not None]
+    if msgpack is not None:
+        names.append('msgpack')
+    return names + ['zlib']
+
+
+class Serialized(TypeDecorator):
+    """
+    A column of JSON-compatible values, encoded with a Codec; binary codecs
+    are stored as BLOBs rather than text
+    """
+    impl = UnicodeText
+
+    def __init__(self, codec=None):
+        TypeDecorator.__init__(self)
+        self.codec = codec or get_codec('auto')
+
+    def load_dialect_impl(self, dialect):
+        if self.codec.binary:
+            return dialect.type_descriptor(LargeBinary())
+        return dialect.type_descriptor(UnicodeText())
+
+    def process_bind_param(self, value, dialect):
+        return self.codec.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            value = self.codec.loads(bytes(value) if self.codec.binary
+                                     else value)
+        return value
+
+    def copy(self):
+        return self.__class__(self.codec)
+
+
+_codecs = {}
+
+
+def _configured(setting):
+    name = config['serialization'][setting]
+    if name not in _codecs:
+        _codecs[name] = get_codec(name)
+    return _codecs[name]
+
+
+class JSON(Serialized):
+    """
+    A JSON column, in the codec configured as serialization.json
+    """
+    def __init__(self, codec=None):
+        Serialized.__init__(self, codec or _configured('json'))
+
+
+class DraftState(Serialized):
+    """
+    A column of draft state, i.e. queues, picks and dealt packs, in the
+    codec configured as serialization.draft_state; see above for switching
+    an existing database to a binary codec
+    """
+    def __init__(self, codec=None):
+        Serialized.__init__(self, codec or _configured('draft_state'))
@@ -1,22 +1,249 @@
 # coding=utf-8
 from __future__ import unicode_literals
+import time
 
-from sideboard.lib import subscribes, notifies, DaemonTask
+from sideboard.lib import subscribes, on_startup, on_shutdown, log
 
-from drafts_as_a_service import sa, config
-from drafts_as_a_service.twitter import DraftBot
+from drafts_as_a_service import sa, config, pools
+from drafts_as_a_service.engine import DraftEngine
+from drafts_as_a_service.feed import ChangeFeed, CHANNEL
+from drafts_as_a_service.pipeline import IngestionPipeline
+from drafts_as_a_service.streaming import MentionStream
+from drafts_as_a_service.twitter import DraftBot, DEFAULT_POOL
 
 
 bot = None
+pipeline = None
+stream = None
+engine = None
+change_feed = ChangeFeed()
 
 def _get_or_initalize_bot():
     global bot
     if bot is None:
         bot = DraftBot(**config['twitter'])
+    return bot
 
 
 def check_for_messages():
+    """
+    Process any mentions we haven't seen yet, returning how many there were
+    """
     draft_bot = _get_or_initalize_bot()
+    return draft_bot.poller.poll()
 
-    for message in draft_bot.client.get_mentions_timeline():
-        pass
+
+def _perform(draft_id, action, *args):
+    """
+    Call a Draft method, through the engine if it's running, and put what
+    it changed in the change feed once it's been saved
+    """
+    if engine is not None:
+        return engine.perform(draft_id, action, *args)
+
+    def change(draft):
+        return getattr(draft, action)(*args), draft.take_changes()
+
+    result, changes = sa.Draft.update(draft_id, change)
+    change_feed.record(draft_id, changes)
+    return result
+
+
+def open_pack(draft_id, player):
+    return _perform(draft_id, 'open_pack', player)
+
+
+def make_pick(draft_id, player, pick, pass_to=None):
+    """
+    Pick a card from the pack in front of a player and pass the rest, the
+    way the round goes unless pass_to says otherwise
+    """
+    if pass_to is None:
+        return _perform(draft_id, 'pick', player, pick)
+    if pass_to not in ('left', 'right'):
+        raise sa.DraftError('packs are passed left or right, not {!r}'.format(
+            pass_to))
+    return _perform(draft_id, 'make_pick_and_pass_' + pass_to, player, pick)
+
+
+def queues_for(draft_id, player):
+    return _read(draft_id, 'queues_for', None, player)
+
+
+def phase(draft_id):
+    """
+    Where a draft is at: the round, which way packs are going, and how
+    many packs are waiting on each player
+    """
+    return _read(draft_id, 'phase', None)
+
+
+def create_drafts(pods, start=False):
+    """
+    Create a draft for each pod, a list of player handles, all dealt from
+    the bot's pool and saved in one transaction, returning their ids and
+    how long each step took
+    """
+    with sa.Session() as session:
+        pool = pools.registry.get(session, DEFAULT_POOL)
+        drafts, timings = sa.Draft.create_many(session, pool, pods,
+                                               start=start)
+        draft_ids = [draft.id for draft in drafts]
+        started = time.time()
+    timings['commit'] = time.time() - started
+    return {'drafts': draft_ids, 'timings': timings}
+
+
+# what a draft summary has, any of which can be asked for on their own
+SUMMARY_FIELDS = ('id', 'storage', 'players', 'packs_dealt', 'version',
+                  'waiting')
+
+
+def _project(summary, fields):
+    if fields is None:
+        return summary
+    unknown = set(fields) - set(SUMMARY_FIELDS)
+    if unknown:
+        raise sa.DraftError('no such fields: {}'.format(
+            ', '.join(sorted(unknown))))
+    return {field: summary[field] for field in fields}
+
+
+def _read(draft_id, action, view, *args):
+    """
+    Call a read-only Draft method on the engine's copy of a draft if it's
+    holding one, otherwise call view(session, draft_id, *args), which reads
+    as little of the draft as it can, or without a view, load the draft and
+    call the method on it; reading a draft doesn't make the engine load it
+    """
+    if engine is not None and engine.holds(draft_id):
+        return engine.perform(draft_id, action, *args)
+    with sa.Session() as session:
+        if view is None:
+            return sa.Draft.read(session, draft_id, action, *args)
+        return view(session, draft_id, *args)
+
+
+def drafts(fields=None, limit=50, offset=0):
+    """
+    A page of draft summaries, in id order, with just the given fields;
+    while the engine is running these are as of the last write back
+    """
+    with sa.Session() as session:
+        return [_project(summary, fields) for summary in
+                sa.Draft.summaries(session, limit=limit, offset=offset)]
+
+
+def _summary(session, draft_id):
+    summaries = sa.Draft.summaries(session, [draft_id])
+    if not summaries:
+        raise sa.DraftError('no draft {}'.format(draft_id))
+    return summaries[0]
+
+
+def draft(draft_id, fields=None):
+    return _project(_read(draft_id, 'summary', _summary), fields)
+
+
+def my_queue(draft_id, player):
+    """
+    The cards in the packs a player has opened, the one in front of them
+    first, with the numbers of the packs they've opened and have yet to
+    """
+    return _read(draft_id, 'opened_for', None, player)
+
+
+def my_picks(draft_id, player, since=0):
+    """
+    A player's picks after the first `since` of them, so a client that's
+    seen N picks only gets sent the ones after
+    """
+    return _read(draft_id, 'picks_since', sa.Draft.picks_of_since, player,
+                 since)
+
+
+@subscribes(CHANNEL)
+def changes(draft_id, player=None, since=0, client=None):
+    """
+    What's been opened, picked and passed in a draft after change number
+    `since`, as seen from a player's seat if given, i.e. without the cards
+    anyone else picked. Subscribers are sent this again whenever there's
+    more, so they only ever need to poll the draft itself after a reset;
+    with a client id, that's only what that client hasn't been sent yet.
+
+    A subscription's channels are fixed when it's declared, so this one is
+    on CHANNEL, and every subscriber is called again when any draft
+    changes. A client id trims what each of them is sent back, but it
+    doesn't save the call.
+    """
+    if client is None:
+        return change_feed.since(draft_id, since, player)
+    return change_feed.unsent(draft_id, client, since, player)
+
+
+def _get_or_initialize_pipeline():
+    global pipeline
+    if pipeline is None:
+        pipeline = IngestionPipeline(_get_or_initalize_bot())
+    return pipeline
+
+
+def _start_pipeline():
+    global stream
+    if config['ingestion']['mode'] == 'stream':
+        _get_or_initialize_pipeline().start(poll=False)
+        stream = MentionStream(_get_or_initalize_bot(),
+                               dispatch=pipeline.submit)
+        stream.start()
+    else:
+        _get_or_initialize_pipeline().start()
+
+
+def _stop_pipeline():
+    if stream is not None:
+        stream.stop()
+    if pipeline is not None:
+        pipeline.stop()
+
+
+if config['ingestion']['enabled']:
+    on_startup(_start_pipeline)
+    on_shutdown(_stop_pipeline)
+
+
+def _upgrade_drafts():
+    """
+    Add whatever the database is missing from older versions, then convert
+    any drafts that were written in an older format
+    """
+    added = sa.migrate(sa.Session.engine)
+    if added:
+        log.info('added columns {}'.format(', '.join(added)))
+    with sa.Session() as session:
+        upgraded = sa.Draft.upgrade_all(session)
+    if upgraded:
+        log.info('upgraded {} drafts to the current format'.format(upgraded))
+
+
+# ahead of everything else that reads drafts
+on_startup(_upgrade_drafts, priority=40)
+on_startup(change_feed.start)
+on_shutdown(change_feed.stop)
+
+
+def _start_engine():
+    global engine
+    engine = DraftEngine(on_change=change_feed.record)
+    engine.start()
+
+
+def _stop_engine():
+    global engine
+    if engine is not None:
+        engine.stop()
+        engine = None
+
+
+if config['engine']['enabled']:
+    on_startup(_start_engine)
+    on_shutdown(_stop_engine)
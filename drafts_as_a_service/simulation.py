@@ -0,0 +1,332 @@
+# coding=utf-8
+"""
+Simulated drafts, for measuring the draft engine and trying out pickers,
+which can be run with
+
+    python -m drafts_as_a_service.simulation --help
+"""
+from __future__ import unicode_literals, print_function
+import time
+import random
+import resource
+import argparse
+import multiprocessing
+from collections import Counter
+
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    # python 2 needs the futures backport
+    ProcessPoolExecutor = None
+
+from drafts_as_a_service import sa
+from drafts_as_a_service.core import DraftCore
+
+
+STORAGE = {
+    'json': sa.Draft,
+    'normalized': sa.NormalizedDraft,
+    'events': sa.EventSourcedDraft,
+}
+
+
+def first_pick(player, cards, rng):
+    """
+    Always take the first card in the pack
+    """
+    return cards[0]
+
+
+def random_pick(player, cards, rng):
+    """
+    Take any card in the pack
+    """
+    return rng.choice(cards)
+
+
+class GreedyPicker(object):
+    """
+    Take the highest rated card in the pack, given {card id: rating}
+    """
+    def __init__(self, ratings):
+        self.ratings = ratings
+
+    @classmethod
+    def by_name(cls, pool, ratings):
+        return cls({pool.card_id(name): rating
+                    for name, rating in ratings.iteritems()})
+
+    def __call__(self, player, cards, rng):
+        return max(cards, key=lambda card: self.ratings.get(card, 0))
+
+
+class TopRated(object):
+    """
+    Score a seat's picks as the total rating of the best deck_size of them
+    """
+    def __init__(self, ratings, deck_size=23):
+        self.ratings = ratings
+        self.deck_size = deck_size
+
+    def __call__(self, cards):
+        return sum(sorted((self.ratings.get(card, 0) for card in cards),
+                          reverse=True)[:self.deck_size])
+
+
+PICKERS = {'first': first_pick, 'random': random_pick}
+
+
+class SimulationStats(object):
+    """
+    What happened over a number of simulated drafts: how many times each
+    card was picked and how early, and how often each seat won
+    """
+    def __init__(self, players):
+        self.drafts = 0
+        self.picked = Counter()
+        # the total of each card's position in the packs it was picked from
+        self.positions = Counter()
+        self.wins = [0] * players
+
+    def record(self, core, card_names, score=None):
+        self.drafts += 1
+        for picks in core.picks:
+            for pack, position, card in picks:
+                name = card_names[card]
+                self.picked[name] += 1
+                self.positions[name] += position
+
+        if score is not None:
+            scores = [score([card for _, _, card in picks])
+                      for picks in core.picks]
+            # ties are a win for everyone involved
+            for seat, seat_score in enumerate(scores):
+                if seat_score == max(scores):
+                    self.wins[seat] += 1
+
+    def merge(self, other):
+        self.drafts += other.drafts
+        self.picked.update(other.picked)
+        self.positions.update(other.positions)
+        self.wins = [ours + theirs for ours, theirs in zip(self.wins,
+                                                           other.wins)]
+        return self
+
+    def average_pick(self):
+        """
+        {card: the average pick it went at}, where the first pick is 1
+        """
+        return {name: 1 + self.positions[name] / float(count)
+                for name, count in self.picked.iteritems()}
+
+    def win_rates(self):
+        return [wins / float(self.drafts or 1) for wins in self.wins]
+
+
+def evaluate(contents, drafts=1000, players=8, pickers=random_pick,
+             score=None, seed=None, processes=None, shard_size=25,
+             pool_type='set'):
+    """
+    Run drafts on DraftCores, sharded across processes, and merge their
+    SimulationStats.
+
+    pickers is a picker for every seat, or a list with one per seat, and
+    score, if given, scores a seat's picks to decide who won. Drafts are
+    run shard_size at a time, each shard with its own seed from seed, so
+    the same arguments give the same results however many processes there
+    are. Pickers and score have to be picklable, e.g. module level
+    functions, or GreedyPicker and TopRated.
+    """
+    if not isinstance(pickers, (list, tuple)):
+        pickers = [pickers] * players
+    processes = processes or multiprocessing.cpu_count()
+    rng = random.Random(seed)
+    work = [(pool_type, contents, players, min(shard_size, drafts - start),
+             rng.getrandbits(63), pickers, score)
+            for start in xrange(0, drafts, shard_size)]
+
+    stats = SimulationStats(players)
+    for shard_stats in _map(_run_shard, work, processes):
+        stats.merge(shard_stats)
+    return stats
+
+
+def _run_shard(shard):
+    pool_type, contents, players, drafts, seed, pickers, score = shard
+    pool = sa.Pool(type=pool_type, contents=contents)
+    rng = random.Random(seed)
+    stats = SimulationStats(players)
+    for _ in xrange(drafts):
+        core = DraftCore(players, pool.deal_packs(
+            3 * players, seed=rng.getrandbits(32)))
+        core.run(pickers, rng)
+        stats.record(core, pool.card_names, score)
+    return stats
+
+
+def _map(func, items, processes):
+    if processes == 1:
+        return map(func, items)
+    if ProcessPoolExecutor is not None:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(func, items))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def run_draft(draft, picker=random_pick, rng=None, commit=None):
+    """
+    Drive a draft from the deal to its last pick, returning how many picks
+    were made.
+
+    Players pick in seat order with picker(player, cards, rng), and packs
+    go left, then right, then left again. commit, if given, is called
+    after every pick and after the packs are dealt and opened.
+    """
+    rng = rng or random.Random()
+    commit = commit or (lambda: None)
+    draft.distribute()
+    commit()
+
+    picks = 0
+    for round in xrange(3):
+        if round % 2:
+            pick_and_pass = draft.make_pick_and_pass_right
+        else:
+            pick_and_pass = draft.make_pick_and_pass_left
+        for name in draft.player_order:
+            draft.open_pack(name)
+        commit()
+
+        while True:
+            made = 0
+            for name in draft.player_order:
+                cards = draft.pack_for(name)
+                if cards:
+                    pick_and_pass(name, picker(name, cards, rng))
+                    commit()
+                    made += 1
+            if not made:
+                break
+            picks += made
+    return picks
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """
+    {percentile: sample} for the given percentiles of samples
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {point: ordered[min(len(ordered) - 1,
+                               int(len(ordered) * point / 100.0))]
+            for point in points}
+
+
+def simulate(drafts=10, players=8, storage='json', backend='memory',
+             picker=random_pick, seed=None, url='sqlite://'):
+    """
+    Create drafts of players, each with its own pool, and run them all to
+    the end, returning picks per second, commit latency percentiles in
+    seconds, and the peak memory of the whole process in kilobytes, i.e.
+    the most it has used since it started, not just during this run.
+
+    A 'memory' backend never touches a database. A 'sqlite' backend keeps
+    the drafts in a database at url, which defaults to an in-memory one,
+    and commits every change.
+    """
+    draft_class = STORAGE[storage]
+    rng = random.Random(seed)
+    cards = ['Card {}'.format(idx) for idx in
+             xrange(players * 3 * sa.Pool.default_cards_per_pack)]
+    pod = [sa.Player(handle='sim{}'.format(seat)) for seat in xrange(players)]
+    pending = []
+    for _ in xrange(drafts):
+        draft = draft_class(players=pod, pool=sa.Pool(type='set',
+                                                      contents=cards),
+                            seed=rng.getrandbits(63))
+        draft.randomize_seating()
+        pending.append(draft)
+
+    latencies = []
+    if backend == 'memory':
+        commit = None
+    elif backend == 'sqlite':
+        engine = sa.create_engine(url)
+        sa.Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine, autoflush=False)()
+        session.add_all(pending)
+        session.commit()
+
+        def commit():
+            started = time.time()
+            session.commit()
+            latencies.append(time.time() - started)
+    else:
+        raise ValueError('unknown backend {!r}'.format(backend))
+
+    started = time.time()
+    picks = sum(run_draft(draft, picker, rng, commit) for draft in pending)
+    elapsed = time.time() - started
+    if backend == 'sqlite':
+        session.close()
+
+    return {
+        'drafts': drafts,
+        'picks': picks,
+        'seconds': elapsed,
+        'picks_per_second': picks / elapsed if elapsed else float('inf'),
+        'commit_latency': percentiles(latencies),
+        'process_peak_memory_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run simulated drafts')
+    parser.add_argument('--drafts', type=int, default=10)
+    parser.add_argument('--players', type=int, default=8)
+    parser.add_argument('--storage', choices=sorted(STORAGE), default='json')
+    parser.add_argument('--backend', choices=['memory', 'sqlite'],
+                        default='memory')
+    parser.add_argument('--url', default='sqlite://')
+    parser.add_argument('--picker', choices=sorted(PICKERS),
+                        default='random')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--processes', type=int,
+                        help='run on DraftCores across this many processes')
+    args = parser.parse_args()
+
+    if args.processes:
+        cards = ['Card {}'.format(idx) for idx in
+                 xrange(args.players * 3 * sa.Pool.default_cards_per_pack)]
+        started = time.time()
+        stats = evaluate(cards, drafts=args.drafts, players=args.players,
+                         pickers=PICKERS[args.picker], seed=args.seed,
+                         processes=args.processes)
+        elapsed = time.time() - started
+        print('{} drafts on {} processes in {:.3f}s, {:.1f} drafts/s'.format(
+            stats.drafts, args.processes, elapsed, stats.drafts / elapsed))
+        return
+
+    results = simulate(drafts=args.drafts, players=args.players,
+                       storage=args.storage, backend=args.backend,
+                       picker=PICKERS[args.picker], seed=args.seed,
+                       url=args.url)
+    print('{picks} picks in {seconds:.3f}s, {picks_per_second:.1f} picks/s'
+          .format(**results))
+    for point, latency in sorted(results['commit_latency'].items()):
+        print('    p{:<3} commit {:>10.6f}s'.format(point, latency))
+    print('process peak memory {}KB'.format(
+        results['process_peak_memory_kb']))
+
+
+if __name__ == '__main__':
+    main()
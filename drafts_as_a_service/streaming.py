@@ -0,0 +1,125 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import json
+from threading import Event, Thread
+
+from sideboard.lib import log
+
+from drafts_as_a_service import config
+from drafts_as_a_service.twitter import Message
+
+
+class MentionStream(object):
+    """
+    Consumes twitter's long-lived user stream and dispatches mentions of the
+    bot as they arrive, rather than waiting for the next poll.
+
+    Whenever the stream (re)connects we poll once to pick up anything that
+    was sent while we weren't connected; dropped connections are retried
+    with exponential backoff.
+    """
+    user_stream_url = 'https://userstream.twitter.com/1.1/user.json'
+
+    def __init__(self, bot, dispatch=None, connect=None, backoff=None,
+                 max_backoff=None):
+        settings = config['ingestion']
+        self.bot = bot
+        self.dispatch = dispatch or bot.poller.process
+        self.connect = connect or self.connect_to_twitter
+        self.backoff = backoff or settings['stream_backoff']
+        self.max_backoff = max_backoff or settings['stream_max_backoff']
+        self.stopped = Event()
+        self.connections = 0
+        self._response = None
+        self._thread = None
+
+    def connect_to_twitter(self):
+        """
+        Open the user stream with the bot's own authenticated session
+        """
+        response = self.bot.client.client.get(
+            self.user_stream_url, params={'with': 'user'}, stream=True,
+            timeout=config['ingestion']['stream_timeout'])
+        response.raise_for_status()
+        return response
+
+    def start(self):
+        self.stopped.clear()
+        self._thread = Thread(target=self.run, name='mention-stream')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop consuming the stream; a read that's already waiting won't
+        notice until the next line arrives, but twitter sends a keep-alive
+        at least every 30 seconds
+        """
+        self.stopped.set()
+        self._disconnect()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        """
+        Consume the stream until we're stopped
+        """
+        delay = self.backoff
+        while not self.stopped.is_set():
+            try:
+                self._response = self.connect()
+                self.connections += 1
+                self.catch_up()
+                delay = self.backoff
+                # twython reads streams a byte at a time too, anything larger
+                # waits for that many bytes before handing us a line
+                for line in self._response.iter_lines(chunk_size=1):
+                    if self.stopped.is_set():
+                        break
+                    if line.strip():
+                        self.handle(line)
+            except Exception:
+                if not self.stopped.is_set():
+                    log.warning('mention stream disconnected', exc_info=True)
+            finally:
+                self._disconnect()
+
+            if not self.stopped.is_set():
+                self.stopped.wait(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def catch_up(self):
+        """
+        Poll for anything the stream missed, returning how many there were
+        """
+        messages = self.bot.poller.collect()
+        self._dispatch(messages)
+        return len(messages)
+
+    def handle(self, line):
+        """
+        Dispatch a line from the stream if it's a new mention of the bot
+        """
+        message = Message(json.loads(line))
+        if (not message.is_tweet or
+                not message.mentions_user(self.bot.screen_name)):
+            return
+
+        poller = self.bot.poller
+        poller.since_id = max(poller.since_id, message['id'])
+        self._dispatch(poller.unseen([message]))
+
+    def _dispatch(self, messages):
+        self.bot.poller.record(messages)
+        for message in messages:
+            try:
+                self.dispatch(message)
+            except Exception:
+                log.error('unable to process message {}'.format(
+                    message['id']), exc_info=True)
+
+    def _disconnect(self):
+        response, self._response = self._response, None
+        if response is not None:
+            response.close()
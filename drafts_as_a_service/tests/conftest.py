@@ -10,7 +10,18 @@ from drafts_as_a_service import sa
 
 @pytest.fixture(autouse=True)
 def no_shuffle(monkeypatch):
-    monkeypatch.setattr(random, 'shuffle', lambda x: None)
+    monkeypatch.setattr(random.Random, 'shuffle', lambda self, x: None)
+
+
+_shuffle = random.Random.shuffle.__func__
+
+
+@pytest.fixture
+def shuffle(monkeypatch):
+    """
+    Shuffle for real after all, for tests of seeded randomness
+    """
+    monkeypatch.setattr(random.Random, 'shuffle', _shuffle)
 
 
 @pytest.fixture
@@ -38,8 +49,8 @@ def player0(players):
 
 
 @pytest.fixture
-def the_draft(init_db, players, mocked_pool, packs):
-    assert mocked_pool.deal_packs() == packs
+def the_draft(init_db, players, mocked_pool, dealt):
+    assert mocked_pool.deal_packs() == dealt
 
     return sa.Draft(players=players, pool=mocked_pool)
 
@@ -76,18 +87,29 @@ def pool(cards, init_db):
 
 
 @pytest.fixture
-def mocked_pool(pool, packs, monkeypatch):
+def mocked_pool(pool, dealt, monkeypatch):
     def return_expected_packs(*args, **kwargs):
-        return copy.deepcopy(packs)
+        return copy.deepcopy(dealt)
     monkeypatch.setattr(sa.Pool, 'deal_packs', return_expected_packs)
     return pool
 
 
 @pytest.fixture
-def packs(pool, player_count, card_count):
+def dealt(pool, player_count, card_count):
+    """
+    The packs that get dealt, as card ids
+    """
     assert card_count % player_count == 0
     per_pack = card_count / player_count / 3
-    packs = pool.deal_packs(player_count * 3, per_pack, randomize=False)
-    assert len(packs) == player_count * 3
-    assert all(len(pack) == per_pack for pack in packs)
-    return packs
+    dealt = pool.deal_packs(player_count * 3, per_pack, randomize=False)
+    assert len(dealt) == player_count * 3
+    assert all(len(pack) == per_pack for pack in dealt)
+    return dealt
+
+
+@pytest.fixture
+def packs(pool, dealt):
+    """
+    The packs that get dealt, as card names
+    """
+    return [pool.names(pack) for pack in dealt]
@@ -0,0 +1,92 @@
+# coding=utf-8
+from __future__ import unicode_literals
+from collections import Counter
+
+import pytest
+
+from drafts_as_a_service import sa, benchmarks
+
+numpy = pytest.importorskip('numpy')
+
+pytestmark = pytest.mark.usefixtures('init_db')
+
+
+@pytest.fixture
+def contents():
+    return {
+        'cards': {
+            'common': ['Common {}'.format(idx) for idx in xrange(100)],
+            'uncommon': ['Uncommon {}'.format(idx) for idx in xrange(60)],
+            'rare': ['Rare {}'.format(idx) for idx in xrange(50)],
+            'mythic': ['Mythic {}'.format(idx) for idx in xrange(15)],
+        },
+        'slots': [
+            {'count': 10, 'rarities': {'common': 1}},
+            {'count': 3, 'rarities': {'uncommon': 1}},
+            {'count': 1, 'rarities': {'rare': 7, 'mythic': 1}},
+        ],
+    }
+
+
+@pytest.fixture
+def booster_pool(contents):
+    return sa.Pool(type='boosters', contents=contents)
+
+
+def test_card_names(booster_pool, contents):
+    assert len(booster_pool.card_names) == 225
+    assert booster_pool.names([0]) == [contents['cards']['common'][0]]
+
+
+def test_deal(booster_pool):
+    packs = booster_pool.deal_packs(24, seed=1)
+    assert len(packs) == 24
+    for pack in packs:
+        names = booster_pool.names(pack)
+        assert len(names) == 14
+        assert all(name.startswith('Common') for name in names[:10])
+        assert all(name.startswith('Uncommon') for name in names[10:13])
+        assert names[13].split()[0] in ('Rare', 'Mythic')
+        assert len(set(names[:13])) == 13
+
+
+def test_reproducible(booster_pool):
+    assert (booster_pool.deal_packs(24, seed=42) ==
+            booster_pool.deal_packs(24, seed=42))
+    assert (booster_pool.deal_packs(24, seed=42) !=
+            booster_pool.deal_packs(24, seed=43))
+
+
+def test_same_packs_for_a_seed_forever(booster_pool):
+    # drafts deal these again every time they're loaded, so a numpy upgrade
+    # mustn't change them
+    assert [pack.tolist() for pack in booster_pool.deal_packs(2, seed=7)] == [
+        [62, 55, 19, 92, 13, 7, 0, 56, 71, 25, 219, 179, 216, 132],
+        [68, 8, 46, 50, 73, 60, 25, 45, 42, 11, 207, 188, 198, 131],
+    ]
+
+
+def test_weighted_slot(booster_pool):
+    rares = Counter(booster_pool.names([pack[-1]])[0].split()[0]
+                    for pack in booster_pool.deal_packs(8000, seed=0))
+    assert 0.09 < rares['Mythic'] / 8000.0 < 0.16
+
+
+def test_pack_size_comes_from_slots(booster_pool):
+    with pytest.raises(sa.DraftError):
+        booster_pool.deal_packs(1, 15)
+
+
+@pytest.mark.parametrize('slots', [
+    [{'count': 101, 'rarities': {'common': 1}}],
+    [{'count': 1, 'rarities': {'special': 1}}],
+])
+def test_bad_slots(contents, slots):
+    contents['slots'] = slots
+    with pytest.raises(sa.DraftError):
+        sa.Pool(type='boosters', contents=contents).deal_packs(1)
+
+
+def test_benchmark_runs():
+    timings = benchmarks.compare_dealing(packs=2, drafts=2)
+    assert set(timings) == {'shuffle', 'boosters', 'boosters, one batch'}
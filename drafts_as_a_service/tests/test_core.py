@@ -0,0 +1,68 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import pickle
+import random
+
+from drafts_as_a_service import simulation
+from drafts_as_a_service.core import DraftCore
+
+
+def test_same_rules_as_draft(the_draft, dealt, pool):
+    simulation.run_draft(the_draft, simulation.first_pick)
+    core = DraftCore(the_draft.num_players, dealt)
+    core.run([simulation.first_pick] * core.num_players, random.Random())
+
+    for seat, name in enumerate(the_draft.player_order):
+        assert pool.names(card for _, _, card in core.picks[seat]) == [
+            pick['drafted'] for pick in the_draft.picks_for(name)]
+
+
+def test_from_draft(the_draft, packs):
+    the_draft.distribute()
+    [the_draft.open_pack(name) for name in the_draft.player_order]
+    the_draft.make_pick_and_pass_left('player0', packs[0][0])
+
+    core = DraftCore.from_draft(the_draft)
+    assert list(core.opened[1]) == [1, 0]
+    assert list(core.unopened[1]) == [9, 17]
+    assert core.picks[0] == [(0, 0, 0)]
+    assert core.taken[0] == 1
+    assert core.pack_for(1) == list(the_draft._pack(1).cards())
+
+
+def test_pickles(dealt):
+    core = DraftCore(8, dealt)
+    core.distribute()
+    core.open_pack(0)
+    core.make_pick_and_pass(0, core.pack_for(0)[0], 1)
+
+    copied = pickle.loads(pickle.dumps(core, pickle.HIGHEST_PROTOCOL))
+    assert copied.__getstate__() == core.__getstate__()
+
+
+class TestEvaluate(object):
+    def test_totals(self, cards):
+        stats = simulation.evaluate(cards, drafts=3, seed=0, processes=1)
+        assert stats.drafts == 3
+        assert sum(stats.picked.values()) == 3 * 8 * 45
+        assert all(1 <= average <= 15
+                   for average in stats.average_pick().values())
+
+    def test_same_results_across_processes(self, cards):
+        one, two = [simulation.evaluate(cards, drafts=6, seed=0,
+                                        processes=processes, shard_size=2)
+                    for processes in (1, 2)]
+        assert one.picked == two.picked
+        assert one.positions == two.positions
+
+    def test_greedy_beats_random(self, cards, pool):
+        ratings = {name: idx for idx, name in enumerate(cards)}
+        greedy = simulation.GreedyPicker.by_name(pool, ratings)
+        score = simulation.TopRated({pool.card_id(name): rating
+                                     for name, rating in ratings.items()})
+        pickers = [greedy] + [simulation.random_pick] * 7
+
+        stats = simulation.evaluate(cards, drafts=8, pickers=pickers,
+                                    score=score, seed=0, processes=2)
+        win_rates = stats.win_rates()
+        assert win_rates[0] == max(win_rates) > 0.5
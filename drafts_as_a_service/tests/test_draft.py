@@ -1,10 +1,19 @@
 # coding=utf-8
 from __future__ import unicode_literals
 
+import random
+import uuid
+from collections import deque
+
 import mock
 import pytest
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import Column, MetaData, Table
+from sqlalchemy.types import Integer, String
 
-from drafts_as_a_service import sa
+from drafts_as_a_service import sa, simulation
+from sideboard.lib.sa import JSON, UUID
 
 
 @pytest.mark.usefixtures('init_db')
@@ -25,16 +34,29 @@ class TestPool(object):
         with pytest.raises(sa.DraftError):
             pool.deal_packs(card_count / 2 + 1, 2)
 
+    def test_card_ids(self, pool, cards):
+        assert pool.card_names == cards
+        assert [pool.card_id(card) for card in cards] == range(len(cards))
+        assert pool.card_ids([cards[2], cards[2]]) == [2, 2]
+        assert pool.names([3, 1]) == [cards[3], cards[1]]
+        with pytest.raises(sa.DraftError):
+            pool.card_id('Not A Card')
+
+    def test_deals_card_ids(self, pool, cards):
+        pack, = pool.deal_packs(1, 3, randomize=False)
+        assert pack == sa.card_array([0, 1, 2])
+        assert pool.names(pack) == cards[:3]
+
 
 class TestSeating(object):
-    @mock.patch('random.shuffle')
+    @mock.patch('random.Random.shuffle')
     def test_default_random_seating(self, mock_shuffle, the_draft):
         assert not mock_shuffle.called
         the_draft.seat_players()
         the_draft.distribute()
         assert mock_shuffle.called
 
-    @mock.patch('random.shuffle')
+    @mock.patch('random.Random.shuffle')
     def test_non_random_seating(self, mock_shuffle, the_draft):
         assert not mock_shuffle.called
         the_draft.seat_players(randomize=False)
@@ -42,22 +64,45 @@ class TestSeating(object):
         assert not mock_shuffle.called
 
     def test_players_start_with_with_queues(self, the_draft):
-        assert all(q == dict(opened=[], unopened=[])
+        assert all(q == dict(opened=deque(), unopened=deque())
                    for p,q in the_draft.player_queues.iteritems())
 
+    def test_seat_lookups(self, the_draft):
+        the_draft.seat_players(randomize=False)
+        assert the_draft.seat('player3') == 3
+        assert the_draft._neighbor('player7', 1) == 'player0'
+        assert the_draft._neighbor('player0', -1) == 'player7'
+
+    def test_seat_lookups_follow_reseating(self, the_draft, monkeypatch):
+        monkeypatch.setattr(random.Random, 'shuffle',
+                            lambda self, x: x.reverse())
+        the_draft.seat_players()
+        assert the_draft.seat('player7') == 0
+        assert the_draft._neighbor('player7', 1) == 'player6'
+        assert the_draft._neighbor('player7', -1) == 'player0'
+
 
 class TestDraftSetup(object):
-    def test_sanity(self, the_draft, packs):
+    def test_sanity(self, the_draft, dealt):
         # we mocked this out to always deal the same packs
-        assert the_draft.pool.deal_packs() == packs
-        assert the_draft.pool.deal_packs(123, 'asdf') == packs
+        assert the_draft.pool.deal_packs() == dealt
+        assert the_draft.pool.deal_packs(123, 'asdf') == dealt
 
-    def test_distribute(self, the_draft, packs):
-        assert the_draft.player_queues == {
+    def test_distribute(self, the_draft, dealt, packs):
+        assert the_draft.player_queues.as_json() == {
             'player{}'.format(idx): dict(opened=[], unopened=[])
             for idx in xrange(8)
         }
         the_draft.distribute()
+        # packs are queued by the order they were dealt in
+        assert the_draft.player_queues.as_json() == {
+            'player{}'.format(idx): {
+                'opened': [],
+                'unopened': [0 + idx, 8 + idx, 16 + idx],
+            }
+            for idx in xrange(8)
+        }
+        assert the_draft.dealt_packs == list(dealt)
         # this works thanks to the mocking we've set out
         expected = {
             'player{}'.format(idx): {
@@ -68,7 +113,8 @@ class TestDraftSetup(object):
             }
             for idx in xrange(8)
         }
-        assert the_draft.player_queues == expected
+        assert {name: the_draft.queues_for(name)
+                for name in the_draft.player_order} == expected
 
     def test_open(self, the_draft):
         the_draft.distribute()
@@ -108,15 +154,15 @@ class TestDraftPicks(object):
     @pytest.fixture
     def player0_picks(self, started_draft, player0):
 
-        return lambda: started_draft.player_picks[player0.handle]
+        return lambda: started_draft.picks_for(player0)
 
     @pytest.fixture
     def player0_queues(self, started_draft, player0):
-        return lambda: started_draft.player_queues[player0.handle]
+        return lambda: started_draft.queues_for(player0)
 
     @pytest.fixture
     def some_pick(self, player0_queues, packs, started_draft):
-        assert all(started_draft.player_queues[name]['opened']
+        assert all(started_draft.queues_for(name)['opened']
                    for name in started_draft.player_order)
         assert started_draft.player_order == [
             'player{}'.format(n) for n in xrange(8)
@@ -141,12 +187,17 @@ class TestDraftPicks(object):
             'drafted': some_pick,
             'passed': packs[0][1:]
         }
+        # only the card's id and where it came from are stored
+        assert started_draft.player_picks[player0.handle] == [
+            [0, 0, started_draft.pool.card_id(some_pick)]
+        ]
 
-        player1_on_deck = started_draft.player_queues['player1']['opened']
+        player1_on_deck = lambda: started_draft.queues_for('player1')['opened']
         # we're passing to this person in pack 1
-        assert len(player1_on_deck) == 1
+        assert len(player1_on_deck()) == 1
         started_draft.pass_left(player0)
         assert len(player0_queues()['opened']) == 0
+        player1_on_deck = player1_on_deck()
         assert len(player1_on_deck) == 2
         assert player1_on_deck[0] == packs[1]
         assert (player1_on_deck[1] ==
@@ -164,7 +215,7 @@ class TestDraftPicks(object):
             name = player.handle
 
             for _ in xrange(len(started_draft.player_queues[name]['opened'])):
-                on_deck = started_draft.player_queues[name]['opened']
+                on_deck = started_draft.queues_for(name)['opened']
                 started_draft.make_pick_and_pass_left(name, on_deck[0][0])
                 draft_session.commit()
 
@@ -201,7 +252,7 @@ class TestDraftPicks(object):
             """
             name = player.handle
             for _ in xrange(len(started_draft.player_queues[name]['opened'])):
-                on_deck = started_draft.player_queues[name]['opened']
+                on_deck = started_draft.queues_for(name)['opened']
                 pick = on_deck[0][0]
                 started_draft.make_pick_and_pass_right(name, pick)
                 draft_session.commit()
@@ -229,3 +280,444 @@ class TestDraftPicks(object):
         assert [len(p['passed']) for p in player0_picks()] == [
             15 - pack - 1 for pack in xrange(9)
         ]
+
+    def test_pick_not_in_pack(self, started_draft, player0, packs):
+        with pytest.raises(ValueError):
+            started_draft.make_pick(player0, packs[1][0])
+        assert started_draft.picks_for(player0) == []
+
+    def test_picks_survive_reload(self, started_draft, draft_session, player0,
+                                  some_pick, packs):
+        started_draft.make_pick_and_pass_left(player0, some_pick)
+        draft_session.commit()
+
+        with sa.Session() as session:
+            fetched = session.query(sa.Draft).get(started_draft.id)
+            assert fetched.picks_for(player0) == [{
+                'drafted': some_pick,
+                'passed': packs[0][1:],
+            }]
+            assert fetched.queues_for('player1')['opened'] == [
+                packs[1], packs[0][1:]
+            ]
+
+
+@pytest.mark.usefixtures('shuffle')
+class TestSeed(object):
+    @pytest.fixture
+    def make_draft(self, players, pool):
+        def make_draft(seed):
+            draft = sa.Draft(players=players, pool=pool, seed=seed)
+            draft.randomize_seating()
+            draft.distribute()
+            return draft
+        return make_draft
+
+    def test_same_seed_same_draft(self, make_draft):
+        first, second = make_draft(1234), make_draft(1234)
+        assert first.player_order == second.player_order
+        assert first.dealt_packs == second.dealt_packs
+
+    def test_different_seeds(self, make_draft):
+        first, second = make_draft(1234), make_draft(4321)
+        assert first.dealt_packs != second.dealt_packs
+
+    def test_streams_are_independent(self, make_draft):
+        draft = make_draft(1234)
+        dealt = list(draft.dealt_packs)
+        draft.randomize_seating()
+        draft._forget_views()
+        assert draft.dealt_packs == dealt
+
+    def test_seating_ignores_join_order(self, players, pool):
+        forwards = sa.Draft(players=players, pool=pool, seed=1234)
+        backwards = sa.Draft(players=players[::-1], pool=pool, seed=1234)
+        forwards.randomize_seating()
+        backwards.randomize_seating()
+        assert forwards.player_order == backwards.player_order
+
+    def test_dealt_packs_are_not_stored(self, make_draft, draft_session):
+        draft = make_draft(None)
+        assert draft.seed is not None
+        draft.open_pack('player0')
+        draft.make_pick('player0', draft.queues_for('player0')['opened'][0][0])
+        draft_session.add(draft)
+        draft_session.commit()
+
+        with sa.Session() as session:
+            fetched = session.query(sa.Draft).get(draft.id)
+            assert fetched.stored_packs == []
+            assert fetched.dealt_packs == draft.dealt_packs
+            assert fetched.picks_for('player0') == draft.picks_for('player0')
+
+    @pytest.mark.parametrize('storage', ['json', 'normalized', 'events'])
+    def test_distribute_given_packs(self, storage, players, mocked_pool,
+                                    draft_session):
+        dealt = sa.Draft(players=players, pool=mocked_pool, seed=1).deal()
+        draft = simulation.STORAGE[storage](players=players, pool=mocked_pool,
+                                            seed=2)
+        draft_session.add(draft)
+        draft.distribute(list(dealt))
+        draft.open_pack('player0')
+        draft_session.commit()
+
+        with sa.Session() as session:
+            fetched = session.query(sa.Draft).get(draft.id)
+            assert fetched.dealt_packs == list(dealt)
+            assert fetched.pack_for('player0') == mocked_pool.names(
+                dealt[draft.seat('player0')])
+
+class TestPhases(object):
+    @pytest.fixture(params=['json', 'normalized', 'events'])
+    def draft(self, request, players, mocked_pool, draft_session):
+        draft_class = simulation.STORAGE[request.param]
+        draft = draft_class(players=players, pool=mocked_pool)
+        draft_session.add(draft)
+        draft.start()
+        draft_session.commit()
+        return draft
+
+    def _pick_round(self, draft):
+        for _ in xrange(15):
+            for name in draft.whose_turn():
+                draft.pick(name, draft.pack_for(name)[0])
+
+    def test_start(self, draft):
+        assert draft.current_round == 0
+        assert draft.direction == 'left'
+        assert draft.whose_turn() == draft.player_order
+        assert all(draft.pending_for(name) == 1 for name in draft.player_order)
+        assert draft.cards_in_play == 8 * 15
+
+    def test_direction_is_everyones_round(self, draft):
+        self._pick_round(draft)
+        # one player getting ahead doesn't change the round everyone's in
+        draft.open_pack('player0')
+        assert draft.current_round == 2
+        assert draft.opened_round == 1
+        assert draft.direction == 'right'
+
+        # their round 1 pack still goes right, even though they've opened
+        # one from round 2
+        draft.pick('player0', draft.pack_for('player0')[0])
+        assert draft.pending_for('player7') == 2
+        assert draft.pending_for('player1') == 1
+
+    def test_no_direction_before_the_deal(self, players, mocked_pool):
+        draft = sa.Draft(players=players, pool=mocked_pool)
+        assert draft.direction is None
+        assert draft.phase()['direction'] is None
+        draft.distribute()
+        assert draft.direction == 'left'
+
+    def test_pick_passes_the_right_way(self, draft, packs):
+        draft.pick('player0', packs[0][0])
+        assert draft.pending_for('player0') == 0
+        assert draft.pending_for('player1') == 2
+        assert draft.whose_turn() == draft.player_order[1:]
+
+    def test_rounds_advance(self, draft, draft_session, packs):
+        self._pick_round(draft)
+        assert draft.current_round == 1
+        assert draft.direction == 'right'
+        assert draft.whose_turn() == draft.player_order
+        draft_session.commit()
+
+        draft.pick('player0', packs[8][0])
+        assert draft.pending_for('player7') == 2
+
+        draft.pick('player7', draft.pack_for('player7')[0])
+        draft.pick('player7', draft.pack_for('player7')[0])
+        self._pick_round(draft)
+        self._pick_round(draft)
+        assert draft.finished
+        assert draft.whose_turn() == []
+        assert all(len(draft.picks_for(name)) == 45
+                   for name in draft.player_order)
+
+    def test_opened_for(self, draft, packs):
+        draft.pick('player0', packs[0][0])
+        opened = draft.opened_for('player1')
+        assert opened['opened'] == [packs[1], packs[0][1:]]
+        assert opened['opened'][0] == draft.pack_for('player1')
+        assert opened['packs'] == {'opened': [1, 0], 'unopened': [9, 17]}
+
+    def test_survives_reload(self, draft, draft_session, packs):
+        draft.pick('player0', packs[0][0])
+        draft_session.commit()
+
+        with sa.Session() as session:
+            fetched = session.query(sa.Draft).get(draft.id)
+            phase = fetched.phase()
+            assert phase['round'] == 0
+            assert phase['direction'] == 'left'
+            assert fetched.packs_opened == [8]
+            assert phase['cards_in_play'] == 8 * 15 - 1
+            assert sum(phase['pending'].values()) == 8
+            for name in fetched.player_order:
+                assert (fetched.pending_for(name) ==
+                        len(fetched.queues_for(name)['opened']))
+
+    def test_waiting_on(self, draft, draft_session, packs):
+        draft.pick('player0', packs[0][0])
+        draft_session.commit()
+
+        waiting = draft.waiting_on()
+        assert 'player0' not in waiting
+        assert waiting['player1'] == 2
+        assert sum(waiting.values()) == 8
+
+    def test_pending_drafts(self, draft, draft_session, players, packs):
+        assert players[1].pending_drafts(draft_session) == {draft.id: 1}
+        draft.pick('player0', packs[0][0])
+        draft_session.commit()
+
+        assert players[0].pending_drafts(draft_session) == {}
+        assert players[1].pending_drafts(draft_session) == {draft.id: 2}
+        detached = sa.Player(handle='player1')
+        assert detached.pending_drafts(draft_session) == {draft.id: 2}
+        waiting = sa.PendingPick.waiting(draft_session, min_packs=2)
+        assert waiting == [(draft.id, 'player1', 2)]
+
+    @pytest.mark.parametrize('has_json', [True, False])
+    def test_player_views(self, draft, draft_session, packs, dealt,
+                          has_json, monkeypatch):
+        monkeypatch.setattr(sa, 'SQLITE_HAS_JSON', has_json)
+        draft.pick('player0', packs[0][0])
+        draft_session.commit()
+
+        with sa.Session() as session:
+            assert sa.Draft.queue_of(session, draft.id, 'player1') == {
+                'opened': [1, 0], 'unopened': [9, 17]}
+            assert sa.Draft.picks_of(session, draft.id, 'player0') == [
+                [0, 0, dealt[0][0]]]
+            assert sa.Draft.picks_of(session, draft.id, 'player1') == []
+            if has_json and draft.storage == 'json':
+                # the database pulled them out, so no draft was loaded
+                assert not session.identity_map
+            with pytest.raises(sa.DraftError):
+                sa.Draft.picks_of(session, draft.id, 'nobody')
+
+    def test_summaries(self, draft, draft_session, packs):
+        draft.pick('player0', packs[0][0])
+        draft_session.commit()
+
+        with sa.Session() as session:
+            summary, = sa.Draft.summaries(session, [draft.id])
+            assert summary['players'] == draft.player_order
+            assert summary['waiting']['player1'] == 2
+            assert 'player0' not in summary['waiting']
+            # none of the drafts' state was loaded to get there
+            loaded, = session.query(sa.Draft).all()
+            assert 'player_picks' not in loaded.__dict__
+            assert 'contents' not in loaded.pool.__dict__
+
+    def test_take_changes(self, draft, draft_session, packs):
+        draft.take_changes()
+        draft.pick('player0', packs[0][0])
+        assert [change['type'] for change in draft.take_changes()] == [
+            'picked', 'passed']
+        assert draft.take_changes() == []
+        draft_session.commit()
+
+        with sa.Session() as session:
+            fetched = session.query(sa.Draft).get(draft.id)
+            fetched.phase()
+            # loading or replaying a draft isn't changing it
+            assert fetched.take_changes() == []
+
+
+# the draft table as it was before STATE_FORMAT, which is all a draft
+# written back then has; everything since has a server default
+# the tables as the baseline made them
+BASELINE = MetaData()
+BASELINE_DRAFT = Table(
+    'draft', BASELINE,
+    Column('id', UUID(), primary_key=True),
+    Column('pool_id', UUID()),
+    Column('player_picks', JSON()),
+    Column('player_order', JSON()),
+    Column('player_queues', JSON()),
+    Column('num_players', Integer()),
+)
+BASELINE_POOL = Table(
+    'pool', BASELINE,
+    Column('id', UUID(), primary_key=True),
+    Column('type', String()),
+    Column('contents', JSON()),
+)
+Table('player', BASELINE,
+      Column('id', UUID(), primary_key=True),
+      Column('handle', String(), unique=True))
+Table('player_to_draft', BASELINE,
+      Column('player_id', UUID()),
+      Column('draft_id', UUID()))
+BASELINE_MESSAGE = Table(
+    'message', BASELINE,
+    Column('id', UUID(), primary_key=True),
+    Column('twitter_id', Integer(), unique=True),
+    Column('content', JSON()),
+)
+
+
+def _baseline_state(packs, moves):
+    """
+    The state a baseline draft kept, once everyone's opened their first
+    pack and each (player, next player) in moves has picked the first card
+    in front of them and passed the rest
+    """
+    players = len(packs) // 3
+    order = ['player{}'.format(seat) for seat in xrange(players)]
+    queues = {name: {'opened': [list(packs[seat])],
+                     'unopened': [list(packs[seat + players]),
+                                  list(packs[seat + 2 * players])]}
+              for seat, name in enumerate(order)}
+    picks = {name: [] for name in order}
+    for name, next_player in moves:
+        pack = queues[name]['opened'].pop(0)
+        picks[name].append({'drafted': pack.pop(0), 'passed': list(pack)})
+        queues[next_player]['opened'].append(pack)
+    return order, picks, queues
+
+
+def _insert_baseline(session, pool, packs, moves):
+    session.add(pool)
+    session.commit()
+    order, picks, queues = _baseline_state(packs, moves)
+    draft_id = uuid.uuid4()
+    session.execute(BASELINE_DRAFT.insert().values(
+        id=draft_id, pool_id=pool.id, num_players=len(order),
+        player_order=order, player_picks=picks, player_queues=queues))
+    session.commit()
+    return draft_id, picks, queues
+
+
+class TestBaselineFormat(object):
+    @pytest.fixture
+    def baseline(self, init_db, pool, packs, draft_session):
+        # player1 ends up picking from both its pack and player0's
+        return _insert_baseline(draft_session, pool, packs, [
+            ('player0', 'player1'), ('player1', 'player2'),
+            ('player1', 'player2')])
+
+    def test_loads(self, baseline, packs):
+        draft_id, picks, queues = baseline
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            draft.load()
+            assert draft.pick_entries('player1') == [
+                [1, 0, draft.pool.card_id(packs[1][0])],
+                [0, 1, draft.pool.card_id(packs[0][1])]]
+            assert draft.queue_entries('player2') == {
+                'opened': [2, 1, 0], 'unopened': [10, 18]}
+            for name in ('player1', 'player2'):
+                assert draft.picks_for(name) == picks[name]
+                assert draft.queues_for(name) == queues[name]
+            phase = draft.phase()
+            assert phase['round'] == 0 and phase['pending']['player2'] == 3
+
+            draft.pick('player2', packs[2][0])
+            assert draft.pack_for('player3') == packs[3]
+
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            assert draft.state_format == sa.STATE_FORMAT
+            assert draft.waiting_on()['player2'] == 2
+            assert draft.picks_for('player2') == [
+                {'drafted': packs[2][0], 'passed': packs[2][1:]}]
+
+    def test_player_slices(self, baseline):
+        draft_id = baseline[0]
+        with sa.Session() as session:
+            assert sa.Draft.queue_of(session, draft_id, 'player2') == {
+                'opened': [2, 1, 0], 'unopened': [10, 18]}
+            assert [pick['pack'] for pick in sa.Draft.picks_of_since(
+                session, draft_id, 'player1')] == [1, 0]
+
+    def test_upgrade_all(self, baseline, packs):
+        draft_id, picks, queues = baseline
+        with sa.Session() as session:
+            assert sa.Draft.upgrade_all(session) == 1
+            assert sa.Draft.upgrade_all(session) == 0
+
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            assert draft.packs_dealt and draft.state_format == sa.STATE_FORMAT
+            assert draft.picks_for('player0') == picks['player0']
+            assert draft.waiting_on()['player2'] == 3
+
+    def test_normalize(self, baseline):
+        draft_id, picks, queues = baseline
+        with sa.Session() as session:
+            session.query(sa.Draft).get(draft_id).normalize()
+
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            assert isinstance(draft, sa.NormalizedDraft)
+            for name in ('player1', 'player2'):
+                assert draft.picks_for(name) == picks[name]
+                assert draft.queues_for(name) == queues[name]
+
+    def test_duplicate_cards(self, init_db, draft_session):
+        pool = sa.Pool(type='set', contents=['Island', 'Forest'])
+        packs = [['Island', 'Forest', 'Island']] * 6
+        draft_id, picks, queues = _insert_baseline(
+            draft_session, pool, packs,
+            [('player0', 'player1'), ('player1', 'player0')])
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            draft.load()
+            assert draft.dealt_packs[0].tolist() == [0, 1, 0]
+            assert draft.pick_entries('player0') == [[0, 0, 0]]
+            for name in ('player0', 'player1'):
+                assert draft.picks_for(name) == picks[name]
+                assert draft.queues_for(name) == queues[name]
+
+    def test_migrate_baseline_schema(self, pool, packs, tmpdir):
+        engine = sqlalchemy.create_engine(
+            'sqlite:///' + str(tmpdir.join('baseline.db')))
+        BASELINE.create_all(engine)
+        pool_id = uuid.uuid4()
+        engine.execute(BASELINE_POOL.insert(), id=pool_id, type='set',
+                       contents=pool.contents)
+        order, picks, queues = _baseline_state(packs,
+                                               [('player0', 'player1')])
+        draft_id = uuid.uuid4()
+        engine.execute(BASELINE_DRAFT.insert(), id=draft_id,
+                       pool_id=pool_id, num_players=len(order),
+                       player_order=order, player_picks=picks,
+                       player_queues=queues)
+        engine.execute(BASELINE_MESSAGE.insert(), id=uuid.uuid4(),
+                       twitter_id=1, content={})
+
+        added = sa.migrate(engine)
+        assert {'draft.dealt_packs', 'draft.state_format',
+                'pool.content_hash', 'message.processed'} <= set(added)
+        assert sa.migrate(engine) == []
+        assert 'pending_pick' in sqlalchemy.inspect(engine).get_table_names()
+
+        session = sessionmaker(bind=engine)()
+        try:
+            assert sa.Draft.upgrade_all(session) == 1
+            session.commit()
+            draft = session.query(sa.Draft).get(draft_id)
+            assert draft.picks_for('player0') == picks['player0']
+            assert draft.queues_for('player1') == queues['player1']
+            assert session.query(sa.Message).one().processed
+            pool = session.query(sa.Pool).one()
+            pool.content_hash = 'same'
+            session.add(sa.Pool(type='set', contents=[], content_hash='same'))
+            with pytest.raises(sqlalchemy.exc.IntegrityError):
+                session.flush()
+        finally:
+            session.close()
+
+    def test_cards_not_in_pool(self, init_db, draft_session):
+        pool = sa.Pool(type='set', contents=['Island'])
+        draft_id, _, _ = _insert_baseline(
+            draft_session, pool, [['Island', 'Swamp', 'Plains']] * 6, [])
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            with pytest.raises(sa.DraftError) as error:
+                draft.load()
+            assert 'Plains, Swamp' in unicode(error.value)
@@ -0,0 +1,191 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import uuid
+from threading import Thread, Event
+
+import pytest
+
+from drafts_as_a_service import sa
+from drafts_as_a_service.engine import DraftEngine, HotDraft
+
+
+@pytest.fixture
+def make_draft(init_db, players, mocked_pool, draft_session):
+    def make_draft():
+        draft = sa.Draft(players=players, pool=mocked_pool)
+        draft.distribute()
+        [draft.open_pack(name) for name in draft.player_order]
+        draft_session.add(draft)
+        draft_session.commit()
+        return draft.id
+    return make_draft
+
+
+@pytest.fixture
+def draft_id(make_draft):
+    return make_draft()
+
+
+@pytest.fixture
+def make_engine(request, tmpdir):
+    def make_engine(**kwargs):
+        kwargs.setdefault('flush_every', 100)
+        engine = DraftEngine(pick_log=str(tmpdir.join('picks.log')), **kwargs)
+        request.addfinalizer(engine.pick_log.close)
+        return engine
+    return make_engine
+
+
+@pytest.fixture
+def engine(make_engine):
+    return make_engine()
+
+
+def _stored_picks(draft_id, name='player0'):
+    with sa.Session() as session:
+        return session.query(sa.Draft).get(draft_id).picks_for(name)
+
+
+def _crash(engine):
+    """
+    Drop everything the engine is holding without writing it back
+    """
+    for hot in engine.drafts.values():
+        hot.manager.session.close()
+    engine.drafts.clear()
+
+
+class TestDraftEngine(object):
+    def test_writes_back_on_flush(self, engine, draft_id, packs):
+        engine.perform(draft_id, 'make_pick_and_pass_left', 'player0',
+                       packs[0][0])
+        assert engine.perform(draft_id, 'queues_for', 'player1')[
+            'opened'] == [packs[1], packs[0][1:]]
+        assert _stored_picks(draft_id) == []
+
+        engine.flush()
+        assert len(_stored_picks(draft_id)) == 1
+        with sa.Session() as session:
+            assert session.query(sa.Draft).get(draft_id).log_sequence == 1
+
+    def test_writes_back_every_n(self, make_engine, draft_id, packs):
+        engine = make_engine(flush_every=2)
+        engine.perform(draft_id, 'make_pick', 'player0', packs[0][0])
+        assert _stored_picks(draft_id) == []
+        engine.perform(draft_id, 'make_pick', 'player1', packs[1][0])
+        assert len(_stored_picks(draft_id)) == 1
+
+    def test_not_an_action(self, engine, draft_id):
+        with pytest.raises(sa.DraftError):
+            engine.perform(draft_id, 'normalize')
+
+    def test_failed_changes_are_skipped_on_recovery(self, engine,
+                                                    make_engine, draft_id,
+                                                    packs):
+        with pytest.raises(ValueError):
+            engine.perform(draft_id, 'make_pick', 'player0', packs[1][0])
+        engine.perform(draft_id, 'make_pick', 'player0', packs[0][0])
+        assert len(engine.pick_log.entries()[draft_id.hex]) == 2
+        _crash(engine)
+
+        make_engine().recover()
+        assert [pick['drafted'] for pick in _stored_picks(draft_id)] == [
+            packs[0][0]]
+
+    def test_written_back_changes_leave_the_log(self, engine, make_draft,
+                                                draft_id, packs):
+        other = make_draft()
+        engine.perform(draft_id, 'make_pick', 'player0', packs[0][0])
+        engine.perform(other, 'make_pick', 'player0', packs[0][0])
+        engine._flush(draft_id, engine.drafts[draft_id])
+        assert engine.pick_log.entries().keys() == [other.hex]
+
+        engine.flush()
+        assert engine.pick_log.entries() == {}
+
+    def test_recovers_after_crash(self, engine, make_engine, draft_id, packs):
+        engine.perform(draft_id, 'make_pick_and_pass_left', 'player0',
+                       packs[0][0])
+        engine.perform(draft_id, 'make_pick_and_pass_left', 'player1',
+                       packs[1][0])
+        _crash(engine)
+        assert _stored_picks(draft_id) == []
+
+        make_engine().recover()
+        assert len(_stored_picks(draft_id, 'player0')) == 1
+        assert len(_stored_picks(draft_id, 'player1')) == 1
+        assert engine.pick_log.entries() == {}
+
+    def test_recovery_skips_written_changes(self, engine, make_engine,
+                                            draft_id, packs):
+        engine.perform(draft_id, 'make_pick', 'player0', packs[0][0])
+        engine.flush()
+        engine.perform(draft_id, 'make_pick', 'player1', packs[1][0])
+        _crash(engine)
+
+        make_engine().recover()
+        assert len(_stored_picks(draft_id, 'player0')) == 1
+        assert len(_stored_picks(draft_id, 'player1')) == 1
+
+    def test_evicts_least_recently_used(self, make_engine, make_draft, packs):
+        engine = make_engine(max_drafts=1)
+        first, second = make_draft(), make_draft()
+        engine.perform(first, 'make_pick', 'player0', packs[0][0])
+        engine.perform(second, 'make_pick', 'player0', packs[0][0])
+
+        assert engine.drafts.keys() == [second]
+        assert len(_stored_picks(first)) == 1
+        assert _stored_picks(second) == []
+
+    def test_slow_load_holds_up_only_its_draft(self, engine, make_draft,
+                                                packs, monkeypatch):
+        first, second = make_draft(), make_draft()
+        loading, release = Event(), Event()
+        load = HotDraft.load
+
+        def slow_load(hot):
+            if hot.draft_id == first:
+                loading.set()
+                release.wait()
+            load(hot)
+        monkeypatch.setattr(HotDraft, 'load', slow_load)
+
+        slow = Thread(target=engine.perform,
+                      args=(first, 'make_pick', 'player0', packs[0][0]))
+        slow.start()
+        try:
+            assert loading.wait(5)
+            fast = Thread(target=engine.perform,
+                          args=(second, 'make_pick', 'player0', packs[0][0]))
+            fast.start()
+            fast.join(5)
+            assert not fast.is_alive()
+        finally:
+            release.set()
+            slow.join()
+        engine.stop()
+        assert len(_stored_picks(first)) == 1
+        assert len(_stored_picks(second)) == 1
+
+    def test_missing_draft_is_not_held(self, engine, init_db):
+        with pytest.raises(sa.DraftError):
+            engine.perform(uuid.uuid4(), 'summary')
+        assert not engine.drafts
+
+    def test_one_writer_per_draft(self, engine, draft_id, packs, players):
+        threads = [
+            Thread(target=engine.perform,
+                   args=(draft_id, 'make_pick_and_pass_left', player.handle,
+                         packs[seat][0]))
+            for seat, player in enumerate(players)
+        ]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+        engine.stop()
+
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            assert all(len(draft.picks_for(player)) == 1
+                       for player in players)
+            assert all(len(draft.queues_for(player)['opened']) == 1
+                       for player in players)
@@ -0,0 +1,129 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from drafts_as_a_service import sa
+
+
+@pytest.fixture
+def event_draft(init_db, players, mocked_pool, draft_session):
+    draft = sa.EventSourcedDraft(players=players, pool=mocked_pool)
+    draft_session.add(draft)
+    draft_session.commit()
+    return draft
+
+
+def _start(draft):
+    draft.distribute()
+    [draft.open_pack(player) for player in draft.player_order]
+
+
+def _first_picks_left(draft, session, seats):
+    for name in seats:
+        for _ in xrange(len(draft.queues_for(name)['opened'])):
+            on_deck = draft.queues_for(name)['opened']
+            draft.make_pick_and_pass_left(name, on_deck[0][0])
+            session.commit()
+
+
+def _fetch(session, draft_id):
+    fetched = session.query(sa.Draft).get(draft_id)
+    assert isinstance(fetched, sa.EventSourcedDraft)
+    return fetched
+
+
+class TestEventSourcedDraft(object):
+    def test_actions_are_events(self, event_draft, draft_session):
+        _start(event_draft)
+        event_draft.make_pick_and_pass_left('player0', 'Card 0')
+        draft_session.commit()
+
+        assert [(e.number, e.action, e.player, e.value)
+                for e in event_draft.events][-3:] == [
+            (9, 'open_pack', 'player7', None),
+            (10, 'make_pick', 'player0', 0),
+            (11, 'pass', 'player0', 1),
+        ]
+
+    def test_pick_is_an_insert(self, event_draft, draft_session):
+        _start(event_draft)
+        draft_session.commit()
+
+        event_draft.make_pick('player0', 'Card 0')
+        assert not draft_session.is_modified(event_draft,
+                                             include_collections=False)
+        draft_session.commit()
+        assert event_draft.events.count() == 10
+
+    def test_same_as_json(self, event_draft, the_draft, draft_session):
+        draft_session.add(the_draft)
+        for draft in (event_draft, the_draft):
+            _start(draft)
+            draft_session.commit()
+            _first_picks_left(draft, draft_session, the_draft.player_order)
+
+        for name in the_draft.player_order:
+            assert event_draft.queues_for(name) == the_draft.queues_for(name)
+            assert event_draft.picks_for(name) == the_draft.picks_for(name)
+
+    def test_survives_reload(self, event_draft, draft_session, packs):
+        _start(event_draft)
+        event_draft.make_pick_and_pass_left('player0', 'Card 0')
+        draft_session.commit()
+
+        with sa.Session() as session:
+            fetched = _fetch(session, event_draft.id)
+            assert fetched.queues_for('player1')['opened'] == [
+                packs[1], packs[0][1:]
+            ]
+            assert fetched.picks_for('player0')[0]['drafted'] == 'Card 0'
+
+    def test_failed_actions_are_not_recorded(self, event_draft, packs,
+                                             draft_session):
+        _start(event_draft)
+        with pytest.raises(ValueError):
+            event_draft.make_pick('player0', packs[1][0])
+        draft_session.commit()
+        assert event_draft.events.count() == 9
+        assert event_draft.picks_for('player0') == []
+
+    def test_loads_from_snapshot(self, event_draft, draft_session,
+                                 monkeypatch):
+        monkeypatch.setattr(sa.EventSourcedDraft, 'snapshot_interval', 4)
+        _start(event_draft)
+        _first_picks_left(event_draft, draft_session, ['player0'])
+        expected = event_draft.queues_for('player1')
+        assert event_draft.snapshots.count() == 2
+
+        replayed = []
+        apply = sa.EventSourcedDraft._apply
+        monkeypatch.setattr(sa.EventSourcedDraft, '_apply',
+                            lambda self, e: replayed.append(e.number) or
+                                            apply(self, e))
+        with sa.Session() as session:
+            fetched = _fetch(session, event_draft.id)
+            assert fetched.queues_for('player1') == expected
+        assert replayed == [9, 10, 11]
+
+    def test_concurrent_picks_collide(self, event_draft, draft_session):
+        _start(event_draft)
+        draft_session.commit()
+
+        first, second = sa.Session(), sa.Session()
+        for manager, name in [(first, 'player0'), (second, 'player1')]:
+            draft = _fetch(manager.session, event_draft.id)
+            draft.make_pick(name, draft.queues_for(name)['opened'][0][0])
+
+        first.session.commit()
+        with pytest.raises(IntegrityError):
+            second.session.commit()
+        second.session.rollback()
+        for manager in (first, second):
+            manager.session.close()
+
+    def test_reseating_after_start(self, event_draft):
+        _start(event_draft)
+        with pytest.raises(sa.DraftError):
+            event_draft.seat_players()
@@ -0,0 +1,95 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import uuid
+
+import pytest
+
+from drafts_as_a_service import feed
+from drafts_as_a_service.feed import ChangeFeed
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    notified = []
+    monkeypatch.setattr(feed, 'notify', notified.append)
+    return notified
+
+
+@pytest.fixture
+def draft_id():
+    return uuid.uuid4()
+
+
+def _picked(player, card):
+    return {'type': 'picked', 'player': player, 'pack': 0, 'card': card}
+
+
+def test_since(draft_id, notified):
+    change_feed = ChangeFeed(coalesce_interval=0)
+    change_feed.record(draft_id, [_picked('player0', 'Card 0'),
+                                  _picked('player1', 'Card 15')])
+    assert notified == [[feed.CHANNEL, feed.channel(draft_id)]]
+
+    changes = change_feed.since(draft_id.hex, 1, 'player1')
+    assert changes == [dict(_picked('player1', 'Card 15'), number=2)]
+    assert change_feed.since(draft_id, 2) == []
+
+
+def test_other_players_picks_are_hidden(draft_id, notified):
+    change_feed = ChangeFeed(coalesce_interval=0)
+    change_feed.record(draft_id, [_picked('player0', 'Card 0')])
+    assert 'card' in change_feed.since(draft_id, player='player0')[0]
+    assert 'card' not in change_feed.since(draft_id, player='player1')[0]
+    assert 'card' not in change_feed.since(draft_id)[0]
+
+
+def test_coalesces(draft_id, notified):
+    change_feed = ChangeFeed(coalesce_interval=10)
+    change_feed.record(draft_id, [_picked('player0', 'Card 0')])
+    change_feed.record(draft_id, [_picked('player1', 'Card 15')])
+    assert notified == []
+
+    change_feed.publish()
+    change_feed.publish()
+    assert notified == [[feed.CHANNEL, feed.channel(draft_id)]]
+
+
+def test_reset_when_too_far_behind(draft_id, notified):
+    change_feed = ChangeFeed(coalesce_interval=0, history=2)
+    change_feed.record(draft_id, [_picked('player0', 'Card {}'.format(card))
+                                  for card in xrange(3)])
+    assert change_feed.since(draft_id) == [{'type': 'reset', 'number': 3}]
+    assert len(change_feed.since(draft_id, 1)) == 2
+    # e.g. we were restarted since the client last heard from us
+    assert change_feed.since(draft_id, 7) == [{'type': 'reset', 'number': 3}]
+
+
+def test_forgets_least_recently_changed(notified):
+    change_feed = ChangeFeed(coalesce_interval=0, max_drafts=1)
+    first, second = uuid.uuid4(), uuid.uuid4()
+    change_feed.record(first, [_picked('player0', 'Card 0')])
+    change_feed.record(second, [_picked('player0', 'Card 0')])
+    assert change_feed.changes.keys() == [second]
+
+
+def test_only_changed_drafts_are_notified(notified):
+    change_feed = ChangeFeed(coalesce_interval=10)
+    first, second = uuid.uuid4(), uuid.uuid4()
+    change_feed.record(first, [_picked('player0', 'Card 0')])
+    change_feed.publish()
+    change_feed.record(second, [_picked('player0', 'Card 0')])
+    change_feed.publish()
+    assert [channels[1:] for channels in notified] == [
+        [feed.channel(first)], [feed.channel(second)]]
+
+
+def test_unsent(draft_id, notified):
+    change_feed = ChangeFeed(coalesce_interval=0)
+    change_feed.record(draft_id, [_picked('player0', 'Card 0')])
+    assert len(change_feed.unsent(draft_id, 'a')) == 1
+    assert change_feed.unsent(draft_id, 'a') == []
+    assert len(change_feed.unsent(draft_id, 'b')) == 1
+
+    change_feed.record(draft_id, [_picked('player1', 'Card 15')])
+    assert [change['number']
+            for change in change_feed.unsent(draft_id, 'a')] == [2]
@@ -1,9 +1,13 @@
 # coding=utf-8
 from __future__ import unicode_literals
+import uuid
+from collections import deque
 from copy import deepcopy
+
 import pytest
+import sqlalchemy
 
-from drafts_as_a_service import sa
+from drafts_as_a_service import sa, benchmarks
 
 pytestmark = pytest.mark.usefixtures('init_db')
 
@@ -93,4 +97,285 @@ def test_json_column_after_commit(pool, players):
 
         assert fetched_draft.player_order == the_draft.player_order
         assert fetched_draft.player_queues == the_draft.player_queues
-        assert fetched_draft.player_picks == fetched_draft.player_picks
\ No newline at end of file
+        assert fetched_draft.player_picks == fetched_draft.player_picks
+
+
+def test_queues_are_stored_as_lists(the_draft):
+    with sa.Session() as session:
+        session.add(the_draft)
+        the_draft.distribute()
+        the_draft.open_pack('player0')
+        session.commit()
+
+        stored, = session.execute(
+            sa.Draft.__table__.select().with_only_columns(
+                [sa.Draft.__table__.c.player_queues])
+        ).fetchone()
+        assert stored['player0'] == {'opened': [0], 'unopened': [8, 16]}
+
+        fetched = session.query(sa.Draft).one()
+        assert fetched.player_queues['player0']['opened'] == deque([0])
+
+
+def test_baseline_queues_load(the_draft, packs):
+    with sa.Session() as session:
+        session.add(the_draft)
+        session.commit()
+        # baseline drafts kept the packs themselves in their queues
+        session.execute(sa.Draft.__table__.update().values(
+            state_format=1, player_queues={
+                name: {'opened': [], 'unopened': [packs[seat],
+                                                  packs[seat + 8],
+                                                  packs[seat + 16]]}
+                for seat, name in enumerate(the_draft.player_order)}))
+        session.commit()
+        session.expire_all()
+
+        fetched = session.query(sa.Draft).one()
+        assert fetched.player_queues['player0']['unopened'] == deque(
+            [packs[0], packs[8], packs[16]])
+        fetched.load()
+        assert fetched.queue_entries('player0') == {'opened': [],
+                                                    'unopened': [0, 8, 16]}
+
+
+class TestBulkGetOrCreate(object):
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        sa.player_ids.clear()
+
+    @pytest.fixture
+    def existing(self):
+        with sa.Session() as session:
+            session.add(sa.Player(handle='existing'))
+
+    @pytest.fixture
+    def statements(self):
+        """
+        The SQL statements executed by the test; every test gets its own
+        engine, so there's no need to remove the listener afterwards
+        """
+        executed = []
+        def count(conn, cursor, statement, *args):
+            executed.append(statement)
+        sqlalchemy.event.listen(sa.Session.engine, 'before_cursor_execute',
+                                count)
+        return executed
+
+    def test_get_and_create(self, existing, statements):
+        with sa.Session() as session:
+            players = sa.Player.bulk_get_or_create(
+                session, ['new1', 'existing', 'new2', 'new1'])
+            assert [p.handle for p in players] == ['new1', 'existing', 'new2']
+            # one lookup, one insert, one lookup of what we inserted
+            assert len(statements) == 3
+
+        with sa.Session() as session:
+            assert session.query(sa.Player).count() == 3
+
+    def test_all_existing(self, existing, statements):
+        with sa.Session() as session:
+            player, = sa.Player.bulk_get_or_create(session, ['existing'])
+            assert player.handle == 'existing'
+            assert len(statements) == 1
+            assert sa.player_ids.get('existing') == player.id
+
+    def test_lost_race(self, existing, monkeypatch):
+        # pretend someone created "existing" after we looked for it
+        real_get = sa.Player._bulk_get
+        lookups = []
+        def stale_get(session, handles):
+            lookups.append(handles)
+            if len(lookups) == 1:
+                return {}
+            return real_get(session, handles)
+        monkeypatch.setattr(sa.Player, '_bulk_get', staticmethod(stale_get))
+
+        with sa.Session() as session:
+            players = sa.Player.bulk_get_or_create(session,
+                                                   ['existing', 'new'])
+            assert [p.handle for p in players] == ['existing', 'new']
+        assert lookups == [['existing', 'new']] * 2 + [['new']]
+
+    def test_in_callers_transaction(self):
+        with pytest.raises(ZeroDivisionError):
+            with sa.Session() as session:
+                sa.Player.bulk_get_or_create(session, ['new'])
+                1 / 0
+
+        with sa.Session() as session:
+            assert session.query(sa.Player).count() == 0
+            player, = sa.Player.bulk_get_or_create(session, ['new'])
+            assert player.handle == 'new'
+
+    def test_stale_cache(self, statements):
+        sa.player_ids.add('deleted', uuid.uuid4())
+        with sa.Session() as session:
+            player, = sa.Player.bulk_get_or_create(session, ['deleted'])
+            assert sa.player_ids.get('deleted') == player.id
+
+
+def test_handle_cache_evicts_least_recently_used():
+    cache = sa.HandleCache(2)
+    cache.add('a', 1)
+    cache.add('b', 2)
+    assert cache.get('a') == 1
+    cache.add('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+class TestDraftUpdate(object):
+    @pytest.fixture
+    def draft_id(self, the_draft, draft_session):
+        draft_session.add(the_draft)
+        the_draft.distribute()
+        [the_draft.open_pack(name) for name in the_draft.player_order]
+        draft_session.commit()
+        return the_draft.id
+
+    def _first_card(self, draft, name):
+        return draft.queues_for(name)['opened'][0][0]
+
+    def test_lost_update_is_detected(self, draft_id):
+        first, second = sa.Session(), sa.Session()
+        for manager, name in [(first, 'player0'), (second, 'player1')]:
+            draft = manager.session.query(sa.Draft).get(draft_id)
+            draft.make_pick(name, self._first_card(draft, name))
+
+        first.session.commit()
+        with pytest.raises(sqlalchemy.orm.exc.StaleDataError):
+            second.session.commit()
+        for manager in (first, second):
+            manager.session.close()
+
+    def test_update_retries_on_conflict(self, draft_id):
+        attempts = []
+
+        def pick(draft):
+            attempts.append(draft.version)
+            if len(attempts) == 1:
+                # someone else picks after we've loaded the draft
+                sa.Draft.update(draft_id, lambda other: other.make_pick(
+                    'player1', self._first_card(other, 'player1')))
+            draft.make_pick('player0', self._first_card(draft, 'player0'))
+            return 'picked'
+
+        assert sa.Draft.update(draft_id, pick) == 'picked'
+        assert attempts == [1, 2]
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            assert draft.version == 3
+            assert len(draft.picks_for('player0')) == 1
+            assert len(draft.picks_for('player1')) == 1
+
+    def test_update_gives_up(self, draft_id):
+        others = iter(['player1', 'player2'])
+
+        def always_conflicts(draft):
+            name = next(others)
+            sa.Draft.update(draft_id, lambda other: other.make_pick(
+                name, self._first_card(other, name)))
+            draft.make_pick('player0', self._first_card(draft, 'player0'))
+
+        with pytest.raises(sqlalchemy.orm.exc.StaleDataError):
+            sa.Draft.update(draft_id, always_conflicts, attempts=2)
+
+    def test_update_with_lock(self, draft_id):
+        sa.Draft.update(draft_id, lambda draft: draft.make_pick(
+            'player0', self._first_card(draft, 'player0')), lock=True)
+        with sa.Session() as session:
+            draft = session.query(sa.Draft).get(draft_id)
+            assert len(draft.picks_for('player0')) == 1
+
+
+class TestCreateEngine(object):
+    def test_sqlite_file(self, tmpdir):
+        engine = sa.create_engine('sqlite:///' + str(tmpdir.join('das.db')))
+        assert isinstance(engine.pool, sqlalchemy.pool.QueuePool)
+        assert engine.pool.size() == 5
+        with engine.connect() as connection:
+            assert connection.execute('PRAGMA journal_mode').scalar() == 'wal'
+            # 1 is "normal"
+            assert connection.execute('PRAGMA synchronous').scalar() == 1
+
+    def test_sqlite_memory(self):
+        engine = sa.create_engine('sqlite://')
+        assert engine.execute('SELECT 1').scalar() == 1
+
+    def test_lazy(self):
+        made = []
+
+        class Lazy(object):
+            engine = sa.LazyEngine(lambda: made.append(1) or 'engine')
+
+        assert made == []
+        assert Lazy.engine == Lazy.engine == 'engine'
+        assert made == [1]
+
+
+class TestCreateMany(object):
+    @pytest.fixture
+    def statements(self):
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+        sqlalchemy.event.listen(sa.Session.engine, 'before_cursor_execute',
+                                count)
+        return statements
+
+    def _pods(self, count):
+        return [['pod{}player{}'.format(pod, seat) for seat in xrange(8)]
+                for pod in xrange(count)]
+
+    def test_creates_and_deals(self, pool):
+        with sa.Session() as session:
+            drafts, timings = sa.Draft.create_many(
+                session, session.merge(pool), self._pods(3), start=True)
+            ids = [draft.id for draft in drafts]
+        assert timings.keys() == ['players', 'deal', 'seat', 'insert']
+
+        with sa.Session() as session:
+            for draft_id, handles in zip(ids, self._pods(3)):
+                draft = session.query(sa.Draft).get(draft_id)
+                assert sorted(draft.player_order) == sorted(handles)
+                assert draft.whose_turn() == draft.player_order
+                assert draft.waiting_on() == {name: 1 for name in handles}
+                assert draft.dealt_packs == list(draft.deal())
+
+    def test_inserts_in_bulk(self, pool, statements):
+        with sa.Session() as session:
+            session.add(pool)
+        counts = []
+        for pods in (1, 4):
+            with sa.Session() as session:
+                pool = session.merge(pool)
+                pool.card_names
+                del statements[:]
+                sa.Draft.create_many(session, pool, self._pods(pods))
+            counts.append(len([statement for statement in statements
+                               if statement.startswith('INSERT')]))
+        assert counts[0] == counts[1]
+
+    @pytest.mark.skipif('sa.boosters.numpy is None')
+    def test_booster_pools_deal_once(self):
+        booster_pool = sa.Pool(type='boosters', contents={
+            'cards': {'common': ['Card {}'.format(idx)
+                                 for idx in xrange(100)]},
+            'slots': [{'count': 15, 'rarities': {'common': 1}}],
+        })
+        with sa.Session() as session:
+            drafts, _ = sa.Draft.create_many(session, booster_pool,
+                                             self._pods(2), seed=0)
+            ids = [draft.id for draft in drafts]
+
+        with sa.Session() as session:
+            packs = [session.query(sa.Draft).get(draft_id).dealt_packs
+                     for draft_id in ids]
+            assert [len(pod_packs) for pod_packs in packs] == [24, 24]
+            assert packs[0] != packs[1]
+
+    def test_benchmark(self):
+        timings = benchmarks.compare_bulk_creation(pods=2, players=2)
+        assert set(timings) == {'one session per pod', 'create_many'}
@@ -0,0 +1,143 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from drafts_as_a_service import sa
+
+
+@pytest.fixture
+def normalized_draft(init_db, players, mocked_pool, draft_session):
+    draft = sa.NormalizedDraft(players=players, pool=mocked_pool)
+    draft_session.add(draft)
+    draft_session.commit()
+    return draft
+
+
+def _start(draft):
+    draft.distribute()
+    [draft.open_pack(player) for player in draft.player_order]
+
+
+def _first_picks_left(draft, session, seats):
+    for name in seats:
+        for _ in xrange(len(draft.queues_for(name)['opened'])):
+            on_deck = draft.queues_for(name)['opened']
+            draft.make_pick_and_pass_left(name, on_deck[0][0])
+            session.commit()
+
+
+class TestNormalizedDraft(object):
+    def test_distribute(self, normalized_draft, packs, draft_session):
+        _start(normalized_draft)
+        draft_session.commit()
+
+        assert draft_session.query(sa.DraftPack).count() == 24
+        assert normalized_draft.queues_for('player3') == {
+            'opened': [packs[3]],
+            'unopened': [packs[11], packs[19]],
+        }
+
+    def test_pick_is_an_insert(self, normalized_draft, packs, draft_session):
+        _start(normalized_draft)
+        draft_session.commit()
+
+        normalized_draft.make_pick('player0', 'Card 0')
+        assert not draft_session.is_modified(normalized_draft,
+                                             include_collections=False)
+        assert [pack.number for pack in normalized_draft.packs
+                if draft_session.is_modified(pack)] == [0]
+        draft_session.commit()
+
+        assert draft_session.query(sa.DraftPick).count() == 1
+        assert normalized_draft.picks_for('player0') == [{
+            'drafted': 'Card 0',
+            'passed': packs[0][1:],
+        }]
+
+    def test_same_as_json(self, normalized_draft, the_draft, players,
+                          draft_session):
+        draft_session.add(the_draft)
+        for draft in (normalized_draft, the_draft):
+            _start(draft)
+            draft_session.commit()
+            _first_picks_left(draft, draft_session, the_draft.player_order)
+
+        for name in the_draft.player_order:
+            assert (normalized_draft.queues_for(name) ==
+                    the_draft.queues_for(name))
+            assert (normalized_draft.picks_for(name) ==
+                    the_draft.picks_for(name))
+
+    def test_survives_reload(self, normalized_draft, draft_session):
+        _start(normalized_draft)
+        normalized_draft.make_pick_and_pass_left('player0', 'Card 0')
+        draft_session.commit()
+        draft_id = normalized_draft.id
+
+        with sa.Session() as session:
+            fetched = session.query(sa.Draft).get(draft_id)
+            assert isinstance(fetched, sa.NormalizedDraft)
+            assert len(fetched.queues_for('player1')['opened']) == 2
+            assert fetched.picks_for('player0')[0]['drafted'] == 'Card 0'
+
+    def test_concurrent_picks(self, normalized_draft, draft_session):
+        _start(normalized_draft)
+        draft_session.commit()
+        normalized_draft.queues_for('player0')
+
+        with sa.Session() as session:
+            session.query(sa.Draft).get(normalized_draft.id).make_pick(
+                'player0', 'Card 0')
+
+        normalized_draft.make_pick('player0', 'Card 1')
+        with pytest.raises(StaleDataError):
+            draft_session.commit()
+        draft_session.rollback()
+
+    def test_pick_numbers_are_unique(self, normalized_draft, draft_session):
+        _start(normalized_draft)
+        normalized_draft.make_pick('player0', 'Card 0')
+        draft_session.commit()
+
+        pick, = normalized_draft.picks
+        draft_session.add(sa.DraftPick(
+            draft_id=pick.draft_id, player=pick.player, number=pick.number,
+            card=1, pack_id=pick.pack_id, pack_pick=2))
+        with pytest.raises(IntegrityError):
+            draft_session.flush()
+        draft_session.rollback()
+
+
+def test_normalize(the_draft, packs, draft_session):
+    draft_session.add(the_draft)
+    _start(the_draft)
+    the_draft.make_pick_and_pass_left('player0', 'Card 0')
+    draft_session.commit()
+
+    expected_queues = {name: the_draft.queues_for(name)
+                       for name in the_draft.player_order}
+    expected_picks = {name: the_draft.picks_for(name)
+                      for name in the_draft.player_order}
+    the_draft.normalize()
+    draft_session.commit()
+    draft_id = the_draft.id
+
+    with sa.Session() as session:
+        fetched = session.query(sa.Draft).get(draft_id)
+        assert isinstance(fetched, sa.NormalizedDraft)
+        assert fetched.player_queues == {}
+        for name in fetched.player_order:
+            assert fetched.queues_for(name) == expected_queues[name]
+            assert fetched.picks_for(name) == expected_picks[name]
+
+        fetched.make_pick_and_pass_left('player1', packs[1][0])
+        assert fetched.picks_for('player1') == [{
+            'drafted': packs[1][0],
+            'passed': packs[1][1:],
+        }]
+
+    with pytest.raises(sa.DraftError):
+        the_draft.normalize()
@@ -0,0 +1,91 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import json
+import os
+
+import pytest
+
+from drafts_as_a_service import sa, pools
+
+pytestmark = pytest.mark.usefixtures('init_db')
+
+
+@pytest.fixture
+def registry():
+    return pools.PoolRegistry()
+
+
+@pytest.fixture
+def pool_file(tmpdir, cards):
+    path = tmpdir.join('pool.json')
+    path.write(json.dumps(cards))
+    return str(path)
+
+
+def test_loads_once(registry, pool_file, cards, monkeypatch):
+    assert registry.load(pool_file).contents == cards
+    monkeypatch.setattr(json, 'load', lambda f: pytest.fail('reloaded'))
+    assert registry.load(pool_file).contents == cards
+
+
+def test_reloads_when_changed(registry, pool_file, cards):
+    first = registry.load(pool_file)
+    with open(pool_file, 'w') as f:
+        json.dump(cards[:10], f)
+    os.utime(pool_file, (first.mtime + 10, first.mtime + 10))
+
+    second = registry.load(pool_file)
+    assert second.contents == cards[:10]
+    assert second.content_hash != first.content_hash
+
+
+def test_pools_are_shared(registry, pool_file, cards):
+    with sa.Session() as session:
+        pool_id = registry.get(session, pool_file).id
+
+    # a new registry has to find the pool by its hash
+    for lookup in (registry, pools.PoolRegistry()):
+        with sa.Session() as session:
+            assert lookup.get(session, pool_file).id == pool_id
+
+    with sa.Session() as session:
+        pool = session.query(sa.Pool).one()
+        assert pool.contents == cards
+        assert pool.content_hash == sa.Pool.hash_contents('set', cards)
+
+
+def test_different_contents_get_different_pools(registry, pool_file, cards):
+    with sa.Session() as session:
+        registry.get(session, pool_file)
+
+    with open(pool_file, 'w') as f:
+        json.dump(cards[:10], f)
+    os.utime(pool_file, (1, 1))
+
+    with sa.Session() as session:
+        assert registry.get(session, pool_file).contents == cards[:10]
+
+    with sa.Session() as session:
+        assert session.query(sa.Pool).count() == 2
+
+
+def test_lost_race(registry, pool_file, monkeypatch):
+    with sa.Session() as session:
+        pool_id = registry.get(session, pool_file).id
+
+    # pretend someone created the pool after we looked for it
+    real_find = pools.PoolRegistry._find
+    lookups = []
+    def stale_find(self, session, content_hash):
+        lookups.append(content_hash)
+        if len(lookups) == 1:
+            return None
+        return real_find(self, session, content_hash)
+    monkeypatch.setattr(pools.PoolRegistry, '_find', stale_find)
+
+    with sa.Session() as session:
+        assert pools.PoolRegistry().get(session, pool_file).id == pool_id
+        assert len(lookups) == 2
+
+    with sa.Session() as session:
+        assert session.query(sa.Pool).count() == 1
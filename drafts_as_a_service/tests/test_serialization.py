@@ -0,0 +1,75 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import pytest
+import sqlalchemy
+from sqlalchemy.schema import Column, MetaData, Table
+from sqlalchemy.types import Integer
+
+from drafts_as_a_service import serialization, benchmarks
+from drafts_as_a_service.serialization import Serialized, get_codec
+
+
+STATE = {
+    'player0': {'opened': [1, 0], 'unopened': [9, 17]},
+    'pl\xe1yer1': {'opened': [], 'unopened': [2, 10, 18]},
+}
+
+
+@pytest.fixture(params=serialization.available_codecs())
+def codec(request):
+    return get_codec(request.param)
+
+
+def _table(codec):
+    return Table('state', MetaData(),
+                 Column('id', Integer(), primary_key=True),
+                 Column('value', Serialized(codec)))
+
+
+def _round_trip(table, value):
+    engine = sqlalchemy.create_engine('sqlite://')
+    table.create(engine)
+    engine.execute(table.insert(), id=1, value=value)
+    return engine.execute(sqlalchemy.select([table.c.value])).scalar()
+
+
+def test_round_trip(codec):
+    assert codec.loads(codec.dumps(STATE)) == STATE
+    assert _round_trip(_table(codec), STATE) == STATE
+
+
+def test_binary_codecs_are_stored_as_blobs():
+    column = _table(get_codec('zlib')).c.value
+    dialect = sqlalchemy.create_engine('sqlite://').dialect
+    assert isinstance(column.type.dialect_impl(dialect).impl,
+                      sqlalchemy.types.LargeBinary)
+
+
+def test_binary_codecs_read_json(codec):
+    if codec.binary:
+        assert codec.loads(b'{"player0": [1, 2]}') == {'player0': [1, 2]}
+
+
+def test_missing_json_library_falls_back(monkeypatch):
+    monkeypatch.setattr(serialization, 'ujson', None)
+    assert get_codec('ujson').name == 'json'
+
+
+def test_missing_msgpack(monkeypatch):
+    monkeypatch.setattr(serialization, 'msgpack', None)
+    with pytest.raises(ImportError):
+        get_codec('msgpack')
+    assert 'msgpack' not in serialization.available_codecs()
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec('pickle')
+
+
+def test_benchmark():
+    results = benchmarks.compare_serialization(number=1)
+    assert set(results) == set(serialization.available_codecs())
+    # compressing is the whole point of zlib
+    assert results['zlib'][2] < results['json'][2]
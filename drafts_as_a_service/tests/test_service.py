@@ -0,0 +1,150 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import pytest
+
+from drafts_as_a_service import sa, service
+from drafts_as_a_service.engine import DraftEngine
+
+
+@pytest.fixture
+def draft_id(init_db, players, mocked_pool, draft_session, packs):
+    draft = sa.Draft(players=players, pool=mocked_pool)
+    draft.start()
+    draft.pick('player0', packs[0][0])
+    draft.pick('player1', packs[1][0])
+    draft_session.add(draft)
+    draft_session.commit()
+    return draft.id
+
+
+@pytest.fixture(params=['database', 'engine'])
+def reads_from(request, monkeypatch, tmpdir):
+    if request.param == 'engine':
+        engine = DraftEngine(pick_log=str(tmpdir.join('picks.log')))
+        request.addfinalizer(engine.pick_log.close)
+        monkeypatch.setattr(service, 'engine', engine)
+    return request.param
+
+
+def test_drafts_projection(draft_id):
+    assert service.drafts(fields=['id', 'waiting']) == [
+        {'id': draft_id, 'waiting': {'player1': 1, 'player2': 2,
+                                     'player3': 1, 'player4': 1,
+                                     'player5': 1, 'player6': 1,
+                                     'player7': 1}}]
+    with pytest.raises(sa.DraftError):
+        service.drafts(fields=['player_picks'])
+
+
+def test_drafts_pages(init_db, players, mocked_pool, draft_session):
+    ids = []
+    for _ in xrange(3):
+        draft = sa.Draft(players=players, pool=mocked_pool)
+        draft_session.add(draft)
+        draft_session.commit()
+        ids.append(draft.id)
+
+    pages = [service.drafts(fields=['id'], limit=2, offset=offset)
+             for offset in (0, 2)]
+    assert [len(page) for page in pages] == [2, 1]
+    assert sorted(summary['id'] for page in pages
+                  for summary in page) == sorted(ids)
+
+
+def test_drafts_pages_waiting(init_db, players, mocked_pool, draft_session):
+    for _ in xrange(3):
+        draft = sa.Draft(players=players, pool=mocked_pool)
+        draft.start()
+        draft_session.add(draft)
+        draft_session.commit()
+
+    page = service.drafts(fields=['waiting'], limit=2, offset=1)
+    assert [len(summary['waiting']) for summary in page] == [8, 8]
+
+
+def test_draft(draft_id, reads_from):
+    assert service.draft(draft_id, fields=['players', 'packs_dealt']) == {
+        'players': ['player{}'.format(seat) for seat in xrange(8)],
+        'packs_dealt': True,
+    }
+
+
+def test_my_queue(draft_id, reads_from, packs):
+    assert service.my_queue(draft_id, 'player2') == {
+        'opened': [packs[2], packs[1][1:]],
+        'packs': {'opened': [2, 1], 'unopened': [10, 18]}}
+
+
+def test_phase(draft_id, reads_from):
+    phase = service.phase(draft_id)
+    assert phase['direction'] == 'left'
+    assert phase['pending']['player1'] == 1
+
+
+def test_reads_do_not_write(draft_id, monkeypatch):
+    def update(*args, **kwargs):
+        raise AssertionError('reads should not go through update')
+    monkeypatch.setattr(sa.Draft, 'update', staticmethod(update))
+    service.phase(draft_id)
+    service.queues_for(draft_id, 'player2')
+
+
+def test_my_picks_since(draft_id, reads_from, packs):
+    assert service.my_picks(draft_id, 'player0') == [
+        {'number': 0, 'pack': 0, 'drafted': packs[0][0]}]
+    assert service.my_picks(draft_id, 'player0', since=1) == []
+    with pytest.raises(sa.DraftError):
+        service.my_picks(draft_id, 'player0', since=-1)
+
+
+def test_reads_from_engine_only_if_held(draft_id, packs, request,
+                                        monkeypatch, tmpdir):
+    engine = DraftEngine(pick_log=str(tmpdir.join('picks.log')))
+    request.addfinalizer(engine.pick_log.close)
+    monkeypatch.setattr(service, 'engine', engine)
+    assert service.my_queue(draft_id, 'player2')['packs'] == {
+        'opened': [2, 1], 'unopened': [10, 18]}
+    assert not service.engine.holds(draft_id)
+
+    service.make_pick(draft_id, 'player2', packs[2][0])
+    assert service.engine.holds(draft_id)
+    # not written back yet, so only the engine has it
+    assert service.my_picks(draft_id, 'player2') == [
+        {'number': 0, 'pack': 2, 'drafted': packs[2][0]}]
+
+
+def test_changes(draft_id, reads_from, packs, monkeypatch):
+    monkeypatch.setattr(service, 'change_feed',
+                        service.ChangeFeed(coalesce_interval=10))
+    if service.engine is not None:
+        service.engine.on_change = service.change_feed.record
+
+    service.make_pick(draft_id, 'player2', packs[2][0])
+    assert service.changes(draft_id, 'player2') == [
+        {'number': 1, 'type': 'picked', 'player': 'player2', 'pack': 2,
+         'card': packs[2][0]},
+        {'number': 2, 'type': 'passed', 'player': 'player2',
+         'to': 'player3', 'pack': 2},
+    ]
+    assert 'card' not in service.changes(draft_id, 'player3')[0]
+    assert service.changes(draft_id, 'player2', since=2) == []
+    assert len(service.changes(draft_id, 'player2', client='a')) == 2
+    assert service.changes(draft_id, 'player2', client='a') == []
+
+
+def test_create_drafts(init_db, pool, monkeypatch):
+    monkeypatch.setattr(service.pools.registry, 'get',
+                        lambda session, path: session.merge(pool))
+    monkeypatch.setattr(service, 'bot', None)
+
+    pods = [['pod{}player{}'.format(pod, seat) for seat in xrange(8)]
+            for pod in xrange(2)]
+    created = service.create_drafts(pods, start=True)
+    assert 'commit' in created['timings']
+    summaries = [service.draft(draft_id, fields=['players', 'waiting'])
+                 for draft_id in created['drafts']]
+    assert [sorted(summary['players']) for summary in summaries] == pods
+    assert all(len(summary['waiting']) == 8 for summary in summaries)
+    # creating drafts doesn't need the twitter bot
+    assert service.bot is None
@@ -0,0 +1,55 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import random
+
+import pytest
+
+from drafts_as_a_service import simulation, benchmarks
+
+
+pytestmark = pytest.mark.usefixtures('shuffle')
+
+
+@pytest.mark.parametrize('storage', sorted(simulation.STORAGE))
+def test_run_draft(storage, players, pool):
+    draft = simulation.STORAGE[storage](players=players, pool=pool, seed=1)
+    assert simulation.run_draft(draft, simulation.first_pick) == 360
+
+    for name in draft.player_order:
+        assert len(draft.picks_for(name)) == 45
+        assert draft.pack_for(name) is None
+        assert draft.queues_for(name) == {'opened': [], 'unopened': []}
+
+
+def test_storage_agrees(players, pool):
+    drafted = set()
+    for draft_class in simulation.STORAGE.values():
+        draft = draft_class(players=players, pool=pool, seed=1)
+        simulation.run_draft(draft, simulation.random_pick, random.Random(2))
+        drafted.add(tuple(tuple(pick['drafted']
+                                for pick in draft.picks_for(name))
+                          for name in draft.player_order))
+    assert len(drafted) == 1
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_simulate(backend):
+    results = simulation.simulate(drafts=2, players=2, backend=backend,
+                                  seed=0)
+    assert results['picks'] == 2 * 2 * 45
+    assert results['picks_per_second'] > 0
+    assert results['process_peak_memory_kb'] > 0
+    if backend == 'sqlite':
+        assert sorted(results['commit_latency']) == [50, 90, 99]
+    else:
+        assert results['commit_latency'] == {}
+
+
+def test_percentiles():
+    assert simulation.percentiles(range(100)) == {50: 50, 90: 90, 99: 99}
+    assert simulation.percentiles([]) == {}
+
+
+def test_benchmark_runs():
+    timings = benchmarks.compare_simulation(drafts=1, players=2)
+    assert len(timings) == 2 * len(simulation.STORAGE)
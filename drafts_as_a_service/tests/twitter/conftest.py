@@ -2,10 +2,15 @@
 from __future__ import unicode_literals
 import json
 import os
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 from os.path import join
+from Queue import Queue
+from SocketServer import ThreadingMixIn
+from threading import Thread
 
 import mock
 import pytest
+import requests
 
 from drafts_as_a_service import config
 from drafts_as_a_service.twitter import DraftBot, Message
@@ -30,12 +35,106 @@ def start_message(raw_start_message):
     return Message(raw_start_message)
 
 
+class FakeTimeline(object):
+    """
+    A local stand-in for the mentions timeline, which pages the way twitter
+    does: newest first, honoring since_id, max_id and count
+    """
+    def __init__(self):
+        self.tweets = {}
+        self.requests = []
+
+    def add(self, tweet, twitter_id=None):
+        if twitter_id is None:
+            twitter_id = max(self.tweets or [1000]) + 1
+        tweet = dict(tweet, id=twitter_id)
+        self.tweets[twitter_id] = tweet
+        return tweet
+
+    def get_mentions_timeline(self, count=20, since_id=None, max_id=None):
+        self.requests.append(dict(count=count, since_id=since_id,
+                                  max_id=max_id))
+        matching = [twitter_id for twitter_id in sorted(self.tweets,
+                                                        reverse=True)
+                    if (since_id is None or twitter_id > since_id) and
+                       (max_id is None or twitter_id <= max_id)]
+        return [self.tweets[twitter_id] for twitter_id in matching[:count]]
+
+
+class FakeStreamServer(ThreadingMixIn, HTTPServer):
+    """
+    A local stand-in for twitter's user stream, which sends whatever events
+    it's given as lines of JSON until it's told to disconnect
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _StreamHandler)
+        self.events = Queue()
+        self.connections = 0
+
+    @property
+    def url(self):
+        return 'http://{}:{}/user.json'.format(*self.server_address)
+
+    def connect(self):
+        response = requests.get(self.url, stream=True, timeout=5)
+        response.raise_for_status()
+        return response
+
+    def send(self, event):
+        self.events.put(json.dumps(event))
+
+    def keep_alive(self):
+        self.events.put('')
+
+    def disconnect(self):
+        self.events.put(None)
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.connections += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        while True:
+            event = self.server.events.get()
+            if event is None:
+                return
+            self.wfile.write(event.encode('utf-8') + b'\r\n')
+            self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stream_server(request):
+    server = FakeStreamServer()
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    def _shutdown():
+        server.shutdown()
+        server.server_close()
+    request.addfinalizer(_shutdown)
+    return server
+
+
+@pytest.fixture
+def timeline():
+    return FakeTimeline()
+
+
 @pytest.fixture
-def mocked_client():
+def mocked_client(timeline):
     """
     The mock object that replaces the Twitter client
     """
-    return mock.Mock()
+    client = mock.Mock()
+    client.get_mentions_timeline.side_effect = timeline.get_mentions_timeline
+    return client
 
 @pytest.fixture
 def bot(request, mocked_client, mocked_pool):
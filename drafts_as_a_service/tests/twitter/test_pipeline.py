@@ -0,0 +1,115 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import time
+from threading import Event, Lock, Thread
+
+import pytest
+
+from drafts_as_a_service import sa
+from drafts_as_a_service.pipeline import IngestionPipeline
+
+
+@pytest.fixture
+def processed(bot, monkeypatch):
+    """
+    (tweeter, id) of every message processed, in the order they finished
+    """
+    processed = []
+    lock = Lock()
+    def process(message):
+        # give the other workers a chance to get ahead
+        time.sleep(0.001 * (message['id'] % 3))
+        with lock:
+            processed.append((message['user']['screen_name'], message['id']))
+    monkeypatch.setattr(bot, 'process', process)
+    return processed
+
+
+@pytest.fixture
+def pipeline(request, bot):
+    pipeline = IngestionPipeline(bot, workers=3, queue_size=2)
+    request.addfinalizer(pipeline.stop)
+    return pipeline
+
+
+def _message(twitter_id, tweeter):
+    return {'id': twitter_id, 'user': {'screen_name': tweeter}}
+
+
+def test_same_key_in_order(pipeline, processed):
+    pipeline.start(poll=False)
+    for twitter_id in xrange(30):
+        pipeline.submit(_message(twitter_id, 'player{}'.format(twitter_id % 4)))
+    pipeline.join()
+
+    assert len(processed) == 30
+    for tweeter in {tweeter for tweeter, _ in processed}:
+        ids = [twitter_id for who, twitter_id in processed if who == tweeter]
+        assert ids == sorted(ids)
+
+
+def test_backpressure(bot, monkeypatch):
+    release = Event()
+    monkeypatch.setattr(bot, 'process', lambda message: release.wait())
+    pipeline = IngestionPipeline(bot, workers=1, queue_size=1)
+    pipeline.start(poll=False)
+
+    # one for the worker to get stuck on, and one to fill the queue
+    pipeline.submit(_message(1, 'a'))
+    pipeline.submit(_message(2, 'a'))
+    while not pipeline.queues[0].full():
+        time.sleep(0.001)
+
+    blocked = Thread(target=pipeline.submit, args=(_message(3, 'a'),))
+    blocked.start()
+    blocked.join(0.05)
+    assert blocked.is_alive()
+
+    release.set()
+    blocked.join(1)
+    assert not blocked.is_alive()
+    pipeline.stop()
+
+
+def test_stop_finishes_queued_work(pipeline, processed):
+    pipeline.start(poll=False)
+    for twitter_id in xrange(5):
+        pipeline.submit(_message(twitter_id, 'a'))
+    pipeline.stop()
+    assert [twitter_id for _, twitter_id in processed] == range(5)
+
+
+def test_poll_records_and_queues(pipeline, processed, timeline,
+                                 raw_start_message):
+    for _ in xrange(3):
+        timeline.add(raw_start_message)
+    pipeline.start(poll=False)
+
+    assert pipeline.poll() == 3
+    pipeline.join()
+    assert len(processed) == 3
+    with sa.Session() as session:
+        assert session.query(sa.Message).filter_by(
+            processed=True).count() == 3
+    assert pipeline.poll() == 0
+
+
+def test_start_requeues_unprocessed(pipeline, processed, bot):
+    # recorded, but we crashed before a worker got to them
+    bot.poller.record([_message(1, 'a'), _message(2, 'b')])
+    pipeline.start(poll=False)
+    pipeline.join()
+
+    assert sorted(twitter_id for _, twitter_id in processed) == [1, 2]
+    assert bot.poller.unprocessed() == []
+
+
+def test_polls_in_the_background(pipeline, processed, timeline,
+                                 raw_start_message):
+    timeline.add(raw_start_message)
+    pipeline.poll_interval = 0.01
+    pipeline.start()
+    deadline = time.time() + 1
+    while not processed and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(processed) == 1
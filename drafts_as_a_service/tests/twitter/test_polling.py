@@ -0,0 +1,91 @@
+# coding=utf-8
+from __future__ import unicode_literals
+
+import mock
+import pytest
+
+from drafts_as_a_service import sa, service
+
+
+@pytest.fixture
+def processed(request, bot):
+    """
+    The ids of the messages the bot was asked to process, in order
+    """
+    processed = []
+    patcher = mock.patch.object(bot, 'process',
+                                side_effect=lambda m: processed.append(m['id']))
+    patcher.start()
+    request.addfinalizer(patcher.stop)
+    return processed
+
+
+@pytest.fixture
+def mentions(timeline, raw_start_message):
+    return [timeline.add(raw_start_message) for _ in xrange(5)]
+
+
+def _stored_ids():
+    with sa.Session() as session:
+        return sorted(twitter_id for twitter_id, in
+                      session.query(sa.Message.twitter_id))
+
+
+def test_processes_oldest_first(bot, mentions, processed):
+    assert bot.poller.poll() == 5
+    assert processed == [m['id'] for m in mentions]
+    assert _stored_ids() == processed
+
+
+def test_pages_back_to_the_high_water_mark(bot, mentions, processed,
+                                           timeline):
+    bot.poller.page_size = 2
+    bot.poller.poll()
+    assert processed == [m['id'] for m in mentions]
+    # twitter can send short pages, so we stop at the first empty one
+    assert [r['max_id'] for r in timeline.requests] == [
+        None, mentions[3]['id'] - 1, mentions[1]['id'] - 1,
+        mentions[0]['id'] - 1,
+    ]
+
+
+def test_only_new_messages(bot, mentions, processed, timeline,
+                           raw_start_message):
+    bot.poller.poll()
+    del processed[:]
+    del timeline.requests[:]
+
+    assert bot.poller.poll() == 0
+    assert timeline.requests[0]['since_id'] == mentions[-1]['id']
+
+    newest = timeline.add(raw_start_message)
+    assert bot.poller.poll() == 1
+    assert processed == [newest['id']]
+
+
+def test_high_water_mark_is_persisted(bot, mentions, processed, timeline):
+    bot.poller.poll()
+    bot.poller.since_id = None
+    del timeline.requests[:]
+
+    assert bot.poller.poll() == 0
+    assert timeline.requests[0]['since_id'] == mentions[-1]['id']
+
+
+def test_skips_recorded_messages(bot, mentions, processed):
+    bot.poller.record([mentions[2]])
+    bot.poller.since_id = 0
+    assert bot.poller.poll() == 4
+    assert mentions[2]['id'] not in processed
+
+
+def test_failed_messages_are_not_retried(bot, mentions):
+    with mock.patch.object(bot, 'process', side_effect=ValueError):
+        assert bot.poller.poll() == 5
+    assert len(_stored_ids()) == 5
+
+
+def test_check_for_messages(bot, mentions, processed, monkeypatch):
+    monkeypatch.setattr(service, 'bot', bot)
+    assert service.check_for_messages() == 5
+    assert service.check_for_messages() == 0
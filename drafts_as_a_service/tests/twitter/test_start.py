@@ -37,4 +37,11 @@ class TestSettingUpDraft(object):
         bot._process_start_message(start_message)
         with sa.Session() as session:
             assert session.query(sa.Player).count() == 2
-            assert session.query(sa.Draft).count() == 1
\ No newline at end of file
+            assert session.query(sa.Draft).count() == 1
+
+    def test_pool_is_shared(self, bot, start_message):
+        bot._process_start_message(start_message)
+        bot._process_start_message(start_message)
+        with sa.Session() as session:
+            assert session.query(sa.Draft).count() == 2
+            assert session.query(sa.Pool).count() == 1
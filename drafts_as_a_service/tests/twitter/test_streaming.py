@@ -0,0 +1,83 @@
+# coding=utf-8
+from __future__ import unicode_literals
+import time
+
+import pytest
+
+from drafts_as_a_service import sa
+from drafts_as_a_service.streaming import MentionStream
+
+
+@pytest.fixture
+def dispatched():
+    return []
+
+
+@pytest.fixture
+def stream(request, bot, stream_server, dispatched):
+    stream = MentionStream(bot, dispatch=lambda m: dispatched.append(m['id']),
+                           connect=stream_server.connect, backoff=0.01,
+                           max_backoff=0.05)
+    def _stop():
+        stream.stopped.set()
+        stream_server.disconnect()
+        stream.stop(5)
+    request.addfinalizer(_stop)
+    return stream
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_dispatches_mentions_as_they_arrive(stream, stream_server, dispatched,
+                                            timeline, raw_start_message):
+    stream.start()
+    _wait_for(lambda: stream.connections == 1)
+
+    stream_server.send({'friends': [1, 2, 3]})
+    stream_server.keep_alive()
+    not_a_mention = dict(raw_start_message, id=5, entities={})
+    stream_server.send(not_a_mention)
+    stream_server.send(dict(raw_start_message, id=10))
+    _wait_for(lambda: dispatched == [10])
+
+    with sa.Session() as session:
+        assert session.query(sa.Message.twitter_id).scalar() == 10
+
+
+def test_catches_up_after_reconnecting(stream, stream_server, dispatched,
+                                       timeline, raw_start_message):
+    missed = timeline.add(raw_start_message, twitter_id=1)
+    stream.start()
+    _wait_for(lambda: dispatched == [missed['id']])
+
+    stream_server.disconnect()
+    # sent while we were disconnected, and then again by the stream
+    while_away = timeline.add(raw_start_message, twitter_id=2)
+    _wait_for(lambda: stream.connections == 2)
+    stream_server.send(while_away)
+    stream_server.send(dict(raw_start_message, id=3))
+
+    _wait_for(lambda: dispatched == [1, 2, 3])
+    assert timeline.requests[-1]['since_id'] == 1
+
+
+def test_backs_off_when_connecting_fails(bot, dispatched):
+    attempts = []
+    def connect():
+        attempts.append(time.time())
+        raise IOError('no twitter for you')
+
+    stream = MentionStream(bot, dispatch=dispatched.append, connect=connect,
+                           backoff=0.01, max_backoff=0.04)
+    stream.start()
+    _wait_for(lambda: len(attempts) >= 5)
+    stream.stop(5)
+
+    gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+    assert gaps[2] > gaps[0]
+    assert all(gap < 0.5 for gap in gaps)
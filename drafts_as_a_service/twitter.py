@@ -1,14 +1,19 @@
 # coding=utf-8
 from __future__ import unicode_literals
-import json
 import os
 
 import twython
-from drafts_as_a_service import sa
+from sqlalchemy import func
+from sideboard.lib import log
+
+from drafts_as_a_service import sa, pools
 
 
 __here__ = os.path.dirname(__file__)
 
+# the pool file drafts are dealt from, until there are different kinds
+DEFAULT_POOL = os.path.join(__here__, 'cuesbey.json')
+
 
 class DraftBot(object):
     start_draft_hashtag = 'StartBoosterDrafting'
@@ -20,6 +25,7 @@ class DraftBot(object):
                                        oauth_token_secret=oauth_token_secret)
         self.user_id = user_id
         self.screen_name = screen_name
+        self.poller = MentionsPoller(self)
 
     def make_client(self, **kwargs):
         return twython.Twython(**kwargs)
@@ -31,22 +37,141 @@ class DraftBot(object):
             message.has_hashtag(self.start_draft_hashtag)):
             self._process_start_message(message)
 
-    def get_pool(self, message):
+    def routing_key(self, message):
+        """
+        Messages with the same routing key are processed in order; until
+        picks are parsed out of messages, the only thing we can key a
+        draft's messages on is who sent them
+        """
+        return Message(message).tweeter
+
+    def get_pool(self, session, message):
         #TODO: different kinds of pools
-        #TODO: sometimes we can fetch an existing pool
-        contents = json.load(open(os.path.join(__here__, 'cuesbey.json')))
-        return sa.Pool(contents=contents, type='set')
+        return pools.registry.get(session, DEFAULT_POOL)
 
 
     def _process_start_message(self, message):
         with sa.Session() as session:
             players = sa.Player.bulk_get_or_create(
                 session, message.involved - {self.screen_name})
-            pool = self.get_pool(message)
+            pool = self.get_pool(session, message)
             draft = sa.Draft(players=players, pool=pool)
             session.add_all([pool, draft])
 
 
+class MentionsPoller(object):
+    """
+    Fetches only the mentions we haven't seen yet, and hands them to the bot
+
+    The newest twitter_id in the message table is our high-water mark, so
+    each poll asks twitter for what's newer than that, a page at a time.
+    """
+    page_size = 200
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.since_id = None
+
+    def poll(self):
+        """
+        Process any new mentions, returning how many there were
+        """
+        messages = self.collect()
+        self.record(messages)
+        for message in messages:
+            try:
+                self.process(message)
+            except Exception:
+                log.error('unable to process message {}'.format(
+                    message['id']), exc_info=True)
+        return len(messages)
+
+    def process(self, message):
+        """
+        Have the bot process a recorded message, then mark it processed
+        """
+        self.bot.process(message)
+        with sa.Session() as session:
+            session.query(sa.Message).filter_by(
+                twitter_id=message['id']).update({'processed': True})
+
+    def collect(self):
+        """
+        The mentions since the high-water mark that aren't already in the
+        message table, oldest first
+        """
+        if self.since_id is None:
+            with sa.Session() as session:
+                self.since_id = session.query(
+                    func.max(sa.Message.twitter_id)).scalar()
+
+        fetched = self.fetch(self.since_id)
+        if not fetched:
+            return []
+
+        self.since_id = max(fetched)
+        return self.unseen(fetched[twitter_id]
+                           for twitter_id in sorted(fetched))
+
+    def unseen(self, tweets):
+        """
+        The tweets that aren't already in the message table, as Messages
+        """
+        tweets = list(tweets)
+        if not tweets:
+            return []
+
+        with sa.Session() as session:
+            seen = {twitter_id for twitter_id, in session.query(
+                sa.Message.twitter_id).filter(
+                    sa.Message.twitter_id.in_([t['id'] for t in tweets]))}
+        return [Message(tweet) for tweet in tweets if tweet['id'] not in seen]
+
+    def fetch(self, since_id):
+        """
+        Page backwards through the mentions timeline until we reach
+        since_id, returning {twitter_id: tweet}
+        """
+        fetched = {}
+        max_id = None
+        while True:
+            kwargs = dict(count=self.page_size)
+            if since_id is not None:
+                kwargs['since_id'] = since_id
+            if max_id is not None:
+                kwargs['max_id'] = max_id
+
+            page = self.bot.client.get_mentions_timeline(**kwargs)
+            if not page:
+                return fetched
+
+            for tweet in page:
+                fetched[tweet['id']] = tweet
+            max_id = min(tweet['id'] for tweet in page) - 1
+
+    def unprocessed(self):
+        """
+        The recorded messages that were never processed, e.g. because we
+        stopped or crashed first, oldest first
+        """
+        with sa.Session() as session:
+            return [Message(content) for content, in session.query(
+                sa.Message.content).filter_by(processed=False).order_by(
+                    sa.Message.twitter_id)]
+
+    def record(self, messages):
+        """
+        Remember messages so that we never collect them again; they stay
+        unprocessed until process() has finished with them
+        """
+        if messages:
+            with sa.Session() as session:
+                session.add_all([
+                    sa.Message(twitter_id=message['id'], content=message)
+                    for message in messages
+                ])
+
+
 class Message(dict):
     def is_in_reply_to(self, id):
         return self.get('in_reply_to_user_id') == id
@@ -62,6 +187,13 @@ class Message(dict):
     def has_hashtag(self, hashtag):
         return hashtag in [tag['text'] for tag in self.hashtags]
 
+    @property
+    def is_tweet(self):
+        return all(key in self for key in ('id', 'text', 'user'))
+
+    def mentions_user(self, screen_name):
+        return screen_name in {m['screen_name'] for m in self.mentions}
+
     @property
     def tweeter(self):
         return self['user']['screen_name']
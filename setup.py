@@ -21,6 +21,8 @@ if __name__ == '__main__':
         scripts=[],
         setup_requires=['distribute'],
         install_requires=requires,
+        extras_require={'boosters': ['numpy'], 'simulation': ['futures'],
+                        'serialization': ['ujson', 'msgpack-python']},
         packages=find_packages(),
         include_package_data=True,
         package_data={},